@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.pipeline_setup import get_task_count
 from ..utilities.misc import compare_muts
 from ..utilities.metrics import calc_auc
@@ -27,9 +28,8 @@ def main():
 
     # load the -omic datasets for this experiment's cohorts
     sc_expr = load_scRNA_expr()
-    with bz2.BZ2File(os.path.join(args.use_dir, 'setup',
-                                  "cohort-data.p.gz"), 'r') as f:
-        cdata = pickle.load(f)
+    cdata = load_cdata(os.path.join(args.use_dir, 'setup',
+                                    "cohort-data.p.gz"))
 
     with open(os.path.join(args.use_dir, 'setup', "muts-list.p"), 'rb') as f:
         muts_list = pickle.load(f)
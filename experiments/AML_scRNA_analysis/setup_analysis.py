@@ -6,6 +6,7 @@ from .param_list import params, mut_lvls
 from .utils import load_scRNA_expr
 from ..utilities.data_dirs import vep_cache_dir, expr_sources
 from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.store import save_cohort_store
 
 import os
 import argparse
@@ -38,6 +39,7 @@ def main():
                             vep_cache_dir, out_path, use_copies=False)
     with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
         pickle.dump(cdata, f, protocol=-1)
+    save_cohort_store(cdata, os.path.join(out_path, "cohort-data.store"))
 
     # load single-cell expression data; figure out which expression features
     # overlap with those available for beatAML
@@ -3,6 +3,7 @@ Processes and consolidates the distributed output of an iteration of the dyad
 isolation experiment to facilitate further analyses.
 """
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import pnt_mtype, shal_mtype, deep_mtype, ExMcomb
 from ..utilities.pipeline_setup import get_task_count
 from ..gene_isolate.utils import calculate_auc
@@ -49,9 +50,8 @@ def main():
     args = parser.parse_args()
 
     # load the -omic datasets for this experiment's tumour cohort
-    with bz2.BZ2File(os.path.join(args.use_dir, 'setup',
-                                  "cohort-data.p.gz"), 'r') as f:
-        cdata = pickle.load(f)
+    cdata = load_cdata(os.path.join(args.use_dir, 'setup',
+                                    "cohort-data.p.gz"))
 
     # get the samples in the cohort as well as the list of tested mutations
     cdata_samps = cdata.get_samples()
@@ -3,6 +3,7 @@ Creates assorted plots for the output related to one particular
 mutated gene across all tested cohorts.
 """
 
+from ..utilities.handle_input import load_cdata
 from .plot_interaction import remove_pair_dups
 from ..utilities.mutations import shal_mtype, Mcomb, ExMcomb
 from ..subgrouping_isolate.utils import calculate_mean_siml, calculate_ks_siml
@@ -365,11 +366,9 @@ def main():
                 for ex_lbl, pred_dict in pred_vals.items()
                 }]
 
-            with bz2.BZ2File(Path(out_dirs[coh],
-                                  '_'.join(["cohort-data",
-                                             out_tags[out_file]])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dirs[coh],
+                                        '_'.join(["cohort-data",
+                                                   out_tags[out_file]])))
 
             if cdata_dict[coh] is None:
                 cdata_dict[coh] = new_cdata
@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import (
     pnt_mtype, copy_mtype, shal_mtype,
     dup_mtype, loss_mtype, gains_mtype, dels_mtype, Mcomb, ExMcomb
@@ -278,15 +279,13 @@ def main():
                 for ex_lbl in ['Iso', 'IsoShal']
                 }]
 
-            with bz2.BZ2File(Path(out_dir,
-                                  '_'.join(["cohort-data", out_tag])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dir,
+                                        '_'.join(["cohort-data", out_tag])))
 
-                if cdata is None:
-                    cdata = new_cdata
-                else:
-                    cdata.merge(new_cdata)
+            if cdata is None:
+                cdata = new_cdata
+            else:
+                cdata.merge(new_cdata)
 
         mtypes_comp = np.greater_equal.outer(
             *([[set(auc_vals['Iso'].index)
@@ -63,7 +63,8 @@ dvc run -d $COH_DIR -d $GENCODE_DIR -d $ONCOGENE_LIST -d $SUBTYPE_LIST \
 	-o setup/muts-list.p -m setup/muts-count.txt \
 	-f setup.dvc --overwrite-dvcfile \
 	python -m dryads-research.experiments.dyad_isolate.setup_isolate \
-	$expr_source $cohort $search $mut_lvls $OUTDIR
+	$expr_source $cohort $search $mut_lvls $OUTDIR \
+	--cores=${SLURM_CPUS_PER_TASK:-1}
 
 if [ -z ${SBATCH_TIMELIMIT+x} ]
 then
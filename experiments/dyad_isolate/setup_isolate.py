@@ -3,16 +3,19 @@ from .param_lists import search_params, mut_lvls
 from ..utilities.data_dirs import vep_cache_dir
 from ...features.data.oncoKB import get_gene_list
 from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.store import save_cohort_store
 
 from ..utilities.mutations import (pnt_mtype, shal_mtype,
                                    dup_mtype, loss_mtype, Mcomb, ExMcomb)
+from ..utilities.membership import MutationBitsets, count_bits
+from ..utilities.dedup import dedup_by_signature
 from dryadic.features.mutations import MuType
 
 import os
 import argparse
 import bz2
 import dill as pickle
-import numpy as np
+import multiprocessing as mp
 
 from itertools import combinations as combn
 from itertools import product
@@ -32,6 +35,91 @@ def get_all_mtype(mtype, gene, use_mtrees, lvls_dict=None, base_lvls=None):
     return MuType({('Gene', gene): use_mtrees[use_lvls][gene].allkey()})
 
 
+def prefer_subgrouping(rmv_mtype, cmp_mtype, lvls_dict, lvl_lists):
+    """Whether to drop a subgrouping for one with the same samples."""
+    return (rmv_mtype.is_supertype(cmp_mtype)
+            or len(rmv_mtype.leaves()) > len(cmp_mtype.leaves())
+            or (lvl_lists.index(lvls_dict[rmv_mtype])
+                > lvl_lists.index(lvls_dict[cmp_mtype])))
+
+
+# the cohort's mutation trees and subgroupings used by the worker processes
+# that enumerate pairs of genes
+pair_data = dict()
+
+
+def init_pair_worker(pair_args):
+    pair_data.update(pair_args)
+
+
+def enumerate_pairs(gene_pairs):
+    """Finds the subgroupings combining the mutations of pairs of genes.
+
+    Pairs of subgroupings are only combined when the number of samples
+    carrying both of them, found from their precomputed bitsets, can meet
+    the minimum sample cutoff; pairs of genes whose mutations co-occur in
+    too few samples skip this step altogether.
+
+    Args:
+        gene_pairs (:obj:`list` of :obj:`tuple`)
+
+    Returns:
+        pair_muts (set): The subgroupings that meet the sample cutoffs.
+
+    """
+    mut_bits = pair_data['mut_bits']
+    samp_cutoff = pair_data['samp_cutoff']
+    pair_muts = set()
+
+    for gene1, gene2 in gene_pairs:
+        mtypes1 = pair_data['test_mtypes'][gene1]
+        mtypes2 = pair_data['test_mtypes'][gene2]
+        pair_combs = set()
+
+        ex_mtypes = [MuType({}), MuType({
+            ('Gene', (gene1, gene2)): shal_mtype})]
+
+        for mtype in mtypes1 | mtypes2:
+            all_mtype = get_all_mtype(mtype, gene1, pair_data['mtrees'],
+                                      pair_data['lvls_dict'],
+                                      pair_data['base_lvls'])
+            all_mtype |= get_all_mtype(mtype, gene2, pair_data['mtrees'],
+                                       pair_data['lvls_dict'],
+                                       pair_data['base_lvls'])
+            pair_combs |= {ExMcomb(all_mtype - ex_mtype, mtype)
+                           for ex_mtype in ex_mtypes}
+
+        gene_both = count_bits(
+            mut_bits.get_bits(MuType({('Gene', gene1): None}))
+            & mut_bits.get_bits(MuType({('Gene', gene2): None}))
+            )
+
+        #TODO: consider pairs within genes and pairs between genes separately?
+        if gene_both >= samp_cutoff:
+            for mtype1, mtype2 in product(mtypes1, mtypes2):
+                if count_bits(mut_bits.get_bits(mtype1)
+                              & mut_bits.get_bits(mtype2)) < samp_cutoff:
+                    continue
+
+                pair_combs |= {Mcomb(mtype1, mtype2)}
+
+                all_mtype = get_all_mtype(mtype1, gene1, pair_data['mtrees'],
+                                          pair_data['lvls_dict'],
+                                          pair_data['base_lvls'])
+                all_mtype |= get_all_mtype(mtype2, gene2,
+                                           pair_data['mtrees'],
+                                           pair_data['lvls_dict'],
+                                           pair_data['base_lvls'])
+                pair_combs |= {ExMcomb(all_mtype - ex_mtype, mtype1, mtype2)
+                               for ex_mtype in ex_mtypes}
+
+        pair_muts |= {mcomb for mcomb in pair_combs
+                      if (samp_cutoff <= mut_bits.count(mcomb)
+                          <= pair_data['max_samps'])}
+
+    return pair_muts
+
+
 def main():
     parser = argparse.ArgumentParser(
         'setup_isolate',
@@ -45,6 +133,10 @@ def main():
     parser.add_argument('mut_lvls', type=str, choices=set(mut_lvls))
     parser.add_argument('out_dir', type=str,
                         help="the working directory for this experiment")
+    parser.add_argument(
+        '--cores', type=int, default=1,
+        help="how many processes to use to enumerate pairs of genes"
+        )
 
     args = parser.parse_args()
     out_path = os.path.join(args.out_dir, 'setup')
@@ -61,6 +153,7 @@ def main():
                             vep_cache_dir, out_path, use_genes)
     with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
         pickle.dump(cdata, f, protocol=-1)
+    save_cohort_store(cdata, os.path.join(out_path, "cohort-data.store"))
 
     assert sorted(cdata.mtrees.keys()) == sorted(lvl_lists), (
         "Level combination mutation trees incorrectly instantiated!")
@@ -71,7 +164,8 @@ def main():
         "Level combination mutation trees contain mismatching sets of genes!")
 
     mut_genes = tuple(mut_genes)[0]
-    max_samps = len(cdata.get_samples()) - search_dict['samp_cutoff']
+    cdata_samps = sorted(cdata.get_samples())
+    max_samps = len(cdata_samps) - search_dict['samp_cutoff']
 
     test_mtypes = dict()
     test_muts = set()
@@ -80,21 +174,25 @@ def main():
     for gene in mut_genes:
         gene_mtrees = {lvls: mtree[gene]
                        for lvls, mtree in cdata.mtrees.items()}
+        gene_bits = MutationBitsets(tuple(gene_mtrees.values()), cdata_samps)
 
         root_types = {
             root_type for root_type in {pnt_mtype, dup_mtype, loss_mtype,
                                         pnt_mtype | dup_mtype,
                                         pnt_mtype | loss_mtype}
-            if (len(root_type.get_samples(*gene_mtrees.values()))
-                >= search_dict['samp_cutoff'])
+            if gene_bits.count(root_type) >= search_dict['samp_cutoff']
             }
 
-        samp_dict = {mtype: mtype.get_samples(*gene_mtrees.values())
+        type_sigs = {mtype: gene_bits.get_signature(mtype)
                      for mtype in root_types | {pnt_mtype}}
+        type_counts = {mtype: gene_bits.count(mtype)
+                       for mtype in root_types | {pnt_mtype}}
         pnt_types = set()
 
         if pnt_mtype in root_types:
             for lvls, lvl_tree in gene_mtrees.items():
+                lvl_bits = MutationBitsets(lvl_tree, cdata_samps)
+
                 lvl_types = lvl_tree.combtypes(
                     mtype=pnt_mtype,
                     comb_sizes=tuple(
@@ -103,70 +201,66 @@ def main():
                     min_branch_size=search_dict['min_branch']
                     ) - {pnt_mtype}
 
-                samp_dict.update({mtype: mtype.get_samples(lvl_tree)
+                type_sigs.update({mtype: lvl_bits.get_signature(mtype)
                                   for mtype in lvl_types})
+                type_counts.update({mtype: lvl_bits.count(mtype)
+                                    for mtype in lvl_types})
                 lvls_dict.update({mtype: lvls for mtype in lvl_types})
                 pnt_types |= lvl_types
 
         gene_types = {mtype for mtype in pnt_types | root_types
-                      if samp_dict[mtype] != samp_dict[pnt_mtype]}
-        lf_dict = {mtype: mtype.leaves() for mtype in gene_types}
-
-        test_list = list(gene_types - root_types)
-        samp_list = np.array([samp_dict[mtype] for mtype in test_list])
-        eq_indx = np.where(np.triu(np.equal.outer(samp_list, samp_list), k=1))
-        dup_indx = set()
-
-        for indx1, indx2 in zip(*eq_indx):
-            for i, j in [[indx1, indx2], [indx2, indx1]]:
-                if (test_list[i].is_supertype(test_list[j])
-                        or (lvl_lists.index(lvls_dict[test_list[i]])
-                            == lvl_lists.index(lvls_dict[test_list[i]])
-                            and (len(lf_dict[test_list[i]])
-                                 > len(lf_dict[test_list[j]])))
-                        or (lvl_lists.index(lvls_dict[test_list[i]])
-                            > lvl_lists.index(lvls_dict[test_list[j]]))):
-                    dup_indx |= {i}
-
-        rmv_mtypes = {test_list[i] for i in dup_indx}
+                      if type_sigs[mtype] != type_sigs[pnt_mtype]}
+
+        # remove subtypes mutated in the same samples as another subtype
+        # with a simpler definition
+        rmv_mtypes = dedup_by_signature(
+            gene_types - root_types, type_sigs.get,
+            lambda mtype1, mtype2: prefer_subgrouping(
+                mtype1, mtype2, lvls_dict, lvl_lists),
+            exclude_removed=False
+            )
+
         gene_mtypes = {MuType({('Gene', gene): mtype})
                        for mtype in gene_types - rmv_mtypes | {pnt_mtype}
                        if (search_dict['samp_cutoff']
-                           <= len(samp_dict[mtype]) <= max_samps)}
+                           <= type_counts[mtype] <= max_samps)}
 
         test_muts |= gene_mtypes
         if gene_mtypes:
             test_mtypes[gene] = gene_mtypes
 
-    for (gene1, mtypes1), (gene2, mtypes2) in combn(test_mtypes.items(), 2):
-        pair_combs = set()
+    # find the samples of each gene's subgroupings across all of the
+    # cohort's mutation trees once, before pairs of genes are considered
+    mut_bits = MutationBitsets(tuple(cdata.mtrees.values()), cdata_samps)
+    for gene, gene_mtypes in test_mtypes.items():
+        mut_bits.get_bits(MuType({('Gene', gene): None}))
 
-        ex_mtypes = [MuType({}), MuType({
-            ('Gene', (gene1, gene2)): shal_mtype})]
+        for mtype in gene_mtypes:
+            mut_bits.get_bits(mtype)
 
-        for mtype in mtypes1 | mtypes2:
-            all_mtype = get_all_mtype(mtype, gene1, cdata.mtrees, lvls_dict,
-                                      lvl_lists[0])
-            all_mtype |= get_all_mtype(mtype, gene2, cdata.mtrees, lvls_dict,
-                                       lvl_lists[0])
-            pair_combs |= {ExMcomb(all_mtype - ex_mtype, mtype)
-                           for ex_mtype in ex_mtypes}
+    pair_args = {'mut_bits': mut_bits, 'mtrees': cdata.mtrees,
+                 'test_mtypes': test_mtypes, 'lvls_dict': lvls_dict,
+                 'base_lvls': lvl_lists[0], 'max_samps': max_samps,
+                 'samp_cutoff': search_dict['samp_cutoff']}
 
-        #TODO: consider pairs within genes and pairs between genes separately?
-        for mtype1, mtype2 in product(mtypes1, mtypes2):
-            pair_combs |= {Mcomb(mtype1, mtype2)}
-
-            all_mtype = get_all_mtype(mtype1, gene1, cdata.mtrees, lvls_dict,
-                                      lvl_lists[0])
-            all_mtype |= get_all_mtype(mtype2, gene2, cdata.mtrees, lvls_dict,
-                                       lvl_lists[0])
-            pair_combs |= {ExMcomb(all_mtype - ex_mtype, mtype1, mtype2)
-                           for ex_mtype in ex_mtypes}
+    # split the pairs of genes into shards that are processed in parallel,
+    # adding the subgroupings found in each shard as soon as it is finished
+    gene_pairs = list(combn(sorted(test_mtypes), 2))
+    n_shards = min(max(args.cores, 1) * 8, max(len(gene_pairs), 1))
+    pair_shards = [gene_pairs[i::n_shards] for i in range(n_shards)]
+
+    if args.cores <= 1:
+        init_pair_worker(pair_args)
 
-        test_muts |= {mcomb for mcomb in pair_combs
-                      if (search_dict['samp_cutoff']
-                          <= len(mcomb.get_samples(*cdata.mtrees.values()))
-                          <= max_samps)}
+        for pair_shard in pair_shards:
+            test_muts |= enumerate_pairs(pair_shard)
+
+    else:
+        with mp.Pool(args.cores, initializer=init_pair_worker,
+                     initargs=(pair_args, )) as pool:
+            for pair_muts in pool.imap_unordered(enumerate_pairs,
+                                                 pair_shards):
+                test_muts |= pair_muts
 
     with open(os.path.join(out_path, "muts-list.p"), 'wb') as f:
         pickle.dump(sorted(test_muts), f, protocol=-1)
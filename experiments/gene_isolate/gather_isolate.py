@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import pnt_mtype, shal_mtype, ExMcomb
 from ..utilities.pipeline_setup import get_task_count
 from .utils import calculate_auc
@@ -32,9 +33,8 @@ def main():
     args = parser.parse_args()
 
     # load the -omic datasets for this experiment's tumour cohort
-    with bz2.BZ2File(os.path.join(args.use_dir, 'setup',
-                                  "cohort-data.p.gz"), 'r') as f:
-        cdata = pickle.load(f)
+    cdata = load_cdata(os.path.join(args.use_dir, 'setup',
+                                    "cohort-data.p.gz"))
 
     base_mtree = tuple(cdata.mtrees.values())[0]
     gene_samps = base_mtree.get_samples()
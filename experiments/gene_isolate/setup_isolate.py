@@ -2,6 +2,7 @@
 from .param_lists import search_params, mut_lvls
 from ..utilities.data_dirs import choose_source, vep_cache_dir
 from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.store import save_cohort_store
 
 from ..utilities.mutations import (pnt_mtype, shal_mtype, dup_mtype,
                                    gains_mtype, loss_mtype, dels_mtype,
@@ -45,6 +46,7 @@ def main():
                             lvl_lists, vep_cache_dir, out_path, {args.gene})
     with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
         pickle.dump(cdata, f, protocol=-1)
+    save_cohort_store(cdata, os.path.join(out_path, "cohort-data.store"))
 
     assert sorted(cdata.mtrees.keys()) == sorted(lvl_lists), (
         "Level combination mutation trees incorrectly instantiated!")
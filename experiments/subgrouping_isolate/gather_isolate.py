@@ -1,5 +1,7 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import pnt_mtype, shal_mtype, ExMcomb
+from ..utilities.membership import MutationBitsets
 from ..utilities.pipeline_setup import get_task_count
 from ..utilities.misc import compare_muts
 from ..gene_isolate.utils import calculate_auc
@@ -48,13 +50,13 @@ def main():
     args = parser.parse_args()
 
     # load the -omic datasets for this experiment's tumour cohort
-    with bz2.BZ2File(os.path.join(args.use_dir, 'setup',
-                                  "cohort-data.p.gz"), 'r') as f:
-        cdata = pickle.load(f)
+    cdata = load_cdata(os.path.join(args.use_dir, 'setup',
+                                    "cohort-data.p.gz"))
 
     # load the mutations present in the cohort sorted into the attribute
     # hierarchy used in this experiment as well as the subgroupings tested
     use_mtree = tuple(cdata.mtrees.values())[0]
+    mut_bits = MutationBitsets(use_mtree, sorted(cdata.get_samples()))
     with open(os.path.join(args.use_dir, 'setup', "muts-list.p"), 'rb') as f:
         muts_list = pickle.load(f)
 
@@ -119,7 +121,7 @@ def main():
         }
 
     if 'Iso' in args.ex_lbls or 'IsoShal' in args.ex_lbls:
-        mut_samps = {mut: mut.get_samples(use_mtree) for mut in use_muts}
+        mut_samps = {mut: mut_bits.get_samples(mut) for mut in use_muts}
         mut_genes = {mut: tuple(mut.label_iter())[0] for mut in use_muts}
         gene_samps = {gene: mtree.get_samples() for gene, mtree in use_mtree}
 
@@ -277,7 +279,8 @@ def main():
 
     cdata.update_split(test_prop=0)
     train_samps = np.array(cdata.get_train_samples())
-    pheno_dict = {mut: np.array(cdata.train_pheno(mut)) for mut in use_muts}
+    train_bits = MutationBitsets(use_mtree, train_samps)
+    pheno_dict = {mut: train_bits.get_labels(mut) for mut in use_muts}
 
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-pheno{}.p.gz".format(out_tag)),
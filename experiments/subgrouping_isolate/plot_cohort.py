@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import RandomType, ExMcomb, shal_mtype, copy_mtype
 from ..subgrouping_isolate import base_dir
 
@@ -187,10 +188,8 @@ def main():
         for out_file in out_files:
             out_tag = '__'.join(out_file.parts[-1].split('__')[1:])
 
-            with bz2.BZ2File(Path(out_dir,
-                                  '__'.join(["cohort-data", out_tag])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dir,
+                                        '__'.join(["cohort-data", out_tag])))
 
             if cdata is None:
                 cdata = new_cdata
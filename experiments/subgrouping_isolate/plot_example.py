@@ -3,6 +3,7 @@ Plots diagrams demonstrating how the overlapping presence other types of
 mutations of the same gene can affect a mutation classification task.
 """
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import (pnt_mtype, copy_mtype, shal_mtype,
                                    dels_mtype, gains_mtype, Mcomb, ExMcomb)
 from dryadic.features.mutations import MuType
@@ -952,16 +953,14 @@ def main():
                       for ex_lbl in ['All', 'Iso']}
 
         for i, out_file in enumerate(out_files):
-            with bz2.BZ2File(Path(out_dir,
-                                  '__'.join(["cohort-data",
-                                             out_tags[out_file]])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dir,
+                                        '__'.join(["cohort-data",
+                                                   out_tags[out_file]])))
 
-                if cdata is None:
-                    cdata = new_cdata
-                else:
-                    cdata.merge(new_cdata)
+            if cdata is None:
+                cdata = new_cdata
+            else:
+                cdata.merge(new_cdata)
 
             with bz2.BZ2File(Path(out_dir, '__'.join(["out-pheno",
                                                       out_tags[out_file]])),
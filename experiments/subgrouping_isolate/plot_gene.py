@@ -3,6 +3,7 @@ Creates assorted plots for the output related to one particular
 mutated gene across all tested cohorts.
 """
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import (
     pnt_mtype, copy_mtype, shal_mtype,
     dup_mtype, loss_mtype, gains_mtype, dels_mtype, Mcomb, ExMcomb
@@ -811,11 +812,9 @@ def main():
                         np.mean)
                     ]
 
-            with bz2.BZ2File(Path(out_dirs[src, coh],
-                                  '__'.join(["cohort-data",
-                                             out_tags[out_file]])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dirs[src, coh],
+                                        '__'.join(["cohort-data",
+                                                   out_tags[out_file]])))
 
             if cdata_dict[src, coh] is None:
                 cdata_dict[src, coh] = new_cdata
@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import (pnt_mtype, copy_mtype,
                                    gains_mtype, dels_mtype, ExMcomb)
 from dryadic.features.mutations import MuType
@@ -13,8 +14,6 @@ from .plot_gene import choose_subtype_colour
 import os
 import argparse
 from pathlib import Path
-import bz2
-import dill as pickle
 
 from operator import itemgetter
 import re
@@ -290,10 +289,8 @@ def main():
             out_dir = os.path.join(base_dir, '__'.join([src, args.cohort]))
             out_tag = '__'.join(out_file.parts[-1].split('__')[1:])
 
-            with bz2.BZ2File(Path(out_dir,
-                                  '__'.join(["cohort-data", out_tag])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dir,
+                                        '__'.join(["cohort-data", out_tag])))
 
             if cdata_dict[src, clf] is None:
                 cdata_dict[src, clf] = new_cdata
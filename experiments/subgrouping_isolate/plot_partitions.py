@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import (
     pnt_mtype, copy_mtype, shal_mtype,
     dup_mtype, loss_mtype, gains_mtype, dels_mtype, Mcomb, ExMcomb
@@ -418,10 +419,8 @@ def main():
                         out_aucs[-1][ex_lbl].index].applymap(np.mean)
                     ]
 
-            with bz2.BZ2File(Path(out_dir,
-                                  '__'.join(["cohort-data", out_tag])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dir,
+                                        '__'.join(["cohort-data", out_tag])))
 
             if cdata is None:
                 cdata = new_cdata
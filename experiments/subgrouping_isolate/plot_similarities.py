@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import pnt_mtype, shal_mtype, deep_mtype, ExMcomb
 from dryadic.features.mutations import MuType
 
@@ -693,10 +694,8 @@ def main():
                                  'r') as f:
                     out_preds[ex_lbl] += [pickle.load(f)]
 
-            with bz2.BZ2File(Path(out_dir,
-                                  '__'.join(["cohort-data", out_tag])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dir,
+                                        '__'.join(["cohort-data", out_tag])))
 
             if cdata is None:
                 cdata = new_cdata
@@ -23,10 +23,13 @@ from .param_list import params
 from ..utilities.data_dirs import vep_cache_dir
 from ...features.data.oncoKB import get_gene_list
 from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.store import save_cohort_store
 
 from ..utilities.mutations import (pnt_mtype, copy_mtype, shal_mtype,
                                    dup_mtype, gains_mtype, loss_mtype,
                                    dels_mtype, Mcomb, ExMcomb)
+from ..utilities.membership import MutationBitsets
+from ..utilities.dedup import dedup_by_signature
 from dryadic.features.mutations import MuType
 
 import os
@@ -35,6 +38,19 @@ import bz2
 import dill as pickle
 from itertools import combinations as combn
 
+import numpy as np
+
+
+def prefer_subgrouping(rmv_mtype, cmp_mtype):
+    """Whether to drop a subgrouping for one with the same samples.
+
+    e.g. remove `Missense` in favour of `Missense->5th Exon` if all of a
+    gene's missense mutations are on the fifth exon
+
+    """
+    return (len(rmv_mtype.leaves()) > len(cmp_mtype.leaves())
+            or rmv_mtype.is_supertype(cmp_mtype))
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -50,6 +66,10 @@ def main():
     parser.add_argument('search_params', type=str, choices=set(params))
     parser.add_argument('out_dir', type=str,
                         help="the working directory for this experiment")
+    parser.add_argument(
+        '--float32', action='store_true',
+        help="store expression values in single rather than double precision"
+        )
 
     # parse command line arguments, figure out where output will be stored
     args = parser.parse_args()
@@ -60,16 +80,20 @@ def main():
     lvl_list = ('Gene', 'Scale', 'Copy') + tuple(args.mut_levels.split('__'))
     search_dict = params[args.search_params]
     use_genes = get_gene_list(min_sources=2)
+    expr_dtype = np.float32 if args.float32 else None
 
     # load and process the -omic datasets for this cohort
     cdata = get_cohort_data(args.cohort, args.expr_source, lvl_list,
-                            vep_cache_dir, out_path, use_genes)
+                            vep_cache_dir, out_path, use_genes,
+                            expr_dtype=expr_dtype)
     with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
         pickle.dump(cdata, f, protocol=-1)
+    save_cohort_store(cdata, os.path.join(out_path, "cohort-data.store"))
 
     # get the maximum number of samples allowed per subgrouping, initialize
     # the list of enumerated subgroupings
-    max_samps = len(cdata.get_samples()) - search_dict['samp_cutoff']
+    cdata_samps = sorted(cdata.get_samples())
+    max_samps = len(cdata_samps) - search_dict['samp_cutoff']
     test_muts = set()
 
     # for each gene with enough point mutations, find all of the combinations
@@ -85,7 +109,8 @@ def main():
 
             # get the samples mutated for each subtype combination in this
             # cohort; remove subtypes that span all of the gene's mutations
-            samp_dict = {mtype: mtype.get_samples(mtree)
+            gene_bits = MutationBitsets(mtree, cdata_samps)
+            samp_dict = {mtype: gene_bits.get_samples(mtype)
                          for mtype in comb_types}
             samp_dict[pnt_mtype] = mtree['Point'].get_samples()
             pnt_types = {mtype for mtype in comb_types
@@ -93,19 +118,8 @@ def main():
 
             # remove subtypes that are mutated in the same set of samples as
             # another subtype and are less granular in their definition
-            rmv_mtypes = set()
-            for rmv_mtype in sorted(pnt_types):
-                rmv_lvls = rmv_mtype.get_levels()
-
-                # e.g. remove `Missense` in favour of `Missense->5th Exon` if
-                # all of this gene's missense mutations are on the fifth exon
-                for cmp_mtype in pnt_types - {rmv_mtype} - rmv_mtypes:
-                    if (samp_dict[rmv_mtype] == samp_dict[cmp_mtype]
-                            and ((len(rmv_mtype.leaves())
-                                  > len(cmp_mtype.leaves()))
-                                 or rmv_mtype.is_supertype(cmp_mtype))):
-                        rmv_mtypes |= {rmv_mtype}
-                        break
+            rmv_mtypes = dedup_by_signature(
+                pnt_types, gene_bits.get_signature, prefer_subgrouping)
 
             # only add the gene-wide point mutation subtype if we are using
             # the "base" combination of mutation attributes
@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import (MuType, Mcomb, ExMcomb, deep_mtype,
                                    shal_mtype, copy_mtype, gains_mtype,
                                    dels_mtype, dup_mtype, loss_mtype)
@@ -160,11 +161,9 @@ def load_cohorts_output(out_list, ex_lbl):
 
             out_preds += [pred_vals.applymap(np.mean)]
 
-            with bz2.BZ2File(Path(out_dirs[src, coh],
-                                  '__'.join(["cohort-data",
-                                             out_tags[out_file]])),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(Path(out_dirs[src, coh],
+                                        '__'.join(["cohort-data",
+                                                   out_tags[out_file]])))
 
             if cdata_dict[src, coh] is None:
                 cdata_dict[src, coh] = new_cdata
@@ -14,7 +14,8 @@ Example usage:
 
 from .classifiers import *
 from ..utilities.handle_input import safe_load
-from ..utilities.mutations import RandomType
+from ..utilities.mutations import (RandomType, get_sample_pool,
+                                   load_random_samples)
 from ..utilities.pipeline_setup import get_task_count
 from ..utilities.misc import transfer_model
 
@@ -25,6 +26,25 @@ import random
 from pathlib import Path
 
 
+def reseed_random(rand_mtype, cdata):
+    """Reproduces how drawing a random subgrouping used to seed `random`.
+
+    This is only kept so that the outputs of this experiment stay the same
+    as those of earlier runs: random subgroupings once drew their samples
+    by reseeding Python's global random number generator with their own
+    seed, and the genes picked for later gene-less random subgroupings
+    depend on the state this left the generator in. Drawing their samples
+    no longer touches the global generator, so this puts it in that state
+    by drawing as many samples from a pool of the same size.
+
+    """
+    _, use_samps = get_sample_pool(rand_mtype.base_mtype,
+                                   *cdata.mtrees.values())
+
+    random.seed(rand_mtype.seed)
+    random.sample(range(len(use_samps)), k=rand_mtype.get_size())
+
+
 def main():
     parser = argparse.ArgumentParser(
         'fit_test',
@@ -56,6 +76,11 @@ def main():
     # load cohort expression and mutation data and the mutation classifier
     coh_path = os.path.join(setup_dir, "cohort-data.p.gz")
     cdata = safe_load(coh_path, retry_pause=41)
+
+    # use the samples drawn for random subgroupings during setup if saved
+    rand_file = os.path.join(setup_dir, "random-samples.p")
+    if os.path.exists(rand_file):
+        load_random_samples(rand_file, *cdata.mtrees.values())
     clf = eval(args.classif)
     mut_clf = clf()
 
@@ -143,6 +168,10 @@ def main():
                 for coh, trnsf_fl in coh_dict.items()
                 }
 
+            # reproducibility shim: see reseed_random
+            if isinstance(mtype, RandomType):
+                reseed_random(mtype, cdata)
+
         else:
             del(out_pars[mtype])
             del(out_time[mtype])
@@ -11,7 +11,9 @@ Example usage:
 
 """
 
-from ..utilities.mutations import copy_mtype, RandomType
+from ..utilities.handle_input import load_cdata
+from ..utilities.mutations import (
+    copy_mtype, RandomType, load_random_samples)
 from ..utilities.pipeline_setup import get_task_count
 from ..utilities.misc import compare_muts
 from ..utilities.metrics import calc_auc
@@ -118,9 +120,13 @@ def main():
     args = parser.parse_args()
 
     # load the -omic datasets for this experiment's tumour cohort
-    with bz2.BZ2File(os.path.join(args.use_dir, 'setup',
-                                  "cohort-data.p.gz"), 'r') as f:
-        cdata = pickle.load(f)
+    cdata = load_cdata(os.path.join(args.use_dir, 'setup',
+                                    "cohort-data.p.gz"))
+
+    # use the samples drawn for random subgroupings during setup if saved
+    rand_file = os.path.join(args.use_dir, 'setup', "random-samples.p")
+    if os.path.exists(rand_file):
+        load_random_samples(rand_file, *cdata.mtrees.values())
 
     # load the mutations present in the cohort sorted into the attribute
     # hierarchy used in this experiment as well as the subgroupings tested
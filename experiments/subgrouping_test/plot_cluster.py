@@ -12,6 +12,7 @@ Example usages:
 
 """
 
+from ..utilities.handle_input import load_cdata
 from ..subgrouping_test import base_dir
 from ..utilities.transformers import OmicPCA, OmicTSNE, OmicUMAP
 from ..utilities.data_dirs import vep_cache_dir
@@ -21,8 +22,6 @@ from ...features.cohorts.utils import load_cohort, list_cohort_subtypes
 import os
 import argparse
 from pathlib import Path
-import bz2
-import dill as pickle
 
 import numpy as np
 import pandas as pd
@@ -150,11 +149,10 @@ def main():
             out_tag = "{}__{}__samps-{}".format(
                 args.expr_source, args.cohort, ctf)
 
-            with bz2.BZ2File(os.path.join(
+            new_cdata = load_cdata(os.path.join(
                     base_dir, out_tag,
                     "cohort-data__{}__{}.p.gz".format(lvls, clf)
-                    ), 'r') as f:
-                new_cdata = pickle.load(f)
+                    ))
 
             # makes sure expression data is consistent across all experiments
             if cdata is None:
@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import (
     pnt_mtype, copy_mtype, dup_mtype, loss_mtype, RandomType)
 from dryadic.features.mutations import MuType
@@ -413,11 +414,9 @@ def main():
         out_tag = "{}__{}__samps-{}".format(
             args.expr_source, args.cohort, ctf)
 
-        with bz2.BZ2File(os.path.join(base_dir, out_tag,
-                                      "cohort-data__{}__{}.p.gz".format(
-                                          lvls, args.classif)),
-                         'r') as f:
-            new_cdata = pickle.load(f)
+        new_cdata = load_cdata(os.path.join(base_dir, out_tag,
+                                            "cohort-data__{}__{}.p.gz".format(
+                                                lvls, args.classif)))
 
         if cdata is None:
             cdata = new_cdata
@@ -11,6 +11,7 @@ Example usages:
 
 """
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import pnt_mtype, copy_mtype, RandomType
 from ..subgrouping_test import base_dir
 from ..utilities.misc import get_label, get_subtype, choose_label_colour
@@ -264,11 +265,10 @@ def main():
         out_tag = "{}__{}__samps-{}".format(
             args.expr_source, args.cohort, ctf)
 
-        with bz2.BZ2File(os.path.join(
+        new_cdata = load_cdata(os.path.join(
                 base_dir, out_tag,
                 "cohort-data__{}__{}.p.gz".format(lvls, clf)
-                ), 'r') as f:
-            new_cdata = pickle.load(f)
+                ))
 
         if cdata is None:
             cdata = new_cdata
@@ -10,6 +10,7 @@ Example usages:
 
 """
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.mutations import pnt_mtype, copy_mtype, RandomType
 from dryadic.features.mutations import MuType
 
@@ -1078,11 +1079,10 @@ def main():
         for lvls, ctf in out_use.iteritems():
             out_tag = "{}__{}__samps-{}".format(use_src, coh, ctf)
 
-            with bz2.BZ2File(os.path.join(base_dir, out_tag,
-                                          "cohort-data__{}__{}.p.gz".format(
-                                              lvls, args.classif)),
-                             'r') as f:
-                new_cdata = pickle.load(f)
+            new_cdata = load_cdata(os.path.join(
+                base_dir, out_tag,
+                "cohort-data__{}__{}.p.gz".format(lvls, args.classif)
+                ))
 
             if cdata_dict[coh] is None:
                 cdata_dict[coh] = new_cdata
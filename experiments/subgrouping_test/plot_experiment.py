@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..subgrouping_test import base_dir
 from .utils import choose_mtype_colour
 from ..utilities.colour_maps import variant_clrs
@@ -196,11 +197,9 @@ def main():
     out_tag = "{}__{}__samps-{}".format(
         args.expr_source, args.cohort, args.samp_cutoff)
 
-    with bz2.BZ2File(os.path.join(base_dir, out_tag,
-                                  "cohort-data__{}__{}.p.gz".format(
-                                      args.mut_levels, args.classif)),
-                     'r') as f:
-        cdata = pickle.load(f)
+    cdata = load_cdata(os.path.join(base_dir, out_tag,
+                                    "cohort-data__{}__{}.p.gz".format(
+                                        args.mut_levels, args.classif)))
 
     with bz2.BZ2File(os.path.join(base_dir, out_tag,
                                   "out-pheno__{}__{}.p.gz".format(
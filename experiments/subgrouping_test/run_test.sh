@@ -70,10 +70,12 @@ eval "$( python -m dryads-research.experiments.utilities.data_dirs \
 dvc run -d $COH_DIR -d $GENCODE_DIR -d $ONCOGENE_LIST \
 	-d $SUBTYPE_LIST -d $RUNDIR/setup_test.py \
 	-d $CODEDIR/dryads-research/environment.yml \
-	-o setup/muts-list.p -m setup/muts-count.txt \
+	-o setup/muts-list.p -o setup/random-samples.p \
+	-m setup/muts-count.txt \
 	-f setup.dvc --overwrite-dvcfile \
 	python -m dryads-research.experiments.subgrouping_test.setup_test \
-	$expr_source $cohort $samp_cutoff $mut_levels $OUTDIR
+	$expr_source $cohort $samp_cutoff $mut_levels $OUTDIR \
+	--cores=${SLURM_CPUS_PER_TASK:-1}
 
 # how long is this pipeline allowed to run for?
 if [ -z ${SBATCH_TIMELIMIT+x} ]
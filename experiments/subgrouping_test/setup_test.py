@@ -20,25 +20,147 @@ Example usages:
 """
 
 from ..utilities.mutations import (pnt_mtype, copy_mtype,
-                                   dup_mtype, loss_mtype, RandomType)
+                                   dup_mtype, loss_mtype, RandomType,
+                                   draw_random_samples, save_random_samples)
+from ..utilities.membership import MutationBitsets
+from ..utilities.dedup import dedup_by_signature
 from dryadic.features.mutations import MuType
 
 from ..utilities.data_dirs import vep_cache_dir, expr_sources
 from ...features.data.oncoKB import get_gene_list
 from ...features.cohorts.utils import get_cohort_data, load_cohort
 from ...features.cohorts.tcga import list_cohorts
+from ...features.cohorts.store import save_cohort_store
 
 import os
 import argparse
 import bz2
 import dill as pickle
-import subprocess
+import shutil
+import multiprocessing as mp
 
 import numpy as np
 import random
 from itertools import product
 
 
+def get_transfer_source(coh):
+    """Chooses the default source of expression data for a cohort."""
+    coh_base = coh.split('_')[0]
+
+    if coh_base in {'METABRIC', 'CCLE'}:
+        use_src = 'microarray'
+    elif coh_base in {'beatAML'}:
+        use_src = 'toil__gns'
+    else:
+        use_src = 'Firehose'
+
+    return use_src
+
+
+def check_transfer_cohort(coh, coh_path, lvl_list, expr_dtype):
+    """Gets the features of a saved transfer cohort if it is up to date.
+
+    A saved cohort is up to date if the manifest written alongside it is
+    newer than its pickled representation, lists a mutation tree
+    containing the given mutation levels, and lists the given data type as
+    that of the cohort's expression values.
+
+    """
+    meta_path = "{}.meta".format(coh_path)
+
+    if (not os.path.exists(coh_path) or not os.path.exists(meta_path)
+            or os.path.getmtime(meta_path) < os.path.getmtime(coh_path)):
+        return None
+
+    try:
+        with open(meta_path, 'rb') as f:
+            coh_meta = pickle.load(f)
+
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return None
+
+    if coh != 'CCLE' and not any(
+            tuple(mtree_lvls[-len(lvl_list):]) == tuple(lvl_list)
+            for mtree_lvls in coh_meta['mut_lvls']):
+        return None
+
+    if ('expr_dtype' not in coh_meta
+            or np.dtype(coh_meta['expr_dtype']) != expr_dtype):
+        return None
+
+    return coh_meta['features']
+
+
+def link_output(src_path, out_path):
+    """Makes a saved file available in a directory without copying it."""
+    if os.path.exists(out_path):
+        os.remove(out_path)
+
+    try:
+        os.link(src_path, out_path)
+    except OSError:
+        shutil.copyfile(src_path, out_path)
+
+
+def prepare_transfer_cohort(coh_args):
+    """Loads a transfer cohort and saves it, unless it is already saved.
+
+    This is run in a separate process for each transfer cohort; only the
+    cohort's expression features are returned, as the cohort itself is
+    passed on to later stages of the pipeline through the saved files.
+
+    """
+    (coh, lvl_list, coh_dir, out_path,
+     use_genes, expr_dtype, vep_cores) = coh_args
+    use_src = get_transfer_source(coh)
+
+    # cohorts keep their expression values as double-precision floats
+    # unless they are asked to be stored using a smaller data type
+    if expr_dtype is None:
+        expr_dtype = np.float64
+    expr_dtype = np.dtype(expr_dtype)
+
+    # figure out where to store the cohort's pickled representation
+    coh_tag = "cohort-data__{}__{}.p".format(use_src, coh)
+    coh_path = os.path.join(coh_dir, coh_tag)
+    use_feats = check_transfer_cohort(coh, coh_path, lvl_list, expr_dtype)
+
+    # load and process the cohort's -omic datasets if necessary, using a
+    # separate directory for the intermediate files of each cohort
+    if use_feats is None:
+        tmp_path = os.path.join(out_path, 'tmp', coh)
+        os.makedirs(tmp_path, exist_ok=True)
+
+        # the cohort is saved again in full below, so mutation trees added
+        # to it are not saved separately
+        trnsf_cdata = load_cohort(coh, use_src, lvl_list, vep_cache_dir,
+                                  coh_path, tmp_path, use_genes,
+                                  expr_dtype=expr_dtype, save_deltas=False,
+                                  vep_cores=vep_cores)
+        use_feats = set(trnsf_cdata.get_features())
+
+        # other runs of this experiment may be reading the saved cohort, so
+        # we make sure that it is replaced in one step
+        tmp_coh = "{}.tmp-{}".format(coh_path, os.getpid())
+        with open(tmp_coh, 'wb') as f:
+            pickle.dump(trnsf_cdata, f, protocol=-1)
+        os.replace(tmp_coh, coh_path)
+
+        tmp_meta = "{}.meta.tmp-{}".format(coh_path, os.getpid())
+        with open(tmp_meta, 'wb') as f:
+            pickle.dump({'mut_lvls': list(trnsf_cdata.mtrees),
+                         'features': use_feats, 'expr_dtype': expr_dtype},
+                        f, protocol=-1)
+        os.replace(tmp_meta, "{}.meta".format(coh_path))
+
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    link_output(coh_path, os.path.join(out_path, coh_tag))
+
+    return coh, use_feats
+
+
 def main():
     parser = argparse.ArgumentParser(
         'setup_test',
@@ -58,59 +180,83 @@ def main():
     parser.add_argument('out_dir', type=str,
                         help="the working directory for this experiment")
 
+    parser.add_argument(
+        '--cores', type=int, default=1,
+        help=("how many cores can be used in total, both for annotating "
+              "variants and for preparing transfer cohorts at the same time")
+        )
+    parser.add_argument(
+        '--mem_budget', type=float,
+        help="how much memory (in GB) can be used to prepare transfer cohorts"
+        )
+    parser.add_argument(
+        '--cohort_mem', type=float, default=8.,
+        help="how much memory (in GB) preparing a transfer cohort may use"
+        )
+    parser.add_argument(
+        '--float32', action='store_true',
+        help="store expression values in single rather than double precision"
+        )
+
     # parse command line arguments, figure out where output will be stored,
     # get the mutation attributes and cancer genes that will be used
     args = parser.parse_args()
     out_path = os.path.join(args.out_dir, 'setup')
     lvl_list = ('Gene', 'Scale', 'Copy') + tuple(args.mut_levels.split('__'))
     use_genes = get_gene_list(min_sources=2)
+    expr_dtype = np.float32 if args.float32 else None
 
     # load and process the -omic datasets for this cohort
     cdata = get_cohort_data(args.cohort, args.expr_source, lvl_list,
-                            vep_cache_dir, out_path, use_genes)
+                            vep_cache_dir, out_path, use_genes,
+                            vep_cores=max(args.cores, 1),
+                            expr_dtype=expr_dtype)
     with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
         pickle.dump(cdata, f, protocol=-1)
+    save_cohort_store(cdata, os.path.join(out_path, "cohort-data.store"))
 
     # get the maximum number of samples allowed per subgrouping, initialize
     # the list of enumerated subgroupings
-    max_samps = len(cdata.get_samples()) - args.samp_cutoff
+    cdata_samps = sorted(cdata.get_samples())
+    max_samps = len(cdata_samps) - args.samp_cutoff
     use_mtypes = set()
 
     # for each gene with enough samples harbouring its point mutations in the
-    # cohort, find the subgroupings composed of at most two branches
+    # cohort, find the subgroupings composed of at most two branches, using
+    # bitsets of the samples in the gene's mutation tree to evaluate them
     for gene, mtree in cdata.mtrees[lvl_list]:
-        if len(pnt_mtype.get_samples(mtree)) >= args.samp_cutoff:
+        gene_bits = MutationBitsets(mtree, cdata_samps)
+
+        if gene_bits.count(pnt_mtype) >= args.samp_cutoff:
+            pnt_bits = MutationBitsets(mtree['Point'], cdata_samps)
+
             pnt_mtypes = {
                 mtype for mtype in mtree['Point'].combtypes(
                     comb_sizes=(1, 2), min_type_size=args.samp_cutoff)
-                if (args.samp_cutoff
-                    <= len(mtype.get_samples(mtree)) <= max_samps)
+                if args.samp_cutoff <= gene_bits.count(mtype) <= max_samps
                 }
 
             # remove subgroupings that have only one child subgrouping
             # containing all of their samples
-            pnt_mtypes -= {
-                mtype1 for mtype1, mtype2 in product(pnt_mtypes, repeat=2)
-                if mtype1 != mtype2 and mtype1.is_supertype(mtype2)
-                and mtype1.get_samples(mtree) == mtype2.get_samples(mtree)
-                }
+            pnt_mtypes -= dedup_by_signature(
+                pnt_mtypes, gene_bits.get_signature,
+                lambda mtype1, mtype2: mtype1.is_supertype(mtype2),
+                exclude_removed=False
+                )
 
             # remove groupings that contain all of the gene's point mutations
+            pnt_size = gene_bits.count(pnt_mtype)
             pnt_mtypes = {MuType({('Scale', 'Point'): mtype})
                           for mtype in pnt_mtypes
-                          if (len(mtype.get_samples(mtree['Point']))
-                              < len(mtree['Point'].get_samples()))}
+                          if pnt_bits.count(mtype) < pnt_size}
 
             # check if this gene had at least five samples with deep gains or
             # deletions that weren't all already carrying point mutations
             copy_mtypes = {
                 mtype for mtype in [dup_mtype, loss_mtype]
-                if ((5 <= len(mtype.get_samples(mtree))
-                     <= (len(cdata.get_samples()) - 5))
-                    and not (mtype.get_samples(mtree)
-                             <= mtree['Point'].get_samples())
-                    and not (mtree['Point'].get_samples()
-                             <= mtype.get_samples(mtree)))
+                if (5 <= gene_bits.count(mtype) <= (len(cdata_samps) - 5)
+                    and not gene_bits.is_subset(mtype, pnt_mtype)
+                    and not gene_bits.is_subset(pnt_mtype, mtype))
                 }
 
             # find the enumerated point mutations for this gene that can be
@@ -118,10 +264,8 @@ def main():
             dyad_mtypes = {
                 pt_mtype | cp_mtype
                 for pt_mtype, cp_mtype in product(pnt_mtypes, copy_mtypes)
-                if ((pt_mtype.get_samples(mtree)
-                     - cp_mtype.get_samples(mtree))
-                    and (cp_mtype.get_samples(mtree)
-                         - pt_mtype.get_samples(mtree)))
+                if (not gene_bits.is_subset(pt_mtype, cp_mtype)
+                    and not gene_bits.is_subset(cp_mtype, pt_mtype))
                 }
 
             # if we are using the base list of mutation attributes, add the
@@ -133,16 +277,14 @@ def main():
                 # ...as well as CNA-only subgroupings...
                 gene_mtypes |= {
                     mtype for mtype in copy_mtypes
-                    if (args.samp_cutoff
-                        <= len(mtype.get_samples(mtree)) <= max_samps)
+                    if args.samp_cutoff <= gene_bits.count(mtype) <= max_samps
                     }
 
                 # ...and finally the CNA + all point mutations subgroupings
                 gene_mtypes |= {
                     pnt_mtype | mtype for mtype in copy_mtypes
                     if (args.samp_cutoff
-                        <= len((pnt_mtype | mtype).get_samples(mtree))
-                        <= max_samps)
+                        <= gene_bits.count(pnt_mtype | mtype) <= max_samps)
                     }
 
             use_mtypes |= {MuType({('Gene', gene): mtype})
@@ -158,10 +300,11 @@ def main():
     mtype_list = sorted(use_mtypes)
     random.seed((88701 * lvls_seed + 1313) % (2 ** 17))
     random.shuffle(mtype_list)
+    coh_bits = MutationBitsets(cdata.mtrees[lvl_list], cdata_samps)
 
     # generate random subgroupings chosen from all samples in the cohort
     use_mtypes |= {
-        RandomType(size_dist=len(mtype.get_samples(cdata.mtrees[lvl_list])),
+        RandomType(size_dist=coh_bits.count(mtype),
                    seed=(lvls_seed * (i + 3751) + 19207) % (2 ** 26))
         for i, (mtype, _) in enumerate(product(mtype_list, range(5)))
         if (mtype & copy_mtype).is_empty()
@@ -170,7 +313,7 @@ def main():
     # generate random subgroupings chosen from samples mutated for each gene
     use_mtypes |= {
         RandomType(
-            size_dist=len(mtype.get_samples(cdata.mtrees[lvl_list])),
+            size_dist=coh_bits.count(mtype),
             base_mtype=MuType({
                 ('Gene', tuple(mtype.label_iter())[0]): pnt_mtype}),
             seed=(lvls_seed * (i + 1021) + 7391) % (2 ** 23)
@@ -181,6 +324,15 @@ def main():
             and tuple(mtype.subtype_iter())[0][1] != pnt_mtype)
         }
 
+    # draw the samples of all the random subgroupings at once and save
+    # them so that later stages can look them up instead of drawing them
+    save_random_samples(
+        draw_random_samples([mtype for mtype in use_mtypes
+                             if isinstance(mtype, RandomType)],
+                            cdata.mtrees[lvl_list]),
+        os.path.join(out_path, "random-samples.p")
+        )
+
     # save enumerated subgroupings and number of subgroupings to file
     with open(os.path.join(out_path, "muts-list.p"), 'wb') as f:
         pickle.dump(sorted(use_mtypes), f, protocol=-1)
@@ -199,34 +351,32 @@ def main():
     use_feats = set(cdata.get_features())
     random.seed()
 
-    # for each cohort used for transferring...
-    for coh in random.sample(coh_list, k=len(coh_list)):
-        coh_base = coh.split('_')[0]
-
-        # ...choose a default source of expression data
-        if coh_base in {'METABRIC', 'CCLE'}:
-            use_src = 'microarray'
-        elif coh_base in {'beatAML'}:
-            use_src = 'toil__gns'
-        else:
-            use_src = 'Firehose'
-
-        # ...figure out where to store its pickled representation
-        coh_tag = "cohort-data__{}__{}.p".format(use_src, coh)
-        coh_path = os.path.join(coh_dir, coh_tag)
-
-        # load and process the cohort's -omic datasets, update the list of
-        # expression features common across all cohorts
-        trnsf_cdata = load_cohort(coh, use_src, lvl_list, vep_cache_dir,
-                                  coh_path, out_path, use_genes)
-        use_feats &= set(trnsf_cdata.get_features())
-
-        with open(coh_path, 'wb') as f:
-            pickle.dump(trnsf_cdata, f, protocol=-1)
-
-        copy_prc = subprocess.run(['cp', coh_path,
-                                   os.path.join(out_path, coh_tag)],
-                                  check=True)
+    # figure out how many transfer cohorts can be prepared at the same time
+    # given the available memory
+    n_workers = max(args.cores, 1)
+    if args.mem_budget is not None:
+        n_workers = min(n_workers,
+                        max(int(args.mem_budget // args.cohort_mem), 1))
+
+    # the cores are split evenly between the transfer cohorts being
+    # prepared at the same time for annotating their variants
+    vep_cores = max(args.cores // n_workers, 1)
+    coh_args = [(coh, lvl_list, coh_dir, out_path,
+                 use_genes, expr_dtype, vep_cores)
+                for coh in random.sample(coh_list, k=len(coh_list))]
+
+    # load and process each transfer cohort's -omic datasets, update the
+    # list of expression features common across all cohorts as each of them
+    # is finished
+    if n_workers == 1:
+        for coh_arg in coh_args:
+            use_feats &= prepare_transfer_cohort(coh_arg)[1]
+
+    else:
+        with mp.Pool(n_workers) as pool:
+            for _, trnsf_feats in pool.imap_unordered(
+                    prepare_transfer_cohort, coh_args):
+                use_feats &= trnsf_feats
 
     with open(os.path.join(out_path, "feat-list.p"), 'wb') as f:
         pickle.dump(use_feats, f, protocol=-1)
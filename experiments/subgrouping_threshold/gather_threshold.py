@@ -1,4 +1,5 @@
 
+from ..utilities.handle_input import load_cdata
 from ..utilities.pipeline_setup import get_task_count
 from ..utilities.misc import compare_muts
 from ...features.cohorts.utils import get_cohort_subtypes
@@ -25,9 +26,8 @@ def main():
     args = parser.parse_args()
 
     # load the -omic datasets for this experiment's tumour cohort
-    with bz2.BZ2File(os.path.join(args.use_dir, 'setup',
-                                  "cohort-data.p.gz"), 'r') as f:
-        cdata = pickle.load(f)
+    cdata = load_cdata(os.path.join(args.use_dir, 'setup',
+                                    "cohort-data.p.gz"))
 
     # load the mutations present in the cohort sorted into the attribute
     # hierarchy used in this experiment as well as the subgroupings tested
@@ -6,6 +6,7 @@ from .utils import MutThresh
 from ..utilities.data_dirs import choose_source, vep_cache_dir, expr_sources
 from ...features.cohorts.utils import get_cohort_data, load_cohort
 from ...features.cohorts.tcga import list_cohorts
+from ...features.cohorts.store import save_cohort_store
 
 import os
 import argparse
@@ -128,6 +129,7 @@ def main():
                             out_path, use_genes, leaf_annot=use_lfs)
     with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
         pickle.dump(cdata, f, protocol=-1)
+    save_cohort_store(cdata, os.path.join(out_path, "cohort-data.store"))
 
     for gene, mtree in cdata.mtrees[mtree_k]:
         base_mtypes = {MuType({('Gene', gene): pnt_mtype})}
@@ -188,7 +190,7 @@ def main():
 
         trnsf_cdata = load_cohort(coh, 'Firehose', [mtree_k], vep_cache_dir,
                                   coh_path, out_path, use_genes,
-                                  leaf_annot=use_lfs)
+                                  leaf_annot=use_lfs, save_deltas=False)
         use_feats &= set(trnsf_cdata.get_features())
 
         with open(coh_path, 'wb') as f:
@@ -1,11 +1,14 @@
 
 from ..utilities.mutations import pnt_mtype
+from ..utilities.membership import MutationBitsets
+from ..utilities.dedup import dedup_by_signature
 from dryadic.features.mutations import MuType
 
 from .param_list import params, mut_lvls
 from ..utilities.data_dirs import vep_cache_dir, expr_sources
 from ...features.data.oncoKB import get_gene_list
 from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.store import save_cohort_store
 
 import os
 import argparse
@@ -13,6 +16,19 @@ import bz2
 import dill as pickle
 from itertools import product
 
+import numpy as np
+
+
+def prefer_subgrouping(rmv_mtype, cmp_mtype):
+    """Whether to drop a subgrouping for one with the same samples."""
+    rmv_lvls = rmv_mtype.get_levels()
+    cmp_lvls = cmp_mtype.get_levels()
+
+    return (rmv_mtype.is_supertype(cmp_mtype)
+            or (any('domain' in lvl for lvl in rmv_lvls)
+                and all('domain' not in lvl for lvl in cmp_lvls))
+            or len(rmv_lvls) > len(cmp_lvls) or rmv_mtype > cmp_mtype)
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -26,6 +42,10 @@ def main():
     parser.add_argument('search_params', type=str,)
     parser.add_argument('mut_lvls', type=str,)
     parser.add_argument('out_dir', type=str,)
+    parser.add_argument(
+        '--float32', action='store_true',
+        help="store expression values in single rather than double precision"
+        )
 
     # parse command line arguments
     args = parser.parse_args()
@@ -35,14 +55,17 @@ def main():
                  for lvl_list in mut_lvls[args.mut_lvls]]
     search_dict = params[args.search_params]
     use_genes = get_gene_list(min_sources=2)
+    expr_dtype = np.float32 if args.float32 else None
 
     cdata = get_cohort_data(args.cohort, args.expr_source, lvl_lists,
                             vep_cache_dir, out_path, use_genes,
-                            use_copies=False)
+                            use_copies=False, expr_dtype=expr_dtype)
     with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
         pickle.dump(cdata, f, protocol=-1)
+    save_cohort_store(cdata, os.path.join(out_path, "cohort-data.store"))
 
-    total_samps = len(cdata.get_samples())
+    cdata_samps = sorted(cdata.get_samples())
+    total_samps = len(cdata_samps)
     max_samps = total_samps - search_dict['samp_cutoff']
     test_mtypes = set()
 
@@ -55,11 +78,13 @@ def main():
         pnt_count = tuple(pnt_count)[0]
 
         if pnt_count >= search_dict['samp_cutoff']:
-            samp_dict = {None: cdata.mtrees[lvl_lists[0]][gene].get_samples()}
+            gene_sigs = dict()
             gene_types = set()
 
             for lvls in lvl_lists:
-                use_mtree = cdata.mtrees[lvls][gene]
+                lvl_bits = MutationBitsets(cdata.mtrees[lvls][gene],
+                                           cdata_samps)
+                use_mtree = lvl_bits.mtree
 
                 lvl_types = {
                     mtype for mtype in use_mtree.combtypes(
@@ -70,30 +95,17 @@ def main():
                         )
                     }
 
-                samp_dict.update({mtype: mtype.get_samples(use_mtree)
+                gene_sigs.update({mtype: lvl_bits.get_signature(mtype)
                                   for mtype in lvl_types})
 
                 gene_types |= {mtype for mtype in lvl_types
-                               if (len(samp_dict[mtype]) <= max_samps
-                                   and len(samp_dict[mtype]) < pnt_count)}
-
-            rmv_mtypes = set()
-            for rmv_mtype in sorted(gene_types):
-                rmv_lvls = rmv_mtype.get_levels()
-
-                for cmp_mtype in sorted(gene_types
-                                        - {rmv_mtype} - rmv_mtypes):
-                    cmp_lvls = cmp_mtype.get_levels()
-
-                    if (samp_dict[rmv_mtype] == samp_dict[cmp_mtype]
-                            and (rmv_mtype.is_supertype(cmp_mtype)
-                                 or (any('domain' in lvl for lvl in rmv_lvls)
-                                     and all('domain' not in lvl
-                                             for lvl in cmp_lvls))
-                                 or len(rmv_lvls) > len(cmp_lvls)
-                                 or rmv_mtype > cmp_mtype)):
-                        rmv_mtypes |= {rmv_mtype}
-                        break
+                               if lvl_bits.count(mtype) <= max_samps
+                               and lvl_bits.count(mtype) < pnt_count}
+
+            # remove subgroupings mutated in the same samples as another
+            # subgrouping with a simpler definition
+            rmv_mtypes = dedup_by_signature(gene_types, gene_sigs.get,
+                                            prefer_subgrouping)
 
             test_mtypes |= {MuType({('Gene', gene): mtype})
                             for mtype in gene_types - rmv_mtypes}
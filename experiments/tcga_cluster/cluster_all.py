@@ -6,10 +6,11 @@ plot_dir = os.path.join(base_dir, 'plots', 'all')
 import sys
 sys.path.extend([os.path.join(base_dir, '../../..')])
 
-from HetMan.features.cohorts.tcga import PanCancerMutCohort
+from HetMan.features.cohorts.tcga import load_pancan_cohort
 from HetMan.features.mutations import MuType
 from HetMan.describe.transformers import *
 from HetMan.experiments.utilities.pcawg_colours import cohort_clrs
+from HetMan.experiments.utilities.data_dirs import gencode_dir
 
 import synapseclient
 import argparse
@@ -23,6 +24,7 @@ import matplotlib.pyplot as plt
 plt.style.use('fivethirtyeight')
 
 firehose_dir = "/home/exacloud/lustre1/share_your_data_here/precepts/firehose"
+annot_file = os.path.join(gencode_dir, "gencode.v19.annotation.gtf.gz")
 
 
 def plot_all_clustering(trans_dict, args, cdata, use_comps=(0, 1)):
@@ -193,10 +195,13 @@ def main():
                                 "mgrzad/input-data/synapse")
     syn.login()
 
-    # load RNAseq and mutation call data for all TCGA cohorts
-    cdata = PanCancerMutCohort(mut_genes=args.genes, mut_levels=['Gene'],
-                               expr_source='Firehose', expr_dir=firehose_dir,
-                               var_source='mc3', cv_prop=1.0, syn=syn)
+    # load RNAseq and mutation call data for all TCGA cohorts, reusing the
+    # pan-cancer cohort store made by earlier runs where possible
+    cdata = load_pancan_cohort(
+        os.path.join(base_dir, 'setup', 'pancan-data.store'), ['Gene'],
+        expr_source='Firehose', var_source='mc3', copy_source='Firehose',
+        annot_file=annot_file, expr_dir=firehose_dir, syn=syn
+        )
 
     # create the pipelines for unsupervised learning
     mut_trans = [('PCA', OmicPCA()),
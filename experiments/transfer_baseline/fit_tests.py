@@ -141,7 +141,7 @@ def main():
             expr_sources=args.expr_source, var_sources='mc3',
             copy_sources='Firehose', annot_file=annot_file,
             expr_dir=expr_sources[args.expr_source], copy_dir=copy_dir,
-            syn=syn, cv_prop=0.75, cv_seed=2079 + 57 * args.cv_id
+            syn=syn, cv_seed=2079 + 57 * args.cv_id, test_prop=0.25
             )
 
         for _, mtype in combs_cur:
@@ -0,0 +1,64 @@
+"""
+Removing candidate subgroupings that are mutated in the same samples.
+"""
+
+
+def group_by_signature(mtypes, get_signature):
+    """Groups subgroupings according to a fingerprint of their samples.
+
+    Args:
+        mtypes (:obj:`iterable` of :obj:`MuType`)
+        get_signature (function)
+            Takes a subgrouping and returns a hashable fingerprint of the
+            samples it is mutated in, eg. `MutationBitsets.get_signature`.
+
+    Returns:
+        sig_groups (:obj:`list` of :obj:`list`)
+            The subgroupings sharing each of the fingerprints found.
+
+    """
+    sig_groups = dict()
+
+    for mtype in mtypes:
+        sig_groups.setdefault(get_signature(mtype), []).append(mtype)
+
+    return list(sig_groups.values())
+
+
+def dedup_by_signature(mtypes, get_signature, prefer_fx,
+                       exclude_removed=True):
+    """Finds the subgroupings made redundant by others with the same samples.
+
+    Subgroupings are grouped by their fingerprints in one pass, and are then
+    only compared to the other members of their group. Within each group,
+    subgroupings are considered in sorted order, and a subgrouping is removed
+    if the preference rule favours any of the others over it.
+
+    Args:
+        mtypes (:obj:`iterable` of :obj:`MuType`)
+        get_signature (function): As in :func:`group_by_signature`.
+        prefer_fx (function): Takes two subgroupings with the same samples
+                              and returns whether the second should be kept
+                              in place of the first.
+        exclude_removed (bool, optional)
+            Whether subgroupings that have already been removed can no longer
+            be kept in place of others, which is the default.
+
+    Returns:
+        rmv_mtypes (set): The subgroupings to remove from the candidates.
+
+    """
+    rmv_mtypes = set()
+
+    for sig_group in group_by_signature(mtypes, get_signature):
+        if len(sig_group) > 1:
+            for rmv_mtype in sorted(sig_group):
+                for cmp_mtype in sig_group:
+                    if (cmp_mtype != rmv_mtype
+                            and not (exclude_removed
+                                     and cmp_mtype in rmv_mtypes)
+                            and prefer_fx(rmv_mtype, cmp_mtype)):
+                        rmv_mtypes |= {rmv_mtype}
+                        break
+
+    return rmv_mtypes
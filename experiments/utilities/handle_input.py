@@ -1,25 +1,38 @@
+from ...features.cohorts.store import (
+    get_store_path, store_exists, load_cohort_store)
 
 import time
 import bz2
 import dill as pickle
 
 
+def load_cdata(fl, **store_args):
+    """Loads a cohort, attaching to its store instead if one was saved."""
+    store_path = get_store_path(fl)
+
+    if store_exists(store_path):
+        load_data = load_cohort_store(store_path, **store_args)
+
+    elif str(fl)[-2:] == 'gz':
+        with bz2.BZ2File(fl, 'r') as data_f:
+            load_data = pickle.load(data_f)
+
+    else:
+        with open(fl, 'rb') as data_f:
+            load_data = pickle.load(data_f)
+
+    return load_data
+
+
 def safe_load(fl, retry_pause=53):
     load_data = None
 
     while load_data is None:
         try:
-            if fl[-2:] == 'gz':
-                with bz2.BZ2File(fl, 'r') as data_f:
-                    load_data = pickle.load(data_f)
-
-            else:
-                with open(fl, 'rb') as data_f:
-                    load_data = pickle.load(data_f)
+            load_data = load_cdata(fl)
 
         except:
             print("Failed to load data from\n{}\ntrying again...".format(fl))
             time.sleep(retry_pause)
 
     return load_data
-
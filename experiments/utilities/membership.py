@@ -0,0 +1,195 @@
+"""
+Bitsets of the samples carrying mutations found in a mutation tree.
+"""
+
+from dryadic.features.mutations import MuType, MutComb
+
+import numpy as np
+import pandas as pd
+from functools import reduce
+from operator import and_, or_
+
+
+# the number of bits set in each possible byte
+bit_counts = np.array([bin(i).count('1') for i in range(256)],
+                      dtype=np.uint8)
+
+
+def count_bits(bits):
+    """Counts the samples whose bits are set in a bitset."""
+    return int(bit_counts[bits.view(np.uint8)].sum())
+
+
+class MutationBitsets(object):
+    """The samples of the subgroupings in a mutation tree as bitsets.
+
+    Each branch of the tree is encoded once as a fixed-width array of 64-bit
+    words with one bit per sample in the given sample order. Mutation types
+    are then evaluated using word-wise unions, intersections, and
+    differences of these branch bitsets instead of as sets of sample names,
+    and the result for each mutation type is kept for later calls.
+
+    Args:
+        mtree (MuTree or :obj:`tuple` of :obj:`MuTree`)
+            A hierarchy of a cohort's mutations, or several hierarchies of
+            the same mutations, in which case mutation types are evaluated
+            as the union of their samples in each of them.
+        samples (:obj:`iterable` of :obj:`str`, optional)
+            The order of samples to use for the bitsets; the default is to
+            use the sorted samples of the mutation trees. Mutated samples
+            not in this list are ignored.
+
+    Examples:
+        >>> mut_bits = MutationBitsets(cdata.mtrees[lvl_list],
+        >>>                            sorted(cdata.get_samples()))
+        >>> mut_bits.count(pnt_mtype)
+        >>> pheno = mut_bits.get_labels(Mcomb(pnt_mtype, shal_mtype))
+
+    """
+
+    def __init__(self, mtree, samples=None):
+        if isinstance(mtree, tuple):
+            self.mtrees = mtree
+        else:
+            self.mtrees = mtree,
+
+        if samples is None:
+            samples = sorted(set().union(*[use_mtree.get_samples()
+                                           for use_mtree in self.mtrees]))
+
+        self.mtree = mtree
+        self.samples = np.array(samples)
+        self.samp_index = pd.Index(self.samples)
+        self.n_words = (len(self.samples) + 63) // 64
+
+        self.node_bits = dict()
+        self.node_children = dict()
+        self.mtype_bits = dict()
+
+    def __getstate__(self):
+        # branches are cached according to their place in memory, which
+        # will not be the same once the trees have been unpickled
+        state = self.__dict__.copy()
+        state['node_bits'] = dict()
+        state['node_children'] = dict()
+
+        return state
+
+    def encode(self, samps):
+        """Gets the bitset of a collection of samples."""
+        samp_indx = self.samp_index.get_indexer(list(samps))
+        samp_flags = np.zeros(self.n_words * 64, dtype=bool)
+        samp_flags[samp_indx[samp_indx >= 0]] = True
+
+        return np.packbits(samp_flags, bitorder='little').view(np.uint64)
+
+    def decode(self, bits):
+        """Gets the samples whose bits are set in a bitset."""
+        return set(self.samples[self.get_flags(bits)])
+
+    def get_flags(self, bits):
+        """Converts a bitset into a boolean vector over the samples."""
+        return np.unpackbits(bits.view(np.uint8), bitorder='little')[
+            :len(self.samples)].astype(bool)
+
+    def get_node_bits(self, node):
+        """Gets the bitset of all the samples in a branch of the tree."""
+        node_id = id(node)
+
+        if node_id not in self.node_bits:
+            if hasattr(node, 'mut_level'):
+                self.node_bits[node_id] = self.encode(node.get_samples())
+            else:
+                self.node_bits[node_id] = self.encode(node)
+
+        return self.node_bits[node_id]
+
+    def get_children(self, node):
+        """Gets the branches of a tree node, keyed by their labels."""
+        node_id = id(node)
+
+        if node_id not in self.node_children:
+            self.node_children[node_id] = dict(iter(node))
+
+        return self.node_children[node_id]
+
+    def evaluate(self, mtype, node):
+        """Finds the bitset of a mutation type's samples in a tree node."""
+        bits = np.zeros(self.n_words, dtype=np.uint64)
+
+        if mtype.cur_level == node.mut_level:
+            node_children = self.get_children(node)
+
+            for lbl, sub_type in mtype.subtype_iter():
+                if lbl in node_children:
+                    branch = node_children[lbl]
+
+                    if sub_type is None or not hasattr(branch, 'mut_level'):
+                        bits |= self.get_node_bits(branch)
+                    else:
+                        bits |= self.evaluate(sub_type, branch)
+
+        else:
+            for branch in self.get_children(node).values():
+                if hasattr(branch, 'mut_level'):
+                    bits |= self.evaluate(mtype, branch)
+
+        return bits
+
+    def get_bits(self, mtype):
+        """Gets the bitset of the samples carrying a type of mutation.
+
+        Args:
+            mtype (MuType or MutComb): A subgrouping of the tree's mutations;
+                                       subgroupings of other types, such as
+                                       random sample sets, are found using
+                                       their own `get_samples` method.
+
+        Returns:
+            bits (:obj:`np.array` of :obj:`np.uint64`)
+
+        """
+        if mtype not in self.mtype_bits:
+            if type(mtype) is MuType:
+                bits = reduce(or_, [self.evaluate(mtype, use_mtree)
+                                    for use_mtree in self.mtrees])
+
+            elif isinstance(mtype, MutComb):
+                bits = reduce(and_, [self.get_bits(sub_mtype)
+                                     for sub_mtype in mtype.mtypes])
+
+                if mtype.not_mtype is not None:
+                    bits = bits & ~self.get_bits(mtype.not_mtype)
+
+            else:
+                bits = self.encode(mtype.get_samples(*self.mtrees))
+
+            self.mtype_bits[mtype] = bits
+
+        return self.mtype_bits[mtype]
+
+    def count(self, mtype):
+        """Counts the samples carrying a type of mutation."""
+        return count_bits(self.get_bits(mtype))
+
+    def get_samples(self, mtype):
+        """Finds the samples carrying a type of mutation."""
+        return self.decode(self.get_bits(mtype))
+
+    def get_labels(self, mtype):
+        """Gets the mutation status of each sample as a boolean vector."""
+        return self.get_flags(self.get_bits(mtype))
+
+    def get_signature(self, mtype):
+        """Gets a hashable fingerprint of a mutation type's samples."""
+        return self.get_bits(mtype).tobytes()
+
+    def same_samples(self, mtype1, mtype2):
+        """Checks whether two mutation types have the same samples."""
+        return np.array_equal(self.get_bits(mtype1), self.get_bits(mtype2))
+
+    def is_subset(self, mtype1, mtype2):
+        """Checks whether the samples of one type are all in another's."""
+        bits1 = self.get_bits(mtype1)
+
+        return np.array_equal(bits1 & self.get_bits(mtype2), bits1)
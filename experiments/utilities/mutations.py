@@ -6,7 +6,14 @@ from dryadic.features.mutations import MuType, MutComb
 from functools import reduce
 from operator import or_, and_
 from scipy.stats import rv_discrete
+
+import numpy as np
+import pandas as pd
+
+import os
+import dill as pickle
 import random
+import weakref
 
 
 # generic subgroupings useful as shorthand definitions
@@ -27,7 +34,36 @@ dels_mtype = MuType({('Scale', 'Copy'): {(
     'Copy', ('ShalDel', 'DeepDel')): None}})
 
 
-class Mcomb(MutComb):
+class FrozenComb(MutComb):
+    """A combination of mutations whose ordering and hash are found once.
+
+    Combinations are treated as immutable once created, which allows the
+    sorted tuple of their mutation types and their hash value to be found
+    when they are constructed instead of each time they are compared or
+    used as a key. Neither of these is pickled; they are instead found
+    again when a combination is unpickled, as hash values are not stable
+    across processes, which also keeps pickles in their original format.
+
+    Each kind of combination defines its hash value using `get_hash`.
+
+    """
+
+    cache_attrs = ('sorted_mtypes', 'hash_value')
+
+    def freeze(self):
+        self.sorted_mtypes = tuple(sorted(self.mtypes))
+        self.hash_value = self.get_hash()
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items()
+                if k not in self.cache_attrs}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.freeze()
+
+
+class Mcomb(FrozenComb):
 
     def __new__(cls, *mtypes):
         obj = super().__new__(cls, *mtypes)
@@ -40,39 +76,45 @@ class Mcomb(MutComb):
                                  "of diferent levels!")
 
             obj.cur_level = tuple(cur_levels)[0]
+            obj.freeze()
 
         return obj
 
-    def __hash__(self):
+    def get_hash(self):
         value = 0x230199 ^ len(self.mtypes)
-        value += hash(tuple(sorted(self.mtypes)))
+        value += hash(self.sorted_mtypes)
 
         if value == -1:
             value = -2
 
         return value
 
+    def __hash__(self):
+        return self.hash_value
+
     def __getnewargs__(self):
         return tuple(self.mtypes)
 
     def __str__(self):
-        return ' & '.join(str(mtype) for mtype in sorted(self.mtypes))
+        return ' & '.join(str(mtype) for mtype in self.sorted_mtypes)
 
     def __repr__(self):
         return 'BOTH {}'.format(
-            ' AND '.join(repr(mtype) for mtype in sorted(self.mtypes)))
+            ' AND '.join(repr(mtype) for mtype in self.sorted_mtypes))
 
     def __eq__(self, other):
         if not isinstance(other, Mcomb):
             eq = False
+        elif self.hash_value != other.hash_value:
+            eq = False
         else:
-            eq = sorted(self.mtypes) == sorted(other.mtypes)
+            eq = self.sorted_mtypes == other.sorted_mtypes
 
         return eq
 
     def __lt__(self, other):
         if isinstance(other, Mcomb):
-            lt = sorted(self.mtypes) < sorted(other.mtypes)
+            lt = self.sorted_mtypes < other.sorted_mtypes
 
         elif isinstance(other, MuType):
             lt = False
@@ -88,7 +130,7 @@ class Mcomb(MutComb):
                                  for mtype in self.mtypes]))
 
 
-class ExMcomb(MutComb):
+class ExMcomb(FrozenComb):
 
     def __new__(cls, all_mtype, *mtypes):
         obj = super().__new__(cls, *mtypes,
@@ -96,10 +138,11 @@ class ExMcomb(MutComb):
 
         obj.all_mtype = all_mtype
         obj.cur_level = all_mtype.cur_level
+        obj.freeze()
 
         return obj
 
-    def __hash__(self):
+    def get_hash(self):
         value = len(self.mtypes) * hash(self.all_mtype)
 
         for mtype in self.mtypes:
@@ -110,23 +153,28 @@ class ExMcomb(MutComb):
 
         return value
 
+    def __hash__(self):
+        return self.hash_value
+
     def __getnewargs__(self):
         return (self.all_mtype,) + tuple(self.mtypes)
 
     def __str__(self):
-        return ' & '.join(str(mtype) for mtype in sorted(self.mtypes))
+        return ' & '.join(str(mtype) for mtype in self.sorted_mtypes)
 
     def __repr__(self):
         return 'ONLY {}'.format(
-            ' AND '.join(repr(mtype) for mtype in sorted(self.mtypes)))
+            ' AND '.join(repr(mtype) for mtype in self.sorted_mtypes))
 
     def __eq__(self, other):
         if not isinstance(other, ExMcomb):
             eq = False
+        elif self.hash_value != other.hash_value:
+            eq = False
 
         else:
             eq = self.all_mtype == other.all_mtype
-            eq &= sorted(self.mtypes) == sorted(other.mtypes)
+            eq &= self.sorted_mtypes == other.sorted_mtypes
 
         return eq
 
@@ -135,7 +183,7 @@ class ExMcomb(MutComb):
             if self.all_mtype != other.all_mtype:
                 lt = self.all_mtype < other.all_mtype
             else:
-                lt = sorted(self.mtypes) < sorted(other.mtypes)
+                lt = self.sorted_mtypes < other.sorted_mtypes
 
         elif isinstance(other, (MuType, Mcomb)):
             lt = False
@@ -168,39 +216,135 @@ class ExMcomb(MutComb):
                                    for mtype in self.mtypes]))
 
 
+# the size distributions of random subgroupings, the sorted samples they
+# are drawn from in each cohort, and the samples drawn for each seeded
+# subgrouping, which are only found once in each process
+_size_rvs = dict()
+_random_pools = dict()
+_random_draws = dict()
+
+# the samples drawn for random subgroupings that were loaded from file,
+# kept for each of the mutation trees of the cohort they were drawn from
+_saved_draws = dict()
+
+# the mutation trees the above are cached for, which are only referred to by
+# their identifiers so that their cached entries can be removed once they
+# are no longer in use elsewhere
+_cached_trees = dict()
+
+
+def track_tree(mtree):
+    """Gets the identifier random subgroupings are cached for a tree with."""
+    tree_id = id(mtree)
+
+    if tree_id not in _cached_trees:
+        _cached_trees[tree_id] = weakref.finalize(mtree, forget_tree,
+                                                  tree_id)
+
+    return tree_id
+
+
+def forget_tree(tree_id):
+    """Removes everything cached for a mutation tree that has been deleted."""
+    _cached_trees.pop(tree_id, None)
+    _saved_draws.pop(tree_id, None)
+
+    for pool_key in [pool_key for pool_key in _random_pools
+                     if tree_id in pool_key[0]]:
+        del _random_pools[pool_key]
+
+    for draw_key in [draw_key for draw_key in _random_draws
+                     if tree_id in draw_key[0][0]]:
+        del _random_draws[draw_key]
+
+
+def build_size_rv(size_dist, seed=None):
+    """Creates the distribution of a random subgrouping's sizes."""
+    if isinstance(size_dist, int):
+        size_rv = rv_discrete(a=size_dist, b=size_dist,
+                              values=([size_dist], [1]), seed=seed)
+
+    elif len(size_dist) == 2 and isinstance(size_dist[0], int):
+        size_rv = rv_discrete(
+            a=size_dist[0], b=size_dist[1],
+            values=([x for x in range(size_dist[0], size_dist[1] + 1)],
+                    [(size_dist[1] + 1 - size_dist[0]) ** -1
+                     for _ in range(size_dist[0], size_dist[1] + 1)]),
+            seed=seed
+            )
+
+    elif isinstance(size_dist, set):
+        size_rv = rv_discrete(
+            a=min(size_dist), b=max(size_dist),
+            values=(sorted(size_dist),
+                    [len(size_dist) ** -1 for _ in size_dist]),
+            seed=seed
+            )
+
+    else:
+        raise ValueError("Unrecognized size distribution "
+                         "`{}` !".format(size_dist))
+
+    return size_rv
+
+
+def get_sample_pool(base_mtype, *mtrees):
+    """Gets the sorted samples random subgroupings are drawn from."""
+    pool_key = tuple(track_tree(mtree) for mtree in mtrees), base_mtype
+
+    if pool_key not in _random_pools:
+        if base_mtype:
+            use_samps = base_mtype.get_samples(*mtrees)
+        else:
+            use_samps = mtrees[0].get_samples()
+
+        _random_pools[pool_key] = sorted(use_samps)
+
+    return pool_key, _random_pools[pool_key]
+
+
 class RandomType(MuType):
 
     def __init__(self, size_dist, base_mtype=None, seed=None):
+        if not (isinstance(size_dist, (int, set))
+                or (len(size_dist) == 2 and isinstance(size_dist[0], int))):
+            raise ValueError("Unrecognized size distribution "
+                             "`{}` !".format(size_dist))
+
         self.size_dist = size_dist
         self.base_mtype = base_mtype
         self.seed = seed
 
-        if isinstance(size_dist, int):
-            self.size_rv = rv_discrete(a=size_dist, b=size_dist,
-                                       values=([size_dist], [1]), seed=seed)
-
-        elif len(size_dist) == 2 and isinstance(size_dist[0], int):
-            self.size_rv = rv_discrete(
-                a=size_dist[0], b=size_dist[1],
-                values=([x for x in range(size_dist[0], size_dist[1] + 1)],
-                        [(size_dist[1] + 1 - size_dist[0]) ** -1
-                         for _ in range(size_dist[0], size_dist[1] + 1)]),
-                seed=seed
-                )
-
-        elif isinstance(size_dist, set):
-            self.size_rv = rv_discrete(
-                a=min(size_dist), b=max(size_dist),
-                values=(sorted(size_dist),
-                        [len(size_dist) ** -1 for _ in size_dist]),
-                seed=seed
-                )
+        super().__init__([])
+
+    @property
+    def size_rv(self):
+        size_key = self.get_size_key()
 
+        if size_key not in _size_rvs:
+            _size_rvs[size_key] = build_size_rv(self.size_dist, self.seed)
+
+        return _size_rvs[size_key]
+
+    def get_size_key(self):
+        """Gets a hashable label for this subgrouping's size and seed."""
+        if isinstance(self.size_dist, set):
+            dist_key = frozenset(self.size_dist)
+        elif isinstance(self.size_dist, int):
+            dist_key = self.size_dist
         else:
-            raise ValueError("Unrecognized size distribution "
-                             "`{}` !".format(size_dist))
+            dist_key = tuple(self.size_dist)
 
-        super().__init__([])
+        return dist_key, self.seed
+
+    def get_size(self):
+        """Finds the number of samples this subgrouping is drawn with."""
+        if isinstance(self.size_dist, int):
+            use_size = self.size_dist
+        else:
+            use_size = int(self.size_rv.rvs(random_state=self.seed))
+
+        return use_size
 
     def __getstate__(self):
         return self.size_dist, self.base_mtype, self.seed
@@ -281,17 +425,43 @@ class RandomType(MuType):
         else:
             return NotImplemented
 
+    def draw_indices(self, n_samps):
+        """Picks the positions of this subgrouping's samples in its pool.
+
+        The same samples are drawn as by seeding Python's global random
+        number generator with this subgrouping's seed and then sampling
+        from the sorted pool, without changing the state of the former.
+
+        """
+        return random.Random(self.seed).sample(range(n_samps),
+                                               k=self.get_size())
+
     def get_samples(self, *mtrees):
-        #TODO: having two random seed setups is not great
-        random.seed(self.seed)
-        use_size = self.size_rv.rvs(random_state=self.seed)
+        size_key = self.get_size_key()
+
+        if self.seed is not None:
+            saved_draws = _saved_draws.get(id(mtrees[0]), dict())
+
+            if (self.base_mtype, size_key) in saved_draws:
+                return set(saved_draws[self.base_mtype, size_key])
+
+        pool_key, use_samps = get_sample_pool(self.base_mtype, *mtrees)
+
+        # subgroupings without a seed are drawn again each time, as they are
+        # not meant to be the same between calls or between each other
+        if self.seed is None:
+            samps = {use_samps[i] for i in self.draw_indices(len(use_samps))}
 
-        if self.base_mtype:
-            use_samps = self.base_mtype.get_samples(*mtrees)
         else:
-            use_samps = mtrees[0].get_samples()
+            draw_key = pool_key, size_key
+
+            if draw_key not in _random_draws:
+                _random_draws[draw_key] = frozenset(
+                    use_samps[i] for i in self.draw_indices(len(use_samps)))
 
-        return set(random.sample(sorted(use_samps), k=use_size))
+            samps = _random_draws[draw_key]
+
+        return set(samps)
 
     def get_sorted_levels(self):
         if self.base_mtype is None:
@@ -309,3 +479,94 @@ class RandomType(MuType):
 
         return mut_lbls
 
+
+def draw_random_samples(rand_mtypes, *mtrees):
+    """Draws the samples of many random subgroupings of a cohort at once.
+
+    Random subgroupings drawn from the same pool of samples share one
+    sorted copy of the pool, and the samples they are drawn with are filled
+    into the rows of a boolean matrix over the pool's samples.
+
+    Args:
+        rand_mtypes (:obj:`iterable` of :obj:`RandomType`)
+        mtrees (MuTree): The cohort's mutation trees, as would be given to
+                         :meth:`RandomType.get_samples`.
+
+    Returns:
+        draw_mat (pd.DataFrame): Whether each random subgrouping (row)
+                                 includes each sample (column).
+
+    """
+    rand_mtypes = list(rand_mtypes)
+    pool_dict = dict()
+
+    for i, rand_mtype in enumerate(rand_mtypes):
+        pool_key, use_samps = get_sample_pool(rand_mtype.base_mtype, *mtrees)
+
+        if pool_key not in pool_dict:
+            pool_dict[pool_key] = use_samps, []
+        pool_dict[pool_key][1].append(i)
+
+    samp_list = sorted(set().union(*[use_samps
+                                     for use_samps, _ in pool_dict.values()]))
+    samp_index = pd.Index(samp_list)
+    draw_mat = np.zeros((len(rand_mtypes), len(samp_list)), dtype=bool)
+
+    for use_samps, mtype_indx in pool_dict.values():
+        pool_indx = samp_index.get_indexer(use_samps)
+
+        for i in mtype_indx:
+            draw_mat[i, pool_indx[rand_mtypes[i].draw_indices(
+                len(use_samps))]] = True
+
+    return pd.DataFrame(draw_mat, index=rand_mtypes, columns=samp_list)
+
+
+def save_random_samples(draw_mat, out_file):
+    """Saves the samples drawn for random subgroupings as packed bits."""
+    tmp_file = "{}.tmp-{}".format(out_file, os.getpid())
+
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({'mtypes': list(draw_mat.index),
+                     'samples': np.array(draw_mat.columns),
+                     'bits': np.packbits(draw_mat.values, axis=1)},
+                    f, protocol=-1)
+
+    os.replace(tmp_file, out_file)
+
+
+def load_random_samples(out_file, *mtrees):
+    """Reads the samples drawn for random subgroupings of a cohort.
+
+    Once loaded, the saved samples of these random subgroupings are returned
+    by :meth:`RandomType.get_samples` in this process without being drawn
+    again whenever they are asked for using the given mutation trees.
+
+    Args:
+        out_file (str): A file written by :func:`save_random_samples`.
+        mtrees (MuTree): The mutation trees of the cohort the samples were
+                         drawn from.
+
+    Returns:
+        draw_mat (pd.DataFrame): As given by :func:`draw_random_samples`.
+
+    """
+    with open(out_file, 'rb') as f:
+        draw_data = pickle.load(f)
+
+    draw_mat = pd.DataFrame(
+        np.unpackbits(draw_data['bits'], axis=1)[
+            :, :len(draw_data['samples'])].astype(bool),
+        index=draw_data['mtypes'], columns=draw_data['samples']
+        )
+
+    saved_draws = {
+        (rand_mtype.base_mtype, rand_mtype.get_size_key()): frozenset(
+            draw_mat.columns[draw_vals])
+        for rand_mtype, draw_vals in zip(draw_mat.index, draw_mat.values)
+        }
+
+    for mtree in mtrees:
+        _saved_draws[track_tree(mtree)] = saved_draws
+
+    return draw_mat
@@ -1,8 +1,6 @@
 
 import os
 import argparse
-import bz2
-import dill as pickle
 import pipes
 from math import ceil
 
@@ -59,10 +57,11 @@ def main():
                            "muts-count.txt"), 'r') as f:
         muts_count = int(f.readline())
 
-    # find how large the training cohort will be
-    with bz2.BZ2File(os.path.join(args.out_dir, 'setup',
-                                  "cohort-data.p.gz"), 'r') as f:
-        samp_count = len(pickle.load(f).get_samples())
+    # find how large the training cohort will be; this module is also
+    # imported directly by the Snakefiles, hence the deferred import
+    from .handle_input import load_cdata
+    samp_count = len(load_cdata(os.path.join(
+        args.out_dir, 'setup', "cohort-data.p.gz")).get_samples())
 
     task_load = args.run_max * (607 ** args.samp_exp)
     task_load //= args.task_size * ((1.07 * samp_count) ** args.samp_exp)
@@ -1,7 +1,9 @@
 
+from ..data.maf import (
+    normalize_maf, drop_categories, parse_transcripts, vep_forms)
 from dryadic.features.cohorts import BaseMutationCohort
-from dryadic.features.cohorts.utils import (
-    get_gencode, log_norm, drop_duplicate_genes)
+from ..data.annot import load_annot_index
+from dryadic.features.cohorts.utils import log_norm, drop_duplicate_genes
 
 import os
 import numpy as np
@@ -43,23 +45,10 @@ def load_beat_variants(syn, **var_args):
                            usecols=use_cols, names=use_fields)
 
     if 'Transcript' in use_fields:
-        var_data['Transcript'] = var_data.HGVSc.str.split('\\.[0-9]+:').apply(
-            lambda x: '.' if isinstance(x, float) else x[0])
+        var_data['Transcript'] = parse_transcripts(var_data.HGVSc)
 
     if 'Form' in use_fields:
-        var_data['Form'] = variants.Consequence.map({
-            'missense_variant': 'Missense_Mutation',
-            'frameshift_variant': 'frameshift_variant',
-            'inframe_deletion': 'In_Frame_Del',
-            'inframe_insertion': 'In_Frame_Ins',
-            'stop_gained': 'Nonsense_Mutation',
-            'start_lost': 'Translation_Start_Site',
-            'protein_altering_variant': 'Nonsense_Mutation',
-            'stop_lost': 'Nonstop_Mutation',
-            'internal_tandem_duplication': 'ITD',
-            'splice_acceptor_variant': 'Splice_Site',
-            'splice_donor_variant': 'Splice_Site',
-            })
+        var_data['Form'] = var_data.Consequence.map(vep_forms)
 
         var_data.loc[(var_data.Form == 'frameshift_variant')
                    & (var_data.Variant_Class == 'insertion'),
@@ -71,7 +60,7 @@ def load_beat_variants(syn, **var_args):
     if 'ref_count' in use_fields:
         var_data['ref_count'] = var_data.total_reads - var_data.alt_count
 
-    return var_data
+    return normalize_maf(var_data, barcode_parts=None)
 
 
 def process_input_datasets(baml_dir, annot_dir, syn, **data_args):
@@ -82,31 +71,28 @@ def process_input_datasets(baml_dir, annot_dir, syn, **data_args):
     expr = load_beat_expression(baml_dir)
 
     annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    if 'annot_fields' in data_args:
-        annot_data = get_gencode(annot_file, data_args['annot_fields'])
-    else:
-        annot_data = get_gencode(annot_file)
-
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if ens in set(expr.columns)}
+    annot_index = load_annot_index(annot_file,
+                                   data_args.get('annot_fields', None))
+    annot_dict = annot_index.get_annot_dict(expr.columns, by='Ens')
 
     # TODO: incorporate supplemental mutation data, eg. laboratory-based
     # data for FLT3 ITDs found here:
     # https://www.nature.com/articles/s41586-018-0623-z
     variants = load_beat_variants(syn, **data_args)
-    variants['Sample'] = ['pid{}'.format(pid) for pid in variants.Sample.values]
-    samp_data['Sample'] = ['pid{}'.format(pid) for pid in samp_data.patientId]
+    variants['Sample'] = ('pid' + variants.Sample.astype(str)).astype(
+        'category')
+    samp_data['Sample'] = 'pid' + samp_data.patientId.astype(str)
     use_samps = set(expr.index) & set(samp_data.Sample)
 
-    expr = expr.loc[use_samps, expr.columns.isin(annot_data)]
-    expr_data = drop_duplicate_genes(expr.rename(
-        columns={gn: annot_data[gn]['gene_name'] for gn in expr.columns}))
+    gene_names = annot_index.get_gene_names(expr.columns)
+    expr = expr.loc[use_samps, [gn is not None for gn in gene_names]]
+    expr_data = drop_duplicate_genes(expr.rename(columns=dict(zip(
+        expr.columns, [gn for gn in gene_names if gn is not None]))))
 
     # duplicates need to be filtered out here as they arise from two different
     # callers (varscan and mutect) being used to produce the mutation dataset
-    variants = variants.loc[variants.Sample.isin(use_samps)
-                            & variants.Gene.isin(annot_dict)]
+    variants = drop_categories(variants.loc[variants.Sample.isin(use_samps)
+                                            & variants.Gene.isin(annot_dict)])
     variants = variants.loc[~variants.duplicated()]
 
     return expr_data, variants, annot_dict
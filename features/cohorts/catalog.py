@@ -0,0 +1,219 @@
+"""Cataloguing the molecular subtypes of the samples in each cohort.
+
+This module contains a catalog of the cohorts listed in the TCGA subtype
+table and the METABRIC clinical sample table, which is built once from these
+files and saved alongside the TCGA subtype table, so that the subtypes of a
+cohort's samples can be looked up without parsing either table again.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+from .metabric import load_metabric_samps, list_subtypes
+from .metabric import choose_subtypes as choose_metabric_subtypes
+
+import numpy as np
+import pandas as pd
+
+import os
+import dill as pickle
+
+
+SUBTYPE_CATALOG_VERSION = 1
+
+# catalogs already loaded in this process, keyed by their source files
+_loaded_catalogs = dict()
+
+# the METABRIC subtypes that are defined using more than one receptor status
+metabric_groups = ('luminal', 'nonbasal')
+
+
+def get_source_stats(src_files):
+    """Gets the size and modification time of each source of a catalog."""
+    src_stats = dict()
+
+    for src_file in src_files:
+        src_stat = os.stat(src_file)
+        src_stats[os.path.abspath(src_file)] = (src_stat.st_size,
+                                                src_stat.st_mtime_ns)
+
+    return src_stats
+
+
+def build_subtype_catalog(subtype_file, metabric_dir=None):
+    """Parses subtype tables into the samples of each cohort's subtypes.
+
+    Args:
+        subtype_file (str): The table of TCGA samples' molecular subtypes.
+        metabric_dir (str, optional): Where the METABRIC datasets have been
+                                      downloaded; the default is to not
+                                      include the METABRIC cohort.
+
+    Returns:
+        catalog (dict)
+
+    """
+    cohort_info = dict()
+    subtype_samps = dict()
+
+    type_data = pd.read_csv(subtype_file, sep='\t', index_col=0, comment='#')
+    for coh, coh_types in type_data.groupby('DISEASE')['SUBTYPE']:
+        cohort_info[coh] = {'source': 'TCGA', 'samples': len(coh_types)}
+
+        subtype_samps[coh] = {
+            subt: np.sort(subt_samps.index.values.astype(str))
+            for subt, subt_samps in coh_types.groupby(coh_types)
+            }
+
+    src_files = [subtype_file]
+    if metabric_dir is not None:
+        metabric_file = os.path.join(metabric_dir, "data_clinical_sample.txt")
+        src_files += [metabric_file]
+
+        samp_data = load_metabric_samps(metabric_dir)
+        cohort_info['METABRIC'] = {'source': 'METABRIC',
+                                   'samples': len(samp_data)}
+
+        metabric_types = list_subtypes(samp_data)
+        metabric_types.update({
+            subt: choose_metabric_subtypes(samp_data, subt)
+            for subt in metabric_groups
+            })
+
+        subtype_samps['METABRIC'] = {
+            subt: np.sort(np.array(list(samps), dtype=str))
+            for subt, samps in metabric_types.items()
+            }
+
+    return {'version': SUBTYPE_CATALOG_VERSION,
+            'sources': get_source_stats(src_files),
+            'cohorts': cohort_info, 'subtypes': subtype_samps}
+
+
+class SubtypeCatalog(object):
+    """The cohorts, subtypes, and subtype samples found in subtype tables.
+
+    Args:
+        catalog (dict): As built by :func:`build_subtype_catalog`.
+
+    Examples:
+        >>> catalog = load_subtype_catalog(subtype_file, metabric_dir)
+        >>> luma_samps = catalog.get_samples('BRCA', ['LumA'])
+        >>> type_dict = catalog.list_subtypes('HNSC')
+
+    """
+
+    def __init__(self, catalog):
+        self.cohorts = catalog['cohorts']
+        self.subtypes = catalog['subtypes']
+
+    def __contains__(self, cohort):
+        return cohort in self.cohorts
+
+    def list_cohorts(self, source=None):
+        """Lists the catalogued cohorts, optionally from one source only."""
+        return sorted(coh for coh, coh_info in self.cohorts.items()
+                      if source is None or coh_info['source'] == source)
+
+    def count_samples(self, cohort):
+        """Gets the number of samples a cohort has subtype data for."""
+        return self.cohorts[cohort]['samples']
+
+    def get_samples(self, cohort, use_types):
+        """Gets the samples of a cohort belonging to any of given subtypes.
+
+        Args:
+            cohort (str): A catalogued cohort, eg. 'BRCA' or 'METABRIC'.
+            use_types (:obj:`iterable` of :obj:`str`)
+
+        Returns:
+            use_samps (set)
+
+        """
+        coh_types = self.subtypes.get(cohort, dict())
+
+        return {str(samp) for subt in use_types if subt in coh_types
+                for samp in coh_types[subt]}
+
+    def list_subtypes(self, cohort, subtypes=None):
+        """Gets the samples belonging to each subtype of a cohort.
+
+        Args:
+            cohort (str): A catalogued cohort.
+            subtypes (:obj:`iterable` of :obj:`str`, optional)
+                Which subtypes to list; the default is to list every subtype
+                each of the cohort's samples was assigned to.
+
+        Returns:
+            type_dict (dict): A :obj:`pd.Index` of samples for each subtype.
+
+        """
+        coh_types = self.subtypes.get(cohort, dict())
+
+        if subtypes is None:
+            if cohort == 'METABRIC':
+                subtypes = [subt for subt in coh_types
+                            if subt not in metabric_groups]
+            else:
+                subtypes = list(coh_types)
+
+        return {subt: pd.Index(coh_types[subt]) for subt in subtypes}
+
+
+def load_subtype_catalog(subtype_file, metabric_dir=None, catalog_file=None):
+    """Loads the catalog of subtype tables, building it if needed.
+
+    Catalogs are rebuilt whenever one of the tables they were built from
+    changes, and are only read from disk once per process.
+
+    Args:
+        subtype_file (str): The table of TCGA samples' molecular subtypes.
+        metabric_dir (str, optional): Where the METABRIC datasets have been
+                                      downloaded.
+        catalog_file (str, optional): Where the catalog is saved; the
+                                      default is alongside the TCGA subtype
+                                      table.
+
+    Returns:
+        catalog (SubtypeCatalog)
+
+    """
+    src_files = [subtype_file]
+    if metabric_dir is not None:
+        src_files += [os.path.join(metabric_dir, "data_clinical_sample.txt")]
+
+    src_stats = get_source_stats(src_files)
+    load_key = tuple(sorted(src_stats.items()))
+
+    if load_key not in _loaded_catalogs:
+        if catalog_file is None:
+            catalog_file = "{}.catalog-{}.p".format(
+                subtype_file, 'metabric' if metabric_dir else 'tcga')
+
+        catalog = None
+        if os.path.isfile(catalog_file):
+            try:
+                with open(catalog_file, 'rb') as f:
+                    catalog = pickle.load(f)
+
+            except (IOError, EOFError, pickle.UnpicklingError):
+                catalog = None
+
+        if (catalog is None or catalog['version'] != SUBTYPE_CATALOG_VERSION
+                or catalog['sources'] != src_stats):
+            catalog = build_subtype_catalog(subtype_file, metabric_dir)
+            tmp_file = "{}.tmp-{}".format(catalog_file, os.getpid())
+
+            try:
+                with open(tmp_file, 'wb') as f:
+                    pickle.dump(catalog, f, protocol=-1)
+                os.replace(tmp_file, catalog_file)
+
+            # the catalog can still be used by this process when it can't
+            # be saved next to a read-only subtype table
+            except IOError:
+                pass
+
+        _loaded_catalogs[load_key] = SubtypeCatalog(catalog)
+
+    return _loaded_catalogs[load_key]
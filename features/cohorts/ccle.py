@@ -1,7 +1,11 @@
 
 from ..data.expression import get_expr_toil
+from ..data.maf import (
+    normalize_maf, drop_categories, parse_exons, profile_forms)
 from dryadic.features.cohorts import BaseMutationCohort
-from dryadic.features.cohorts.utils import get_gencode, drop_duplicate_genes
+from ..data.annot import load_annot_index
+from .samples import SampleMap
+from dryadic.features.cohorts.utils import drop_duplicate_genes
 
 import os
 import pandas as pd
@@ -20,8 +24,10 @@ def load_ccle_expression(ccle_dir, expr_source, **expr_args):
             ).transpose()[1:].fillna(0.0)
 
     elif expr_source == 'toil':
-        expr_mat = get_expr_toil(cohort, expr_args['expr_dir'],
-                                 expr_args['collapse_txs'])
+        expr_mat = get_expr_toil(
+            cohort, expr_args['expr_dir'], expr_args['collapse_txs'],
+            cache_dir=expr_args.get('toil_cache', None)
+            )
 
     else:
         raise ValueError("Unrecognized source of CCLE expression "
@@ -38,7 +44,7 @@ def load_ccle_variants(ccle_dir, var_source='default'):
 
         mut_df = pd.read_csv(
             os.path.join(ccle_dir, "data_mutations_mskcc.txt"),
-            names=use_names, usecols=use_cols, engine='python', sep='\t',
+            names=use_names, usecols=use_cols, engine='c', sep='\t',
             header=None, comment='#', skiprows=2
             )
 
@@ -49,8 +55,7 @@ def load_ccle_variants(ccle_dir, var_source='default'):
             engine='python', sep='\t'
             )
 
-        mut_df['Exon'] = ['.' if pd.isnull(exn) else int(exn.split('exon')[1])
-                          for exn in mut_df.exon]
+        mut_df['Exon'] = parse_exons(mut_df.exon)
 
         mut_df['alt_count'] = pd.to_numeric(
             (mut_df.reads * mut_df.vaf).round(0), downcast='integer')
@@ -60,20 +65,13 @@ def load_ccle_variants(ccle_dir, var_source='default'):
         mut_df = mut_df.rename(columns={
             'sample': 'Sample', 'gene': 'Gene', 'exon': 'Exon'})
 
-        mut_df.Form = mut_df.mutationType.map({
-            'missense SNV': 'Missense_Mutation',
-            'silent SNV': 'Silent',
-            'frameshift indel': 'Frame_Shift_Ins',
-            'nonsense SNV': 'Nonsense_Mutation',
-            'inframe indel': 'In_Frame_Del',
-            'stoploss': 'Nonstop_Mutation'
-            })
+        mut_df['Form'] = mut_df.mutationType.map(profile_forms)
 
     else:
         raise ValueError("Unrecognized source of METABRIC variant "
                          "data `{}` !".format(var_source))
 
-    return mut_df
+    return normalize_maf(mut_df, barcode_parts=None)
 
 
 def load_ccle_copies(ccle_dir):
@@ -87,26 +85,21 @@ def process_input_datasets(ccle_dir, annot_dir, expr_source, **coh_args):
     variants = load_ccle_variants(ccle_dir)
     copies = load_ccle_copies(ccle_dir)
 
-    expr.index = [samp_data.index[samp_data.SAMPLE_ID == smp][0]
-                  for smp in expr.index]
-    copies.index = [samp_data.index[samp_data.SAMPLE_ID == smp][0]
-                    for smp in copies.index]
-    variants.Sample = [samp_data.index[samp_data.SAMPLE_ID == smp][0]
-                       for smp in variants.Sample]
+    samp_map = SampleMap.from_table(samp_data, 'SAMPLE_ID')
+    expr.index = samp_map.translate(expr.index)
+    copies.index = samp_map.translate(copies.index)
+    variants['Sample'] = samp_map.translate(variants.Sample)
 
     use_samps = set(expr.index) & set(copies.index)
     expr = drop_duplicate_genes(expr.loc[use_samps])
 
     annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    annot_data = get_gencode(annot_file, ['transcript', 'exon'])
-
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if at['gene_name'] in set(expr.columns)}
+    annot_dict = load_annot_index(
+        annot_file, ['transcript', 'exon']).get_annot_dict(expr.columns)
 
     expr = expr.loc[:, expr.columns.isin(annot_dict)]
-    variants = variants.loc[variants.Sample.isin(use_samps)
-                            & variants.Gene.isin(annot_dict)]
+    variants = drop_categories(variants.loc[variants.Sample.isin(use_samps)
+                                            & variants.Gene.isin(annot_dict)])
 
     copies = copies.loc[use_samps, copies.columns.isin(annot_dict)]
     copy_df = pd.DataFrame(copies.stack()).reset_index()
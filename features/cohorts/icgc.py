@@ -10,6 +10,7 @@ import numpy as np
 import pandas as pd
 
 from .mut import BaseMutationCohort
+from .samples import SampleMap
 from HetMan.features.data.expression import get_expr_icgc
 from ..data.variants import get_variants_icgc
 
@@ -29,28 +30,22 @@ def match_icgc_samples(samples1, samples2, cohort, data_dir):
         samps_match (list)
 
     """
-    samps1 = list(set(samples1))
-    samps2 = list(set(samples2))
+    samps1 = pd.unique(np.asarray(samples1))
+    samps2 = pd.unique(np.asarray(samples2))
 
     # gets the sample annotation data for the given ICGC cohort
     sampl_file = os.path.join(data_dir, cohort, 'sample.tsv.gz')
     sampl_df = pd.read_csv(sampl_file, sep='\t')
+    donor_map = SampleMap.from_table(sampl_df, 'icgc_sample_id',
+                                     'icgc_donor_id')
 
     # for each of the two sample lists, matches the samples to ICGC donors
-    donors1 = {
-        sampl_df['icgc_donor_id'][
-            np.where(sampl_df['icgc_sample_id'] == samp)[0][0]]: samp
-        for samp in samps1
-        }
-    donors2 = {
-        sampl_df['icgc_donor_id'][
-            np.where(sampl_df['icgc_sample_id'] == samp)[0][0]]: samp
-        for samp in samps2
-        }
+    donors1 = dict(zip(donor_map.translate(samps1), samps1))
+    donors2 = dict(zip(donor_map.translate(samps2), samps2))
 
     # links the two sets of samples via common donors
     samps_match = [(donor, (donors1[donor], donors2[donor]))
-                   for donor in set(sampl_df['icgc_donor_id'])
+                   for donor in pd.unique(sampl_df['icgc_donor_id'])
                    if donor in donors1 and donor in donors2]
 
     return samps_match
@@ -1,6 +1,9 @@
 
+from ..data.maf import (
+    normalize_maf, drop_categories, parse_exons, profile_forms)
 from dryadic.features.cohorts import BaseMutationCohort
-from dryadic.features.cohorts.utils import get_gencode, drop_duplicate_genes
+from ..data.annot import load_annot_index
+from dryadic.features.cohorts.utils import drop_duplicate_genes
 
 import os
 import pandas as pd
@@ -53,8 +56,7 @@ def load_metabric_variants(metabric_dir, var_source='default', **var_args):
             engine='python', sep='\t'
             )
 
-        mut_df['Exon'] = ['.' if pd.isnull(exn) else int(exn.split('exon')[1])
-                          for exn in mut_df.exon]
+        mut_df['Exon'] = parse_exons(mut_df.exon)
 
         mut_df['alt_count'] = pd.to_numeric(
             (mut_df.reads * mut_df.vaf).round(0), downcast='integer')
@@ -64,20 +66,13 @@ def load_metabric_variants(metabric_dir, var_source='default', **var_args):
         mut_df = mut_df.rename(columns={
             'sample': 'Sample', 'gene': 'Gene', 'exon': 'Exon'})
 
-        mut_df.Form = mut_df.mutationType.map({
-            'missense SNV': 'Missense_Mutation',
-            'silent SNV': 'Silent',
-            'frameshift indel': 'Frame_Shift_Ins',
-            'nonsense SNV': 'Nonsense_Mutation',
-            'inframe indel': 'In_Frame_Del',
-            'stoploss': 'Nonstop_Mutation'
-            })
+        mut_df['Form'] = mut_df.mutationType.map(profile_forms)
 
     else:
         raise ValueError("Unrecognized source of METABRIC variant "
                          "data `{}` !".format(var_source))
 
-    return mut_df
+    return normalize_maf(mut_df, barcode_parts=None)
 
 
 def load_metabric_copies(metabric_dir):
@@ -152,14 +147,9 @@ def process_input_datasets(metabric_dir, annot_dir, use_types=None,
         ]) & set(expr.index)
 
     annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    if 'annot_fields' in data_args:
-        annot_data = get_gencode(annot_file, data_args['annot_fields'])
-    else:
-        annot_data = get_gencode(annot_file)
-
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if at['gene_name'] in set(expr.columns)}
+    annot_dict = load_annot_index(
+        annot_file, data_args.get('annot_fields', None)).get_annot_dict(
+            expr.columns)
 
     variants = load_metabric_variants(metabric_dir)
     copy_df = load_metabric_copies(metabric_dir)
@@ -174,8 +164,8 @@ def process_input_datasets(metabric_dir, annot_dir, use_types=None,
         use_samps &= choose_subtypes(samp_data, use_types)
 
     expr_data = expr.loc[use_samps, expr.columns.isin(annot_dict)]
-    variants = variants.loc[variants.Sample.isin(use_samps)
-                            & variants.Gene.isin(annot_dict)]
+    variants = drop_categories(variants.loc[variants.Sample.isin(use_samps)
+                                            & variants.Gene.isin(annot_dict)])
 
     copy_df = copy_df.loc[use_samps, copy_df.columns.isin(annot_dict)]
     copy_df = pd.DataFrame(copy_df.stack()).reset_index()
@@ -0,0 +1,101 @@
+"""Translating between the sample identifiers used by a cohort's datasets.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class SampleMap(object):
+    """A mapping between two sets of identifiers for the same samples.
+
+    The mapping is indexed once when it is created, after which any list of
+    identifiers can be translated in a single vectorized lookup. When an
+    identifier appears more than once in the table used to build the
+    mapping, its first appearance is used.
+
+    Args:
+        from_ids, to_ids (array-like): The identifiers of each sample in the
+                                       two naming schemes.
+
+    Examples:
+        >>> samp_map = SampleMap.from_table(samp_data, 'SAMPLE_ID')
+        >>> expr.index = samp_map.translate(expr.index)
+
+    """
+
+    def __init__(self, from_ids, to_ids):
+        from_ids = pd.Index(from_ids)
+        keep_ids = ~from_ids.duplicated(keep='first')
+
+        self.from_ids = from_ids[keep_ids]
+        self.to_ids = np.asarray(to_ids)[keep_ids]
+
+    @classmethod
+    def from_table(cls, samp_data, from_col, to_col=None):
+        """Builds a mapping from two columns of a sample annotation table.
+
+        Args:
+            samp_data (pd.DataFrame)
+            from_col (str): The column with the identifiers to translate.
+            to_col (str, optional): The column with the identifiers to
+                                    translate to; the default is to use the
+                                    table's index.
+
+        """
+        if to_col is None:
+            to_ids = samp_data.index
+        else:
+            to_ids = samp_data[to_col]
+
+        return cls(samp_data[from_col], to_ids)
+
+    def __len__(self):
+        return len(self.from_ids)
+
+    def get_indexer(self, samples):
+        """Finds the position of each sample in the mapping, or -1."""
+        return self.from_ids.get_indexer(pd.Index(samples))
+
+    def translate(self, samples, missing='raise'):
+        """Translates a list of sample identifiers.
+
+        Args:
+            samples (array-like)
+            missing (str, optional): What to do with samples not in the
+                                     mapping; the default is to raise an
+                                     error, they can otherwise be dropped
+                                     ('drop') or given as missing values
+                                     ('null').
+
+        Returns:
+            new_samples (:obj:`np.array`)
+
+        """
+        samp_indx = self.get_indexer(samples)
+        miss_indx = samp_indx == -1
+
+        if miss_indx.any():
+            if missing == 'raise':
+                raise KeyError("{} samples not found in the mapping, "
+                               "including `{}` !".format(
+                                   miss_indx.sum(),
+                                   np.asarray(samples)[miss_indx][0]
+                                   ))
+
+            elif missing == 'drop':
+                samp_indx = samp_indx[~miss_indx]
+
+            elif missing == 'null':
+                new_samps = np.empty(len(samp_indx), dtype=object)
+                new_samps[~miss_indx] = self.to_ids[samp_indx[~miss_indx]]
+
+                return new_samps
+
+            else:
+                raise ValueError("Unrecognized option for missing samples "
+                                 "`{}` !".format(missing))
+
+        return self.to_ids[samp_indx]
@@ -0,0 +1,311 @@
+"""Saving cohorts to disk in a format that can be attached to quickly.
+
+A cohort store is a directory consisting of a manifest and one file for each
+section of a cohort. The expression matrix is saved as an uncompressed
+float32 array that can be memory-mapped, so that fit workers running on the
+same node share its pages through the OS cache instead of each of them
+decompressing and unpickling their own copy. Sample and feature labels,
+mutation trees, mutation calls, gene annotation, and the remaining cohort
+attributes are pickled separately and are only read when asked for.
+
+Mutation trees added to a saved cohort after it was created are kept as
+deltas in a directory next to it, one pickle per tree, so that adding a tree
+never requires the rest of the cohort to be written out again.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+import dill as pickle
+
+
+STORE_VERSION = 1
+
+# the cohort attribute holding the expression matrix, and the attributes
+# that are saved as their own pickled sections of the store
+omic_attr = '_omic_data'
+store_sections = {'mtrees': 'mtrees', 'muts': '_muts', 'annot': 'gene_annot'}
+
+
+def get_store_path(fl):
+    """Finds where the store corresponding to a pickled cohort is located.
+
+    Args:
+        fl (str): A path to a cohort pickle, eg. "setup/cohort-data.p.gz".
+
+    Returns:
+        store_path (str): eg. "setup/cohort-data.store"
+
+    """
+    fl = str(fl)
+
+    if fl.endswith('.store'):
+        return fl
+    if fl.endswith('.gz'):
+        fl = fl[:-3]
+    if fl.endswith('.p'):
+        fl = fl[:-2]
+
+    return "{}.store".format(fl)
+
+
+def store_exists(store_path):
+    """Checks whether a complete cohort store is present at a location."""
+    return os.path.isfile(os.path.join(store_path, "manifest.json"))
+
+
+def save_cohort_store(cdata, store_path, expr_dtype=np.float32,
+                      expr_file=None):
+    """Writes a cohort object to disk as a sectioned store.
+
+    The store is first written to a temporary directory which is then moved
+    into place, so that workers polling for a store will never attach to one
+    that is only partially written.
+
+    Args:
+        cdata (BaseMutationCohort): Any cohort with an expression matrix.
+        store_path (str): Where the store directory will be created.
+        expr_dtype (type, optional): What to cast expression values to.
+        expr_file (str, optional): An .npy file already holding the cohort's
+                                   expression matrix, as written by
+                                   :func:`save_expr_rows`, which is moved
+                                   into the store instead of writing the
+                                   matrix again.
+
+    """
+    store_path = get_store_path(store_path)
+    tmp_path = "{}.tmp-{}".format(store_path, os.getpid())
+
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    coh_state = dict(vars(cdata))
+    omic_data = coh_state.pop(omic_attr)
+
+    if expr_file is None:
+        np.save(os.path.join(tmp_path, "expr.npy"),
+                np.ascontiguousarray(omic_data.values, dtype=expr_dtype))
+    else:
+        os.replace(expr_file, os.path.join(tmp_path, "expr.npy"))
+
+    with open(os.path.join(tmp_path, "index.p"), 'wb') as f:
+        pickle.dump((omic_data.index, omic_data.columns), f, protocol=-1)
+
+    for sect, attr in store_sections.items():
+        if attr in coh_state:
+            with open(os.path.join(tmp_path, "{}.p".format(sect)), 'wb') as f:
+                pickle.dump(coh_state.pop(attr), f, protocol=-1)
+
+    with open(os.path.join(tmp_path, "state.p"), 'wb') as f:
+        pickle.dump((type(cdata), coh_state), f, protocol=-1)
+
+    with open(os.path.join(tmp_path, "manifest.json"), 'w') as f:
+        json.dump({'version': STORE_VERSION,
+                   'shape': list(omic_data.shape),
+                   'dtype': np.dtype(expr_dtype).name,
+                   'sections': sorted(
+                       sect for sect in store_sections
+                       if os.path.exists(os.path.join(
+                           tmp_path, "{}.p".format(sect))))},
+                  f)
+
+    if os.path.exists(store_path):
+        shutil.rmtree(store_path)
+    os.rename(tmp_path, store_path)
+
+
+def cast_cohort_expr(cdata, expr_dtype=np.float32):
+    """Casts the expression values of a cohort in place.
+
+    Args:
+        cdata (BaseMutationCohort): Any cohort with an expression matrix.
+        expr_dtype (type, optional): What to cast expression values to.
+
+    Returns:
+        cdata (BaseMutationCohort)
+
+    """
+    setattr(cdata, omic_attr,
+            getattr(cdata, omic_attr).astype(expr_dtype, copy=False))
+
+    return cdata
+
+
+def save_expr_rows(row_file, expr_file, shape, dtype=np.float32,
+                   block_size=1024):
+    """Converts expression rows written one after another into an .npy file.
+
+    This allows an expression matrix to be streamed to disk a block of
+    samples at a time when its final number of samples is not known in
+    advance; the rows are then copied into a preallocated memory-mapped
+    array a block at a time.
+
+    Args:
+        row_file (str): A file of raw expression values, as written by
+                        :meth:`numpy.ndarray.tofile`. It is removed once it
+                        has been converted.
+        expr_file (str): Where to save the .npy file.
+        shape (tuple): The number of samples and features in the matrix.
+
+    """
+    row_mat = np.memmap(row_file, dtype=dtype, mode='r', shape=tuple(shape))
+    expr_mat = np.lib.format.open_memmap(expr_file, mode='w+', dtype=dtype,
+                                         shape=tuple(shape))
+
+    for i in range(0, shape[0], block_size):
+        expr_mat[i:(i + block_size)] = row_mat[i:(i + block_size)]
+
+    expr_mat.flush()
+    del row_mat, expr_mat
+    os.remove(row_file)
+
+
+def load_cohort_store(store_path, sections=None, mmap_mode='r'):
+    """Attaches to a cohort saved as a sectioned store.
+
+    Args:
+        store_path (str): The location of the store directory.
+        sections (:obj:`iterable` of :obj:`str`, optional)
+            Which of the pickled sections ('mtrees', 'muts', 'annot') to
+            load. The default is to load all of them; the expression matrix
+            and its labels are always attached.
+        mmap_mode (str, optional): How to memory-map the expression matrix;
+                                   see :func:`numpy.load`. If None, the
+                                   matrix is read fully into memory.
+
+    Returns:
+        cdata (BaseMutationCohort)
+
+    """
+    store_path = get_store_path(store_path)
+
+    with open(os.path.join(store_path, "manifest.json"), 'r') as f:
+        manifest = json.load(f)
+
+    if manifest['version'] != STORE_VERSION:
+        raise IOError("Cohort store {} has version {} but version {} "
+                      "was expected!".format(store_path, manifest['version'],
+                                             STORE_VERSION))
+
+    if sections is None:
+        sections = manifest['sections']
+
+    with open(os.path.join(store_path, "state.p"), 'rb') as f:
+        coh_cls, coh_state = pickle.load(f)
+    with open(os.path.join(store_path, "index.p"), 'rb') as f:
+        samps, feats = pickle.load(f)
+
+    expr_mat = np.load(os.path.join(store_path, "expr.npy"),
+                       mmap_mode=mmap_mode)
+    coh_state[omic_attr] = pd.DataFrame(expr_mat, index=samps,
+                                        columns=feats, copy=False)
+
+    for sect in sections:
+        if sect not in manifest['sections']:
+            raise ValueError("Section `{}` is not present in cohort "
+                             "store {} !".format(sect, store_path))
+
+        with open(os.path.join(store_path, "{}.p".format(sect)), 'rb') as f:
+            coh_state[store_sections[sect]] = pickle.load(f)
+
+    cdata = coh_cls.__new__(coh_cls)
+    cdata.__dict__.update(coh_state)
+
+    if 'mtrees' in sections:
+        load_mtree_deltas(cdata, store_path)
+
+    return cdata
+
+
+def get_delta_path(fl):
+    """Finds where the mutation trees added to a saved cohort are kept.
+
+    Args:
+        fl (str): A path to a cohort pickle or store.
+
+    Returns:
+        delta_path (str): eg. "setup/cohort-data.p.mtrees"
+
+    """
+    return "{}.mtrees".format(str(fl).rstrip(os.sep))
+
+
+def get_delta_base(fl):
+    """Gets the size and modification time of a saved cohort.
+
+    A delta is only valid for the version of the saved cohort it was built
+    from; once the cohort is saved again its deltas are ignored.
+
+    """
+    if os.path.isdir(fl):
+        fl = os.path.join(fl, "manifest.json")
+    fl_stat = os.stat(fl)
+
+    return [fl_stat.st_size, fl_stat.st_mtime_ns]
+
+
+def save_mtree_delta(mtree, mut_lvls, fl):
+    """Saves a mutation tree added to a saved cohort.
+
+    Args:
+        mtree (MuTree): The new mutation tree.
+        mut_lvls (:obj:`tuple` of :obj:`str`): The tree's mutation levels.
+        fl (str): The path the cohort was loaded from.
+
+    """
+    delta_path = get_delta_path(fl)
+    os.makedirs(delta_path, exist_ok=True)
+
+    delta_file = os.path.join(delta_path, "{}.p".format('__'.join(mut_lvls)))
+    tmp_file = "{}.tmp-{}".format(delta_file, os.getpid())
+
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({'version': STORE_VERSION, 'base': get_delta_base(fl),
+                     'levels': tuple(mut_lvls), 'mtree': mtree},
+                    f, protocol=-1)
+    os.replace(tmp_file, delta_file)
+
+
+def load_mtree_deltas(cdata, fl):
+    """Attaches the mutation trees saved as deltas to a loaded cohort.
+
+    Args:
+        cdata (BaseMutationCohort): A cohort loaded from `fl`.
+        fl (str): The path the cohort was loaded from.
+
+    Returns:
+        new_lvls (:obj:`list` of :obj:`tuple`)
+            The mutation levels of the trees that were attached.
+
+    """
+    delta_path = get_delta_path(fl)
+    new_lvls = []
+
+    if not os.path.isdir(delta_path):
+        return new_lvls
+
+    coh_base = get_delta_base(fl)
+    for delta_file in sorted(os.listdir(delta_path)):
+        if not delta_file.endswith('.p'):
+            continue
+
+        try:
+            with open(os.path.join(delta_path, delta_file), 'rb') as f:
+                delta = pickle.load(f)
+
+        except (IOError, EOFError, pickle.UnpicklingError):
+            continue
+
+        if (delta['version'] == STORE_VERSION and delta['base'] == coh_base
+                and delta['levels'] not in cdata.mtrees):
+            cdata.mtrees[delta['levels']] = delta['mtree']
+            new_lvls += [delta['levels']]
+
+    return new_lvls
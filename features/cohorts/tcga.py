@@ -1,7 +1,14 @@
 
 from ..data.expression import get_expr_firehose, get_expr_bmeg, get_expr_toil
 from ..data.copies import get_copies_firehose
+from ..data.variants import load_mc3_index
+from ..data.maf import normalize_maf, drop_categories
+from ..data.annot import load_annot_index
+from ..data.inventory import load_inventory, find_cohort_files
 from .mut_freq import BaseMutFreqCohort
+from .catalog import load_subtype_catalog
+from .store import (get_store_path, store_exists, save_expr_rows,
+                    save_cohort_store, load_cohort_store, save_mtree_delta)
 
 from dryadic.features.cohorts.mut import (
     BaseMutationCohort, BaseCopyCohort, BaseTransferMutationCohort)
@@ -12,13 +19,14 @@ import numpy as np
 import pandas as pd
 
 import os
+import dill as pickle
+import weakref
 from functools import reduce
-from re import sub as gsub
 import synapseclient
 from operator import and_
 from itertools import cycle, combinations
+from collections.abc import Mapping
 
-from pathlib import Path
 from sklearn.preprocessing import scale
 
 
@@ -50,10 +58,7 @@ def parse_subtypes(cohort):
 
 
 def choose_subtypes(use_types, base_coh, type_file):
-    type_data = pd.read_csv(type_file, sep='\t', index_col=0, comment='#')
-    type_data = type_data[type_data.DISEASE == base_coh]
-
-    return set(type_data.index[type_data.SUBTYPE.isin(use_types)])
+    return load_subtype_catalog(type_file).get_samples(base_coh, use_types)
 
 
 def get_expr_data(cohort, expr_source, **expr_args):
@@ -68,11 +73,16 @@ def get_expr_data(cohort, expr_source, **expr_args):
         expr_mat = get_expr_bmeg(cohort)
 
     elif expr_source == 'Firehose':
-        expr_mat = get_expr_firehose(cohort, expr_args['expr_dir'])
+        expr_mat = get_expr_firehose(
+            cohort, expr_args['expr_dir'],
+            cache_dir=expr_args.get('firehose_cache', None)
+            )
 
     elif expr_source == 'toil':
-        expr_mat = get_expr_toil(cohort, expr_args['expr_dir'],
-                                 expr_args['collapse_txs'])
+        expr_mat = get_expr_toil(
+            cohort, expr_args['expr_dir'], expr_args['collapse_txs'],
+            cache_dir=expr_args.get('toil_cache', None)
+            )
 
     else:
         raise ValueError("Unrecognized source of expression data!")
@@ -80,60 +90,33 @@ def get_expr_data(cohort, expr_source, **expr_args):
     return log_norm(expr_mat.fillna(0.0))
 
 
-def get_variant_data(cohort, var_source, **var_args):
+def get_variant_data(cohort, var_source, samples=None, **var_args):
     if var_source == 'mc3':
         mc3 = var_args['syn'].get('syn7824274')
 
-        field_dict = (
-            ('Gene', 0), ('Chr', 4), ('Start', 5), ('End', 6), ('Strand', 7),
-            ('Form', 8), ('RefAllele', 10), ('TumorAllele', 12),
-            ('Sample', 15), ('HGVS', 34), ('Protein', 36), ('Transcript', 37),
-            ('Exon', 38), ('depth', 39), ('ref_count', 40), ('alt_count', 41),
-            ('SIFT', 71), ('PolyPhen', 72), ('Filter', 108)
-            )
+        if 'mc3_index' in var_args:
+            index_dir = var_args['mc3_index']
+        else:
+            index_dir = os.path.join(os.path.dirname(mc3.path), "mc3-index")
 
         if 'mut_fields' not in var_args or var_args['mut_fields'] is None:
-            use_fields, use_cols = tuple(zip(*field_dict))
-
+            use_fields = None
         else:
-            use_fields, use_cols = tuple(zip(*[
-                (name, col) for name, col in field_dict
-                if name in {'Sample', 'Filter'} | set(var_args['mut_fields'])
-                ]))
-
-        # imports mutation data into a DataFrame, parses TCGA sample barcodes
-        # and PolyPhen scores
-        i = 0
-        while i < 10:
-            #TODO: handle I/O errors on the cohort/experiment level?
-            try:
-                var_data = pd.read_csv(mc3.path, engine='c', dtype='object',
-                                       sep='\t', header=None,
-                                       usecols=use_cols, names=use_fields,
-                                       comment='#', skiprows=1)
-                break
+            use_fields = {'Sample', 'Filter'} | set(var_args['mut_fields'])
 
-            except OSError:
-                i = i + 1
+        # imports the mutation data of the source sites the given samples
+        # were collected at from the partitioned MAF index, which is created
+        # from the full MAF if it isn't already available
+        var_data = load_mc3_index(mc3.path, index_dir, samples, use_fields,
+                                  categorical=True)
 
         #TODO: more fine-grained Filtering control?
         var_data = var_data.loc[~var_data.Filter.str.contains(
             'nonpreferredpair')]
 
-        for annt, null_val in zip(['PolyPhen', 'SIFT'], [0, 1]):
-            if annt in var_data:
-                var_data[annt] = var_data[annt].apply(
-                    lambda val: (np.float(gsub('\)$', '',
-                                               gsub('^.*\(', '', val)))
-                                 if val != '.' else null_val)
-                    )
+        # parses TCGA sample barcodes and PolyPhen and SIFT scores
+        var_data = normalize_maf(var_data)
 
-                if annt == 'SIFT':
-                    var_data[annt] = 1 - var_data[annt]
-
-        var_data.Sample = var_data.Sample.apply(
-            lambda smp: '-'.join(smp.split('-')[:4]))
-    
     elif var_source == 'Firehose':
         mut_tar = tarfile.open(glob.glob(os.path.join(
             data_dir, "stddata__2016_01_28", cohort, "20160128",
@@ -203,7 +186,8 @@ def add_mutations(cohort, var_source, copy_source, expr, gene_annot,
                                   Default is to only use point mutations.
 
     """
-    var_data = get_variant_data(cohort, var_source, **mut_args)
+    var_data = get_variant_data(cohort, var_source,
+                                samples=expr.index, **mut_args)
 
     # load copy number alteration data from the given source
     if copy_source == 'Firehose':
@@ -212,7 +196,10 @@ def add_mutations(cohort, var_source, copy_source, expr, gene_annot,
         else:
             copy_dir = mut_args['copy_dir']
 
-        copy_data = get_copies_firehose(cohort, copy_dir, discrete=True)
+        copy_data = get_copies_firehose(
+            cohort, copy_dir, discrete=True,
+            cache_dir=mut_args.get('firehose_cache', None), level='gene'
+            )
 
     else:
         raise ValueError("Unrecognized source of copy number data!")
@@ -221,7 +208,9 @@ def add_mutations(cohort, var_source, copy_source, expr, gene_annot,
     copy_df.columns = ['Sample', 'Gene', 'Copy']
 
     expr_match, var_match, copy_match = match_tcga_samples(
-        expr.index, var_data.Sample.values, copy_df.Sample.values)
+        expr.index, np.asarray(var_data.Sample, dtype=object),
+        copy_df.Sample.values
+        )
 
     new_expr = expr.loc[
         expr.index.isin(expr_match),
@@ -229,9 +218,9 @@ def add_mutations(cohort, var_source, copy_source, expr, gene_annot,
         ]
     new_expr.index = [expr_match[old_samp] for old_samp in new_expr.index]
 
-    new_vars = var_data[var_data.isin({
+    new_vars = drop_categories(var_data[var_data.isin({
         'Sample': var_match.keys(), 'Gene': gene_annot.keys()}).loc[
-            :, ['Gene', 'Sample']].all(axis=1)].copy()
+            :, ['Gene', 'Sample']].all(axis=1)])
     new_vars.Sample = new_vars.Sample.apply(lambda samp: var_match[samp])
  
     new_copy = copy_df.loc[(copy_df.Copy != 0)
@@ -249,30 +238,44 @@ def add_mutations(cohort, var_source, copy_source, expr, gene_annot,
 def list_cohorts(data_source, **data_args):
     """Finds all the TCGA cohorts available in a given data repository.
 
+    The data directories are looked up in a saved inventory, which only
+    lists directories that have changed since it was last used.
+
     Args:
         data_source (str): A repository which contains TCGA datasets.
+        data_args: Where the datasets are stored; `expr_dir` must be given,
+                   and copy number datasets are looked for in `copy_dir`
+                   if it is given and in `expr_dir` otherwise.
 
     """
+    if 'copy_dir' in data_args:
+        copy_dir = data_args['copy_dir']
+    else:
+        copy_dir = data_args['expr_dir']
 
     if data_source == 'BMEG':
         pass
 
     elif data_source == 'Firehose':
-        cohorts = {pth.parent.parent.name
-                   for pth in Path(data_args['expr_dir']).glob(
-                       "stddata__*/**/*__RSEM_genes_normalized__*")}
+        cohorts = set(find_cohort_files(
+            data_args['expr_dir'],
+            ['stddata__*', '*', '*', '*__RSEM_genes_normalized__*'],
+            cohort_level=1
+            ))
 
     elif data_source == 'toil':
-        cohorts = {pth.name.split('TCGA_')[1].split('_tpm')[0]
-                   for pth in Path(data_args['expr_dir']).glob(
-                       "TCGA/TCGA_*_tpm.tsv.gz")}
+        cohorts = {os.path.basename(fl).split('TCGA_')[1].split('_tpm')[0]
+                   for fl in load_inventory(data_args['expr_dir']).find_files(
+                       ['TCGA', 'TCGA_*_tpm.tsv.gz'])}
 
     else:
         raise ValueError("Unrecognized source of expression data!")
 
-    cohorts &= {pth.parent.parent.name
-                for pth in Path(data_args['copy_dir']).glob(
-                    "analyses__*/**/*CopyNumber_Gistic2.Level_4*")}
+    cohorts &= set(find_cohort_files(
+        copy_dir,
+        ['analyses__*', '*', '*', '*CopyNumber_Gistic2.Level_4*'],
+        cohort_level=1
+        ))
 
     return cohorts
 
@@ -287,16 +290,12 @@ def process_input_datasets(cohort, expr_source, var_source, copy_source,
                                               **data_args))
 
     annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    if 'annot_fields' in data_args:
-        annot_data = get_gencode(annot_file, data_args['annot_fields'])
-    else:
-        annot_data = get_gencode(annot_file)
+    annot_index = load_annot_index(annot_file,
+                                   data_args.get('annot_fields', None))
 
     # restructure annotation data around expression gene labels
-    use_genes = set(expr.columns.get_level_values('Gene'))
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if at['gene_name'] in use_genes}
+    annot_dict = annot_index.get_annot_dict(
+        expr.columns.get_level_values('Gene'))
 
     expr, variants, copy_df = add_mutations(base_coh, var_source, copy_source,
                                             expr, annot_dict, **data_args)
@@ -386,14 +385,11 @@ class CopyCohort(BaseCopyCohort):
         # load expression and gene annotation datasets
         expr = drop_duplicate_genes(get_expr_data(cohort, expr_source,
                                                   **coh_args))
-        annot_data = get_gencode(annot_file, annot_fields)
+        annot_index = load_annot_index(annot_file, annot_fields)
 
         # restructure annotation data around expression gene labels
-        self.gene_annot = {
-            at['gene_name']: {**{'Ens': ens}, **at}
-            for ens, at in annot_data.items()
-            if at['gene_name'] in set(expr.columns.get_level_values('Gene'))
-            }
+        self.gene_annot = annot_index.get_annot_dict(
+            expr.columns.get_level_values('Gene'))
 
         if copy_source == 'Firehose':
             if 'copy_dir' not in coh_args:
@@ -594,7 +590,204 @@ class PanCancerMutCohort(BaseMutationCohort):
                          top_genes, samp_cutoff, cv_prop, cv_seed)
 
 
+class TransferCohortHandle(object):
+    """The datasets of one of the cohorts in a transfer cohort.
+
+    A cohort's expression and mutation datasets are only loaded when they
+    are first asked for, and are then kept until they are released or
+    handed out using :meth:`take`. The genes the cohort has expression data
+    for can be saved in a header file, so that the genes shared across
+    cohorts can be found without loading their expression matrices again;
+    otherwise the expression matrix read to find them is kept until the
+    cohort's datasets are loaded, so that it is only read once.
+
+    Args:
+        cohort (str): A cohort in TCGA.
+        expr_source, var_source, copy_source (str)
+            The repositories to get the cohort's datasets from.
+        coh_args: Passed on to :func:`get_expr_data` and
+                  :func:`add_mutations`. If `header_cache` is given, gene
+                  headers are saved in this directory.
+
+    """
+
+    def __init__(self, cohort, expr_source, var_source, copy_source,
+                 **coh_args):
+        self.cohort = cohort
+        self.expr_source = expr_source
+        self.var_source = var_source
+        self.copy_source = copy_source
+        self.coh_args = coh_args
+
+        self._genes = None
+        self._expr = None
+        self._data = None
+        self._taken = dict()
+
+    def get_header_path(self):
+        """Finds where the cohort's gene header is saved, if anywhere."""
+        if self.coh_args.get('header_cache', None) is None:
+            return None
+
+        hdr_tag = "{}__{}".format(self.cohort, self.expr_source)
+        if self.expr_source == 'toil' and self.coh_args.get('collapse_txs'):
+            hdr_tag += "__genes"
+
+        return os.path.join(self.coh_args['header_cache'],
+                            "{}.p".format(hdr_tag))
+
+    def load_expr(self):
+        """Loads the cohort's expression data."""
+        return drop_duplicate_genes(get_expr_data(
+            self.cohort, self.expr_source, **self.coh_args))
+
+    def get_genes(self, keep_expr=True):
+        """Gets the genes the cohort has expression data for.
+
+        If the genes are not found in a saved header, the cohort's
+        expression data is loaded to find them, and is kept for
+        :meth:`load` unless `keep_expr` is turned off.
+
+        """
+        if self._genes is not None:
+            return self._genes
+
+        hdr_path = self.get_header_path()
+        if hdr_path is not None and os.path.isfile(hdr_path):
+            with open(hdr_path, 'rb') as f:
+                self._genes = pickle.load(f)
+
+        else:
+            expr = self.load_expr()
+            self._genes = set(expr.columns.get_level_values('Gene'))
+
+            if keep_expr:
+                self._expr = expr
+
+            if hdr_path is not None:
+                os.makedirs(os.path.dirname(hdr_path), exist_ok=True)
+                tmp_path = "{}.tmp-{}".format(hdr_path, os.getpid())
+
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(self._genes, f, protocol=-1)
+                os.replace(tmp_path, hdr_path)
+
+        return self._genes
+
+    def load(self, gene_annot):
+        """Gets the cohort's expression data and mutation calls.
+
+        Args:
+            gene_annot (dict): Annotation for the genes to use.
+
+        Returns:
+            expr (pd.DataFrame), muts (pd.DataFrame)
+
+        """
+        if self._data is None or any(data is None for data in self._data):
+            if self._expr is None:
+                raw_expr = self.load_expr()
+            else:
+                raw_expr, self._expr = self._expr, None
+
+            expr, variants, copy_df = add_mutations(
+                self.cohort, self.var_source, self.copy_source,
+                raw_expr, gene_annot, **self.coh_args
+                )
+
+            variants.loc[:, 'Scale'] = 'Point'
+            copy_df.loc[:, 'Scale'] = 'Copy'
+            self._data = expr, pd.concat([variants, copy_df], sort=True)
+
+        return self._data
+
+    def take(self, gene_annot, data_indx):
+        """Hands out one of the cohort's datasets to be kept elsewhere.
+
+        The handle drops its own reference to the dataset once it has been
+        handed out, so that it is not held in memory twice, and releases the
+        cohort once none of its datasets are left. A dataset asked for again
+        is handed out from where it is being kept instead of being loaded
+        again, unless it has since been discarded.
+
+        Args:
+            gene_annot (dict): Annotation for the genes to use.
+            data_indx (int): Which of the datasets returned by
+                             :meth:`load` to hand out.
+
+        """
+        if data_indx in self._taken:
+            use_data = self._taken[data_indx]()
+
+            if use_data is not None:
+                return use_data
+
+        # a dataset handed out before and since discarded has to be loaded
+        # again along with the rest of the cohort's datasets
+        if self._data is not None and self._data[data_indx] is None:
+            self.release()
+        if self._data is None:
+            self.load(gene_annot)
+
+        cohort_data = list(self._data)
+        use_data = cohort_data[data_indx]
+        cohort_data[data_indx] = None
+        self._taken[data_indx] = weakref.ref(use_data)
+
+        if all(data is None for data in cohort_data):
+            self.release()
+        else:
+            self._data = tuple(cohort_data)
+
+        return use_data
+
+    def is_loaded(self):
+        """Checks whether the cohort's datasets are currently in memory."""
+        return self._data is not None or self._expr is not None
+
+    def release(self):
+        """Discards the cohort's datasets until they are needed again."""
+        self._expr = None
+        self._data = None
+
+
+class LazyCohortData(Mapping):
+    """A mapping of cohorts to datasets loaded as each cohort is accessed.
+
+    Args:
+        handles (dict): A :class:`TransferCohortHandle` for each cohort.
+        gene_annot (dict): Annotation for the genes to use.
+        data_indx (int): Which of the datasets returned by
+                         :meth:`TransferCohortHandle.load` to use.
+
+    """
+
+    def __init__(self, handles, gene_annot, data_indx):
+        self.handles = handles
+        self.gene_annot = gene_annot
+        self.data_indx = data_indx
+
+    def __getitem__(self, cohort):
+        return self.handles[cohort].take(self.gene_annot, self.data_indx)
+
+    def __iter__(self):
+        return iter(self.handles)
+
+    def __len__(self):
+        return len(self.handles)
+
+
 class TransferMutationCohort(BaseTransferMutationCohort):
+    """Expression and mutation datasets of many cohorts used together.
+
+    The genes shared by all of the cohorts are found from gene headers
+    saved in `header_cache` where it is given. Every cohort is still loaded
+    when the cohort is created, as the base cohort builds its mutation trees
+    and splits from all of them; each cohort's datasets are however dropped
+    by its handle as soon as they are handed over, so that the handles do
+    not keep a second copy of the datasets held by the base cohort.
+
+    """
 
     def __init__(self,
                  cohorts, mut_levels, mut_genes, expr_sources, var_sources,
@@ -605,52 +798,36 @@ class TransferMutationCohort(BaseTransferMutationCohort):
         if isinstance(expr_sources, str):
             expr_sources = [expr_sources]
 
+        # MC3 variant calls are read from its index for each cohort's
+        # samples as the cohort is loaded
         if var_sources is None:
             var_sources = expr_sources
-
-        elif 'mc3' in var_sources:
-            coh_args = {**coh_args,
-                        **{'mc3': get_variants_mc3(coh_args['syn'])}}
-
         elif isinstance(var_sources, str):
             var_sources = [var_sources]
 
         if isinstance(copy_sources, str):
             copy_sources = [copy_sources]
 
-        # load expression data for each cohort, get gene annotation
-        expr_raw = {coh: drop_duplicate_genes(get_expr_data(coh, expr_src,
-                                                            **coh_args))
-                    for coh, expr_src in zip(cohorts, cycle(expr_sources))}
-
-        if 'annot_fields' in coh_args:
-            annot_data = get_gencode(annot_file, coh_args['annot_fields'])
-        else:
-            annot_data = get_gencode(annot_file)
-
-        self.gene_annot = {
-            at['gene_name']: {**{'Ens': ens}, **at}
-            for ens, at in annot_data.items()
-            if at['gene_name'] in reduce(
-                and_, [expr.columns.get_level_values('Gene')
-                       for expr in expr_raw.values()])
+        self.cohort_handles = {
+            coh: TransferCohortHandle(coh, expr_src, var_src, copy_src,
+                                      **coh_args)
+            for coh, expr_src, var_src, copy_src in zip(
+                cohorts, cycle(expr_sources),
+                cycle(var_sources), cycle(copy_sources)
+                )
             }
 
-        expr_dict = {cohort: None for cohort in cohorts}
-        var_dict = {cohort: None for cohort in cohorts}
-        for cohort, var_source, copy_source in zip(
-                cohorts, cycle(var_sources), cycle(copy_sources)):
+        # get annotation for the genes with expression in every cohort
+        annot_index = load_annot_index(
+            annot_file, coh_args.get('annot_fields', None))
+        self.gene_annot = annot_index.get_annot_dict(reduce(
+            and_, [handle.get_genes()
+                   for handle in self.cohort_handles.values()]
+            ))
+
+        expr_dict = LazyCohortData(self.cohort_handles, self.gene_annot, 0)
+        var_dict = LazyCohortData(self.cohort_handles, self.gene_annot, 1)
 
-            expr_dict[cohort], var_dict[cohort], copy_df = add_mutations(
-                cohort, var_source, copy_source, expr_raw[cohort],
-                self.gene_annot, **coh_args
-                )
- 
-            var_dict[cohort].loc[:, 'Scale'] = 'Point'
-            copy_df.loc[:, 'Scale'] = 'Copy'
-            var_dict[cohort] = pd.concat([var_dict[cohort], copy_df],
-                                         sort=True)
- 
         if 'Gene' in mut_levels:
             scale_lvl = mut_levels.index('Gene') + 1
         else:
@@ -659,7 +836,162 @@ class TransferMutationCohort(BaseTransferMutationCohort):
         mut_levels.insert(scale_lvl, 'Scale')
         mut_levels.insert(scale_lvl + 1, 'Copy')
 
-        super().__init__(expr_dict, var_dict,
-                         mut_genes, mut_levels, top_genes, samp_cutoff,
-                         cv_prop, cv_seed)
+        super().__init__(expr_dict, var_dict, mut_levels, mut_genes,
+                         domain_dir, cv_seed=cv_seed, test_prop=test_prop)
+
+        # release any cohorts whose datasets were not all taken by the base
+        self.release_cohorts()
+
+    def get_loaded_cohorts(self):
+        """Lists the cohorts whose datasets are currently in memory."""
+        return [coh for coh, handle in self.cohort_handles.items()
+                if handle.is_loaded()]
+
+    def release_cohorts(self, keep_cohorts=()):
+        """Discards the loaded datasets of cohorts that are not in use."""
+        for coh, handle in self.cohort_handles.items():
+            if coh not in keep_cohorts:
+                handle.release()
+
+
+def build_pancan_cohort(store_path, mut_levels, expr_source, var_source,
+                        copy_source, annot_file, cohorts=None,
+                        **coh_args):
+    """Creates a cohort store consisting of all available TCGA cohorts.
+
+    Cohorts are loaded one at a time, with each cohort's scaled expression
+    values being written to disk as soon as it is loaded, so that the full
+    pan-cancer expression matrix is never held in memory. Samples found in
+    more than one cohort are assigned to the first cohort they appear in.
+    The list of cohorts used is recorded in the store as the cohort's
+    `cohorts` attribute.
+
+    Args:
+        store_path (str): Where the cohort store will be created.
+        mut_levels (:obj:`tuple` of :obj:`str`)
+            The mutation levels to build the cohort's mutation tree with.
+        expr_source, var_source, copy_source (str)
+            The repositories to get each cohort's datasets from.
+        annot_file (str): A GENCODE annotation file.
+        cohorts (:obj:`iterable` of :obj:`str`, optional)
+            Which cohorts to use; the default is to use every cohort found
+            by :func:`list_cohorts`.
+        coh_args: Passed on to :class:`TransferCohortHandle`.
+
+    Returns:
+        cdata (BaseMutationCohort): The cohort attached to its new store.
+
+    """
+    store_path = get_store_path(store_path)
+
+    if cohorts is None:
+        cohorts = sorted(list_cohorts(expr_source, **coh_args))
+
+    handles = {coh: TransferCohortHandle(coh, expr_source, var_source,
+                                         copy_source, **coh_args)
+               for coh in cohorts}
+
+    # get annotation for the genes with expression in every cohort
+    annot_index = load_annot_index(annot_file,
+                                   coh_args.get('annot_fields', None))
+    # expression matrices are not kept between finding the shared genes and
+    # loading each cohort, as this would put all of them in memory at once
+    gene_annot = annot_index.get_annot_dict(reduce(
+        and_, [handle.get_genes(keep_expr=False)
+               for handle in handles.values()]
+        ))
+    use_genes = sorted(gene_annot)
+
+    row_file = "{}.rows-{}".format(store_path, os.getpid())
+    samp_list = []
+    seen_samps = set()
+    cohort_samps = dict()
+    mut_list = []
+
+    with open(row_file, 'wb') as f:
+        for coh, handle in handles.items():
+            expr, muts = handle.load(gene_annot)
+            handle.release()
+
+            # removes samples that have already been found in a cohort
+            expr = expr.loc[~expr.index.isin(seen_samps)
+                            & ~expr.index.duplicated()]
+            expr = expr.reindex(columns=use_genes)
+
+            np.ascontiguousarray(scale(expr.values),
+                                 dtype=np.float32).tofile(f)
+
+            samp_list += list(expr.index)
+            seen_samps |= set(expr.index)
+            cohort_samps[coh] = set(expr.index)
+            mut_list += [muts.loc[muts.Sample.isin(cohort_samps[coh])]]
+
+    expr_file = "{}.expr-{}.npy".format(store_path, os.getpid())
+    save_expr_rows(row_file, expr_file, (len(samp_list), len(use_genes)))
+
+    expr = pd.DataFrame(np.load(expr_file, mmap_mode='r'),
+                        index=samp_list, columns=use_genes, copy=False)
+    expr.columns.name = 'Gene'
+
+    muts = pd.concat(mut_list, sort=True)
+    variants = muts.loc[muts.Scale == 'Point'].drop(columns=['Scale'])
+    copies = muts.loc[muts.Scale == 'Copy', ['Sample', 'Gene', 'Copy']]
+
+    cdata = BaseMutationCohort(expr, variants, [tuple(mut_levels)], copies,
+                               gene_annot, leaf_annot=None)
+    cdata.cohorts = list(cohorts)
+    cdata.cohort_samps = {coh: samps for coh, samps in cohort_samps.items()
+                          if samps}
+
+    # the expression matrix is moved into the store as it is, unless the
+    # cohort has changed which samples or genes it uses
+    if (cdata._omic_data.index.equals(expr.index)
+            and cdata._omic_data.columns.equals(expr.columns)):
+        save_cohort_store(cdata, store_path, expr_file=expr_file)
+
+    else:
+        save_cohort_store(cdata, store_path)
+        os.remove(expr_file)
+
+    return load_cohort_store(store_path)
+
+
+def load_pancan_cohort(store_path, mut_levels, expr_source, var_source,
+                       copy_source, annot_file, cohorts=None, **coh_args):
+    """Attaches to a pan-cancer cohort store, creating it if necessary.
+
+    A mutation tree missing from an existing store is built from the
+    store's mutation calls and saved alongside it. The store is built again
+    if it was created using a different list of cohorts.
+    See :func:`build_pancan_cohort` for a description of the arguments.
+
+    """
+    store_path = get_store_path(store_path)
+    mut_levels = tuple(mut_levels)
+
+    if cohorts is None:
+        cohorts = sorted(list_cohorts(expr_source, **coh_args))
+    else:
+        cohorts = list(cohorts)
+
+    if store_exists(store_path):
+        cdata = load_cohort_store(store_path)
+
+        if getattr(cdata, 'cohorts', None) == cohorts:
+            if mut_levels in cdata.mtrees:
+                return cdata
+
+            try:
+                cdata.add_mut_lvls(mut_levels)
+
+            except (KeyError, ValueError):
+                pass
+
+            else:
+                save_mtree_delta(cdata.mtrees[mut_levels], mut_levels,
+                                 store_path)
+                return cdata
 
+    return build_pancan_cohort(store_path, mut_levels, expr_source,
+                               var_source, copy_source, annot_file,
+                               cohorts, **coh_args)
@@ -8,25 +8,25 @@ from ...experiments.utilities.data_dirs import (
 from .beatAML import process_input_datasets as process_baml_datasets
 from .tcga import tcga_subtypes
 from .tcga import process_input_datasets as process_tcga_datasets
-from .tcga import choose_subtypes as choose_tcga_subtypes
 from .tcga import parse_subtypes as parse_tcga_subtypes
 
 from .metabric import process_input_datasets as process_metabric_datasets
-from .metabric import choose_subtypes as choose_metabric_subtypes
-from .metabric import list_subtypes as list_metabric_subtypes
-from .metabric import load_metabric_samps
 from .ccle import process_input_datasets as process_ccle_datasets
+from .store import save_mtree_delta, load_mtree_deltas, cast_cohort_expr
+from .catalog import load_subtype_catalog
+
+from ..data.vep import annotate_variants
+from ..data.manifest import load_data_source
 
-from dryadic.features.data.vep import process_variants
 from dryadic.features.cohorts.mut import BaseMutationCohort
 
 import os
-import synapseclient
 import pandas as pd
 import dill as pickle
 
 
-def get_input_datasets(cohort, expr_source, mut_fields=None):
+def get_input_datasets(cohort, expr_source, mut_fields=None,
+                       expr_dtype=None):
     """Loads normalized (but not cleaned) data for an instance of a cohort.
 
     Arguments:
@@ -36,6 +36,10 @@ def get_input_datasets(cohort, expr_source, mut_fields=None):
                            calls were made or stored.
         mut_fields (:obj: `iterable` of :obj: `str`, optional)
             Which mutation annotation fields to load for the cohort.
+        expr_dtype (type, optional)
+            What to cast the expression values to, eg. `np.float32` to halve
+            the memory used by the cohort. Default is to leave them as they
+            were loaded.
 
     Returns:
         data_dict (dict): The data for the cohort, which includes expression,
@@ -47,9 +51,9 @@ def get_input_datasets(cohort, expr_source, mut_fields=None):
     data_dict = {data_k: None
                  for data_k in ('expr', 'vars', 'copy', 'annot', 'assembly')}
 
-    # instantiate Synapse client, find where locally saved credentials are
-    syn = synapseclient.Synapse()
-    syn.cache.cache_root_dir = syn_root
+    # find the local copies of the datasets stored in Synapse, using a Synapse
+    # client if they have not been listed in a data manifest
+    syn = load_data_source(syn_root)
 
     # if loading the beatAML cohort, we pull the datasets from Synapse
     if cohort == 'beatAML':
@@ -134,11 +138,28 @@ def get_input_datasets(cohort, expr_source, mut_fields=None):
                 )
             })
 
+    if expr_dtype is not None:
+        data_dict['expr'] = data_dict['expr'].astype(expr_dtype, copy=False)
+
     return data_dict
 
 
+def get_variant_fields(mut_lvls):
+    """Finds the VEP annotation fields needed for given mutation levels."""
+    var_fields = set()
+
+    for lvl in mut_lvls:
+        if '-domain' in lvl:
+            var_fields |= {'Domains'}
+        elif lvl not in {'Gene', 'Scale', 'Copy'}:
+            var_fields |= {lvl}
+
+    return var_fields
+
+
 def get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
-                    use_genes=None, use_copies=True, leaf_annot=None):
+                    use_genes=None, use_copies=True, leaf_annot=None,
+                    vep_cores=4, expr_dtype=None):
     """Creates a mutation cohort object using expression and mutation data.
 
     This function uses :func:`get_input_datasets` to get the datasets
@@ -184,6 +205,12 @@ def get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
             Which mutation properties to use for annotating the leaf nodes
             of each mutation tree constructed for the cohort. Default is to
             not use leaf annotations.
+        vep_cores (int, optional)
+            How many cores can be used to annotate variants not already in
+            the VEP annotation cache.
+        expr_dtype (type, optional)
+            What to cast the cohort's expression values to, as in
+            :func:`get_input_datasets`.
 
     Returns:
         cdata (BaseMutationCohort)
@@ -197,7 +224,8 @@ def get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
     if leaf_annot is not None:
         mut_fields += leaf_annot
 
-    data_dict = get_input_datasets(cohort, expr_source, mut_fields=mut_fields)
+    data_dict = get_input_datasets(cohort, expr_source, mut_fields=mut_fields,
+                                   expr_dtype=expr_dtype)
 
     # TODO: how to handle this special case
     if cohort == 'CCLE':
@@ -230,37 +258,27 @@ def get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
                            'VarAllele': data_dict['vars'].TumorAllele,
                            'Sample': data_dict['vars'].Sample})
 
+    var_fields = {'Gene', 'Canonical', 'Location', 'VarAllele'}
     if isinstance(mut_lvls[0], str):
-        var_fields = ['Gene', 'Canonical', 'Location', 'VarAllele']
         cdata_lvls = [mut_lvls]
-
-        for lvl in mut_lvls:
-            if '-domain' in lvl and 'Domains' not in var_fields:
-                var_fields += ['Domains']
-            elif lvl not in {'Gene', 'Scale', 'Copy'}:
-                var_fields += [lvl]
+        var_fields |= get_variant_fields(mut_lvls)
 
     elif isinstance(mut_lvls[0], tuple):
-        var_fields = {'Gene', 'Canonical', 'Location', 'VarAllele'}
         cdata_lvls = list(mut_lvls)
 
         for lvl_list in mut_lvls:
-            for lvl in lvl_list:
-                if '-domain' in lvl and 'Domains' not in var_fields:
-                    var_fields |= {'Domains'}
-                elif lvl not in {'Gene', 'Scale', 'Copy'}:
-                    var_fields |= {lvl}
+            var_fields |= get_variant_fields(lvl_list)
 
     else:
         raise TypeError(
             "Unrecognized <mut_lvls> argument: `{}`!".format(mut_lvls))
 
-    # run the VEP command line wrapper to obtain a standardized
-    # set of point mutation calls
-    variants = process_variants(
-        var_df, out_fields=var_fields, cache_dir=vep_cache_dir,
+    # run the VEP command line wrapper to obtain a standardized set of point
+    # mutation calls, reusing the annotations of previously seen variants
+    variants = annotate_variants(
+        var_df, out_fields=var_fields, vep_cache_dir=vep_cache_dir,
         temp_dir=out_path, assembly=data_dict['assembly'],
-        distance=0, consequence_choose='pick', forks=4, update_cache=False
+        distance=0, consequence_choose='pick', cores=vep_cores, forks=4
         )
 
     # handle case where we don't need CNA data, where there is no CNA data
@@ -290,50 +308,131 @@ def get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
                               data_dict['annot'], leaf_annot=None)
 
 
+def has_mut_lvls(cdata, lvls):
+    """Checks whether a cohort has a tree ending with given mutation levels."""
+    return any(tuple(mtree_lvls[-len(lvls):]) == tuple(lvls)
+               for mtree_lvls in cdata.mtrees)
+
+
+def extend_cohort(cdata, mut_lvls):
+    """Adds mutation trees to a cohort using its own mutation calls.
+
+    Args:
+        cdata (BaseMutationCohort)
+        mut_lvls (:obj:`list` of :obj:`tuple`)
+            The combinations of mutation levels the cohort needs trees for.
+
+    Returns:
+        new_lvls (:obj:`list` of :obj:`tuple`)
+            The mutation levels of the trees that were added, or None if the
+            cohort's mutation calls are missing the annotation fields needed
+            to build one of them.
+
+    """
+    new_lvls = [tuple(lvls) for lvls in mut_lvls
+                if not has_mut_lvls(cdata, lvls)]
+
+    for lvls in new_lvls:
+        if not get_variant_fields(lvls) <= set(cdata._muts.columns):
+            return None
+
+    for lvls in new_lvls:
+        try:
+            cdata.add_mut_lvls(lvls)
+
+        except (KeyError, ValueError):
+            return None
+
+    return new_lvls
+
+
 def load_cohort(cohort, expr_source, mut_lvls, vep_cache_dir, use_path=None,
-                temp_path=None, use_genes=None, leaf_annot=None):
-    """Load a saved cohort object from file; create a new one if necessary."""
+                temp_path=None, use_genes=None, leaf_annot=None,
+                expr_dtype=None, save_deltas=True, vep_cores=4):
+    """Load a saved cohort object from file; create a new one if necessary.
+
+    Mutation trees missing from a saved cohort are built from the mutation
+    calls it already has where possible, and saved alongside it so that
+    later loads can attach them directly. Callers that save the whole
+    cohort again themselves should turn off `save_deltas`, as doing so
+    invalidates these saved trees. The cohort is only recreated from
+    its input datasets when its calls lack the annotations a tree needs.
+    Saved cohorts are cast to the given expression type as they are loaded,
+    and `vep_cores` is passed on to :func:`get_cohort_data`.
 
+    """
     if isinstance(mut_lvls[0], str):
         mut_lvls = [mut_lvls]
+    use_saved = False
 
     if use_path is not None and os.path.exists(use_path):
         try:
             with open(use_path, 'rb') as f:
                 cdata = pickle.load(f)
 
+            load_mtree_deltas(cdata, use_path)
+            if expr_dtype is not None:
+                cast_cohort_expr(cdata, expr_dtype)
+            use_saved = True
+
         except IOError:
             cdata = get_cohort_data(cohort, expr_source, mut_lvls,
                                     vep_cache_dir, temp_path, use_genes,
-                                    leaf_annot=leaf_annot)
+                                    leaf_annot=leaf_annot,
+                                    vep_cores=vep_cores,
+                                    expr_dtype=expr_dtype)
 
     else:
         cdata = get_cohort_data(cohort, expr_source, mut_lvls,
                                 vep_cache_dir, temp_path, use_genes,
-                                leaf_annot=leaf_annot)
+                                leaf_annot=leaf_annot, vep_cores=vep_cores,
+                                expr_dtype=expr_dtype)
 
-    if cohort != 'CCLE' and not all(any(mtree_lvls[-(len(lvls)):] == lvls
-                                        for mtree_lvls in cdata.mtrees)
+    if cohort != 'CCLE' and not all(has_mut_lvls(cdata, lvls)
                                     for lvls in mut_lvls):
-        cdata.merge(get_cohort_data(cohort, expr_source, mut_lvls,
-                                    vep_cache_dir, temp_path, use_genes,
-                                    leaf_annot=leaf_annot))
+        new_lvls = extend_cohort(cdata, mut_lvls)
+
+        if new_lvls is None:
+            cdata.merge(get_cohort_data(cohort, expr_source, mut_lvls,
+                                        vep_cache_dir, temp_path, use_genes,
+                                        leaf_annot=leaf_annot,
+                                        vep_cores=vep_cores,
+                                        expr_dtype=expr_dtype))
+
+        elif use_saved and save_deltas:
+            for lvls in new_lvls:
+                save_mtree_delta(cdata.mtrees[lvls], lvls, use_path)
 
     return cdata
 
 
+def get_subtype_catalog(coh):
+    """Loads the catalog of subtypes needed to find a cohort's subtypes.
+
+    The METABRIC sample table is only catalogued for the METABRIC cohort, so
+    that looking up the subtypes of TCGA cohorts does not depend on it.
+
+    """
+    if coh == 'METABRIC':
+        subt_catalog = load_subtype_catalog(subtype_file, metabric_dir)
+    else:
+        subt_catalog = load_subtype_catalog(subtype_file)
+
+    return subt_catalog
+
+
 def get_cohort_subtypes(coh):
     """Gets the cohort samples associated with known molecular subtypes."""
+    subt_catalog = get_subtype_catalog(coh)
 
     if coh == 'METABRIC':
-        metabric_samps = load_metabric_samps(metabric_dir)
-        subt_dict = {subt: choose_metabric_subtypes(metabric_samps, subt)
+        subt_dict = {subt: subt_catalog.get_samples(coh, [subt])
                      for subt in ('LumA', 'luminal', 'nonbasal')}
 
     elif coh in tcga_subtypes:
         subt_dict = {
-            subt: choose_tcga_subtypes(
-                parse_tcga_subtypes("_{}".format(subt)), coh, subtype_file)
+            subt: subt_catalog.get_samples(
+                coh, parse_tcga_subtypes("_{}".format(subt)))
             for subt in tcga_subtypes[coh]
             }
 
@@ -345,17 +444,15 @@ def get_cohort_subtypes(coh):
 
 # TODO: consolidate this with the above function?
 def list_cohort_subtypes(coh):
-    if coh == 'METABRIC':
-         type_dict = list_metabric_subtypes(load_metabric_samps(metabric_dir))
-
-    elif coh == 'beatAML':
+    if coh == 'beatAML':
         type_dict = {}
 
+    elif coh == 'METABRIC':
+        type_dict = {subt: set(samps) for subt, samps in get_subtype_catalog(
+            coh).list_subtypes(coh).items()}
+
     else:
-        tcga_types = pd.read_csv(subtype_file,
-                                 sep='\t', index_col=0, comment='#')
-        tcga_types = tcga_types.loc[tcga_types.DISEASE == coh]
-        type_dict = tcga_types.groupby('SUBTYPE').groups
+        type_dict = get_subtype_catalog(coh).list_subtypes(coh)
 
     return type_dict
 
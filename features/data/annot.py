@@ -0,0 +1,427 @@
+"""Compiling gene annotation datasets into indices that load quickly.
+
+This module contains functions for converting the gene annotations parsed
+from a GENCODE GTF file into a set of column-typed arrays that are stored on
+disk and read through memory maps, which allows for cohorts built in many
+processes to share an annotation dataset that only needs to be parsed once.
+
+See Also:
+    :module:`.variants`: Loading variant calls from external sources.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+from .utils import get_file_stamp
+from dryadic.features.cohorts.utils import get_gencode
+
+import numpy as np
+import os
+import shutil
+import json
+import dill as pickle
+
+from numbers import Integral, Real
+
+
+ANNOT_INDEX_VERSION = 1
+
+# indices already loaded in this process, keyed by their location on disk
+_loaded_indices = dict()
+
+
+def get_index_path(annot_file, include_types=None, index_dir=None):
+    """Finds where the index of an annotation file is stored.
+
+    Args:
+        annot_file (str): The path to a GENCODE GTF file.
+        include_types (:obj:`iterable` of :obj:`str`, optional)
+            Which annotation types besides genes (eg. 'transcript', 'exon')
+            are parsed from the file, as in :func:`get_gencode`.
+        index_dir (str, optional): Where indices are stored; the default is
+                                   alongside the annotation file.
+
+    Returns:
+        index_path (str)
+
+    """
+    if index_dir is None:
+        index_dir = os.path.join(os.path.dirname(os.path.abspath(annot_file)),
+                                 "gencode-index")
+
+    if include_types is None:
+        type_lbl = 'default'
+    else:
+        type_lbl = '+'.join(sorted(include_types))
+
+    return os.path.join(index_dir, "{}__{}".format(
+        get_file_stamp(annot_file), type_lbl))
+
+
+def _get_column_dtype(vals):
+    if all(isinstance(val, Integral) and not isinstance(val, bool)
+           for val in vals):
+        return 'int64'
+
+    elif all(isinstance(val, Real) and not isinstance(val, bool)
+             for val in vals):
+        return 'float64'
+
+    elif all(isinstance(val, str) for val in vals):
+        return 'str'
+
+    else:
+        return 'object'
+
+
+def _flatten_records(records, tables, level):
+    """Splits a list of annotation records into columns and nested records.
+
+    Fields whose values are dictionaries or lists of annotation records (eg.
+    the transcripts of a gene, or the exons of a transcript) are stored as
+    their own tables, whose rows are sorted by the record they belong to.
+
+    """
+    fld_list = []
+    for rec in records:
+        fld_list += [fld for fld in rec if fld not in fld_list]
+
+    nest_flds = {
+        fld: 'dict' if any(isinstance(rec.get(fld), dict) for rec in records)
+        else 'list'
+        for fld in fld_list
+        if all(isinstance(rec[fld], (dict, list))
+               and all(isinstance(val, dict)
+                       for val in (rec[fld].values()
+                                   if isinstance(rec[fld], dict)
+                                   else rec[fld]))
+               for rec in records if fld in rec)
+        }
+
+    tables[level] = {'columns': dict(), 'nested': nest_flds}
+    for fld in fld_list:
+        if fld in nest_flds:
+            continue
+
+        has_fld = np.array([fld in rec for rec in records], dtype=bool)
+        fld_vals = [rec[fld] for rec in records if fld in rec]
+        fld_dtype = _get_column_dtype(fld_vals)
+
+        if has_fld.all() and fld_dtype != 'object':
+            if fld_dtype == 'str':
+                fld_arr = np.array(fld_vals, dtype=str)
+            else:
+                fld_arr = np.array(fld_vals, dtype=fld_dtype)
+
+            tables[level]['columns'][fld] = fld_arr, None
+
+        else:
+            fld_arr = np.empty(len(records), dtype=object)
+            fld_arr[has_fld] = fld_vals
+            tables[level]['columns'][fld] = fld_arr, has_fld
+
+    for fld, nest_type in nest_flds.items():
+        sub_level = "{}.{}".format(level, fld)
+        sub_recs = []
+        sub_ptrs = [0]
+        has_fld = np.array([fld in rec for rec in records], dtype=bool)
+
+        for rec in records:
+            if nest_type == 'dict':
+                sub_recs += [{**{'__key': k}, **v}
+                             for k, v in rec.get(fld, {}).items()]
+            else:
+                sub_recs += list(rec.get(fld, []))
+
+            sub_ptrs += [len(sub_recs)]
+
+        _flatten_records(sub_recs, tables, sub_level)
+        tables[sub_level]['ptrs'] = np.array(sub_ptrs, dtype=np.int64)
+        tables[sub_level]['present'] = has_fld
+
+
+def build_annot_index(annot_file, index_path, include_types=None):
+    """Parses a GENCODE GTF file and saves its annotations as an index.
+
+    This is a one-time operation for each combination of annotation file and
+    annotation types; each field of the annotation records is saved as a
+    numpy array, and a hash table mapping gene names and Ensembl IDs to the
+    rows of these arrays is saved alongside them.
+
+    Args:
+        annot_file (str): The path to a GENCODE GTF file.
+        index_path (str): Where the index will be created.
+        include_types (:obj:`iterable` of :obj:`str`, optional)
+            Which annotation types besides genes to parse, as in
+            :func:`get_gencode`.
+
+    """
+    if include_types is None:
+        annot_data = get_gencode(annot_file)
+    else:
+        annot_data = get_gencode(annot_file, include_types)
+
+    gene_ids = list(annot_data)
+    tables = dict()
+    _flatten_records([annot_data[ens] for ens in gene_ids], tables, 'gene')
+
+    tmp_path = "{}.tmp-{}".format(index_path, os.getpid())
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "gene.Ens.npy"),
+            np.array(gene_ids, dtype=str))
+
+    layout = dict()
+    for level, table in tables.items():
+        layout[level] = {'columns': dict(), 'nested': table['nested']}
+
+        for fld, (fld_arr, has_fld) in table['columns'].items():
+            fld_lbl = "{}.{}".format(level, fld)
+            np.save(os.path.join(tmp_path, "{}.npy".format(fld_lbl)),
+                    fld_arr, allow_pickle=fld_arr.dtype == object)
+
+            if has_fld is not None:
+                np.save(os.path.join(tmp_path,
+                                     "{}__present.npy".format(fld_lbl)),
+                        has_fld)
+
+            layout[level]['columns'][fld] = {
+                'object': bool(fld_arr.dtype == object),
+                'partial': has_fld is not None
+                }
+
+        if 'ptrs' in table:
+            np.save(os.path.join(tmp_path, "{}__ptrs.npy".format(level)),
+                    table['ptrs'])
+            np.save(os.path.join(tmp_path, "{}__present.npy".format(level)),
+                    table['present'])
+
+    # when more than one gene has the same name the last one is used, as is
+    # the case when annotations are keyed by gene name in the cohort loaders
+    name_rows = dict()
+    for i, gene in enumerate(tables['gene']['columns']['gene_name'][0]):
+        name_rows[str(gene)] = i
+
+    with open(os.path.join(tmp_path, "rows.p"), 'wb') as f:
+        pickle.dump({'gene_name': name_rows,
+                     'Ens': {ens: i for i, ens in enumerate(gene_ids)}},
+                    f, protocol=-1)
+
+    with open(os.path.join(tmp_path, "manifest.json"), 'w') as f:
+        json.dump({'version': ANNOT_INDEX_VERSION,
+                   'source': os.path.abspath(annot_file),
+                   'types': (None if include_types is None
+                             else sorted(include_types)),
+                   'genes': len(gene_ids), 'layout': layout}, f)
+
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+    os.rename(tmp_path, index_path)
+
+
+class AnnotIndex(object):
+    """The gene annotations of a GENCODE GTF file as read from an index.
+
+    Args:
+        index_path (str): Where the index was saved by
+                          :func:`build_annot_index`.
+
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+
+        with open(os.path.join(index_path, "manifest.json"), 'r') as f:
+            manifest = json.load(f)
+
+        self.layout = manifest['layout']
+        with open(os.path.join(index_path, "rows.p"), 'rb') as f:
+            self.gene_rows = pickle.load(f)
+
+        self.arrays = dict()
+        self.gene_ids = self._load_array("gene.Ens")
+        self.gene_names = self._load_column('gene', 'gene_name')
+
+    def _load_array(self, lbl, is_object=False):
+        if lbl not in self.arrays:
+            arr_file = os.path.join(self.index_path, "{}.npy".format(lbl))
+
+            if is_object:
+                self.arrays[lbl] = np.load(arr_file, allow_pickle=True)
+            else:
+                self.arrays[lbl] = np.load(arr_file, mmap_mode='r')
+
+        return self.arrays[lbl]
+
+    def _load_column(self, level, fld):
+        return self._load_array(
+            "{}.{}".format(level, fld),
+            self.layout[level]['columns'][fld]['object']
+            )
+
+    def __len__(self):
+        return len(self.gene_ids)
+
+    def __contains__(self, gene):
+        return gene in self.gene_rows['gene_name']
+
+    def _get_record(self, level, i):
+        rec = dict()
+
+        for fld, fld_info in self.layout[level]['columns'].items():
+            fld_lbl = "{}.{}".format(level, fld)
+
+            if fld_info['partial'] and not self._load_array(
+                    "{}__present".format(fld_lbl))[i]:
+                continue
+
+            fld_val = self._load_column(level, fld)[i]
+            if isinstance(fld_val, np.generic):
+                fld_val = fld_val.item()
+
+            rec[fld] = fld_val
+
+        for fld, nest_type in self.layout[level]['nested'].items():
+            sub_level = "{}.{}".format(level, fld)
+
+            if not self._load_array("{}__present".format(sub_level))[i]:
+                continue
+
+            sub_ptrs = self._load_array("{}__ptrs".format(sub_level))
+            sub_recs = [self._get_record(sub_level, j)
+                        for j in range(sub_ptrs[i], sub_ptrs[i + 1])]
+
+            if nest_type == 'dict':
+                rec[fld] = {sub_rec.pop('__key'): sub_rec
+                            for sub_rec in sub_recs}
+            else:
+                rec[fld] = sub_recs
+
+        return rec
+
+    def get_gene_rows(self, genes, by='gene_name'):
+        """Finds the rows of the index belonging to a list of genes.
+
+        Args:
+            genes (:obj:`iterable` of :obj:`str`)
+            by (str, optional): Whether the genes are given as gene names
+                                (the default) or as Ensembl IDs ('Ens').
+
+        Returns:
+            gene_rows (:obj:`np.array` of :obj:`int`)
+                The row of each gene, or -1 for genes not in the index.
+
+        """
+        row_dict = self.gene_rows[by]
+
+        return np.array([row_dict.get(gene, -1) for gene in genes],
+                        dtype=np.int64)
+
+    def get_gene(self, gene, by='gene_name'):
+        """Gets the annotation record of a gene, including its Ensembl ID."""
+        i = self.gene_rows[by][gene]
+
+        return {**{'Ens': str(self.gene_ids[i])},
+                **self._get_record('gene', i)}
+
+    def get_annot_dict(self, genes=None, by='gene_name'):
+        """Gets annotation records keyed by gene name.
+
+        This is equivalent to restructuring the output of
+        :func:`get_gencode` around gene names, but only the records of the
+        genes asked for are read from the index.
+
+        Args:
+            genes (:obj:`iterable` of :obj:`str`, optional)
+                The genes whose annotations are needed; the default is to get
+                the annotations of every gene in the index. Genes that are
+                not in the index are ignored.
+            by (str, optional): Whether the genes are given as gene names
+                                (the default) or as Ensembl IDs ('Ens').
+
+        Returns:
+            annot_dict (dict)
+
+        """
+        if genes is None:
+            use_rows = np.unique(list(self.gene_rows['gene_name'].values()))
+
+        else:
+            use_rows = self.get_gene_rows(set(genes), by)
+            use_rows = np.unique(use_rows[use_rows >= 0])
+
+        annot_dict = dict()
+        for i in use_rows:
+            annot_dict[str(self.gene_names[i])] = {
+                **{'Ens': str(self.gene_ids[i])},
+                **self._get_record('gene', i)
+                }
+
+        return annot_dict
+
+    def get_gene_names(self, gene_ids):
+        """Maps a list of Ensembl IDs to gene names, with None if missing."""
+        gene_rows = self.get_gene_rows(gene_ids, by='Ens')
+
+        return [str(self.gene_names[i]) if i >= 0 else None
+                for i in gene_rows]
+
+    def get_cis_genes(self, genes, cis_lbl='Chrm'):
+        """Finds the genes on the same chromosomes as a list of genes."""
+        if cis_lbl != 'Chrm':
+            raise ValueError("Unrecognized cis-gene label `{}` !".format(
+                cis_lbl))
+
+        gene_chrs = self._load_column('gene', 'Chr')
+        use_rows = self.get_gene_rows(genes)
+        cis_chrs = np.unique(np.asarray(gene_chrs[use_rows[use_rows >= 0]]))
+
+        return {str(gene) for gene in np.asarray(self.gene_names)[
+            np.isin(gene_chrs, cis_chrs)]}
+
+
+def load_annot_index(annot_file, include_types=None, index_dir=None):
+    """Loads the index of a GENCODE GTF file, building it if needed.
+
+    Indices are rebuilt whenever the annotation file changes size or is
+    modified, and are only read from disk once per process.
+
+    Args:
+        annot_file (str): The path to a GENCODE GTF file.
+        include_types (:obj:`iterable` of :obj:`str`, optional)
+            Which annotation types besides genes to parse, as in
+            :func:`get_gencode`.
+        index_dir (str, optional): Where indices are stored; the default is
+                                   alongside the annotation file.
+
+    Returns:
+        annot_index (AnnotIndex)
+
+    Examples:
+        >>> annot_index = load_annot_index(
+        >>>     "gencode.v19.annotation.gtf.gz", ['transcript'])
+        >>> annot_dict = annot_index.get_annot_dict(['TP53', 'PIK3CA'])
+
+    """
+    file_stat = os.stat(annot_file)
+    load_key = (os.path.abspath(annot_file), file_stat.st_size,
+                file_stat.st_mtime, None if include_types is None
+                else tuple(sorted(include_types)), index_dir)
+
+    if load_key not in _loaded_indices:
+        index_path = get_index_path(annot_file, include_types, index_dir)
+        manifest_file = os.path.join(index_path, "manifest.json")
+
+        use_index = False
+        if os.path.isfile(manifest_file):
+            with open(manifest_file, 'r') as f:
+                use_index = json.load(f)['version'] == ANNOT_INDEX_VERSION
+
+        if not use_index:
+            build_annot_index(annot_file, index_path, include_types)
+
+        _loaded_indices[load_key] = AnnotIndex(index_path)
+
+    return _loaded_indices[load_key]
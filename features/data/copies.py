@@ -8,21 +8,39 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
+from .firehose import (FirehoseArchive, trim_sample_barcodes, get_cache_path,
+                       save_cached_matrix, load_cached_matrix)
+
+import numpy as np
 import pandas as pd
 
 import os
 import glob
 
-import tarfile
-from io import BytesIO
+
+# the resolutions at which GISTIC copy number calls are made, in the order
+# their matrices are concatenated when all of them are loaded
+copy_levels = ('gene', 'region', 'arm')
 
 
-def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
+def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False,
+                        cache_dir=None, level='all'):
     """Loads gene-level copy number alteration data downloaded from Firehose.
 
     Args:
         cohort (str): A TCGA cohort available in Broad Firehose.
         data_dir (str): A local directory where the data has been downloaded.
+        discrete (bool, optional): Whether to load thresholded calls
+                                   instead of continuous copy ratios.
+        normalize (bool, optional): Whether to scale continuous calls by
+                                    each sample's GISTIC cutoffs.
+        cache_dir (str, optional): Where to cache the parsed copy number
+                                   matrices; the default is to not use a
+                                   cache. Cached matrices are memory-mapped
+                                   when they are loaded.
+        level (str, optional): Which of the 'gene', 'region' or 'arm' level
+                               calls to load; the default is to concatenate
+                               the calls at all three levels.
 
     Returns:
         copy_data (pandas DataFrame), shape = [n_samps, n_genes]
@@ -31,8 +49,14 @@ def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
         >>> copy_data = get_copies_firehose(
         >>>     'BRCA', '/home/users/grzadkow/compbio/input-data/firehose')
         >>> copy_data = get_copies_firehose('STAD', '../input-data')
+        >>> arm_data = get_copies_firehose('STAD', '../input-data',
+        >>>                                discrete=False, level='arm')
 
     """
+    if level != 'all' and level not in copy_levels:
+        raise ValueError("Unrecognized copy number level `{}` !".format(
+            level))
+
     copy_tars = glob.glob(os.path.join(
         data_dir, "analyses__2016_01_28", cohort, "20160128",
         "*CopyNumber_Gistic2.Level_4.*tar.gz"
@@ -48,52 +72,106 @@ def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
                       "for cohort {} in directory {} !".format(
                           cohort, data_dir))
 
+    if level == 'all':
+        use_lvls = copy_levels
+    else:
+        use_lvls = level,
+
+    # each level of calls is cached as its own matrix, so that one level
+    # can be loaded without reading the others
+    copy_mats = {lvl: None for lvl in use_lvls}
+    if cache_dir is not None:
+        cache_base = get_cache_path(cache_dir, copy_tars[0], 'copies',
+                                    discrete, normalize)
+
+        copy_mats = {lvl: load_cached_matrix(
+            "{}__{}".format(cache_base, lvl), mmap_mode='r')
+            for lvl in use_lvls}
+
+    if any(copy_mat is None for copy_mat in copy_mats.values()):
+        with FirehoseArchive(copy_tars[0]) as copy_arch:
+            copy_mats = parse_copies_firehose(copy_arch, discrete, normalize)
+
+        if cache_dir is not None:
+            for lvl, copy_mat in copy_mats.items():
+                save_cached_matrix(copy_mat,
+                                   "{}__{}".format(cache_base, lvl))
+
+    if level != 'all':
+        return copy_mats[level]
+
+    return pd.concat([copy_mats[lvl] for lvl in copy_levels],
+                     axis=1, join='inner')
+
+
+def normalize_copies(gene_data, ctf_data):
+    """Scales copy ratios by the GISTIC amplification and deletion cutoffs.
+
+    Args:
+        gene_data (pd.DataFrame), shape = [n_samps, n_genes]
+        ctf_data (pd.DataFrame): The 'Low' and 'High' cutoffs of samples.
+
+    Returns:
+        norm_data (pd.DataFrame): The scaled copy ratios, rounded to three
+                                  decimal places. Samples without cutoffs
+                                  are left as they are.
+
+    """
+    ctf_data = ctf_data.loc[~ctf_data.index.duplicated()].reindex(
+        gene_data.index)
+    has_ctf = ctf_data.Low.notnull().values & ctf_data.High.notnull().values
+
+    gene_vals = gene_data.values
+    norm_vals = gene_vals[has_ctf]
+    norm_vals = np.where(
+        norm_vals < 0,
+        norm_vals / -ctf_data.Low.values[has_ctf, np.newaxis],
+        np.where(norm_vals > 0,
+                 norm_vals / ctf_data.High.values[has_ctf, np.newaxis],
+                 norm_vals)
+        ).round(3)
+
+    gene_vals = gene_vals.copy()
+    gene_vals[has_ctf] = norm_vals
+
+    return pd.DataFrame(gene_vals, index=gene_data.index,
+                        columns=gene_data.columns)
+
+
+def parse_copies_firehose(copy_arch, discrete=True, normalize=False):
+    """Parses the GISTIC copy number calls found in a Firehose tarball.
+
+    Returns:
+        copy_mats (dict): The matrix of calls made at each level, with
+                          thresholded calls stored as int8 values and
+                          continuous calls stored as float32 values.
+
+    """
+
+    # thresholded calls are integers between -2 and 2, while continuous
+    # calls are log2 copy ratios
     if discrete:
         fl_name = "all_thresholded.by_genes.txt"
+        copy_dtype = np.int8
     else:
         fl_name = "all_data_by_genes.txt"
+        copy_dtype = np.float32
 
-    copy_tar = tarfile.open(copy_tars[0])
-    gene_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                 if fl_name in memb.get_info()['name']]
-
-    # ensures only one file in the tarball contains CNA data
-    if len(gene_indx) == 0:
-        raise IOError("No thresholded CNA files found in the tarball!")
-    elif len(gene_indx) > 1:
-        raise IOError("Multiple thresholded CNA files found in the tarball!")
-
-    gene_fl = copy_tar.extractfile(copy_tar.getmembers()[gene_indx[0]])
-    gene_data = pd.read_csv(BytesIO(gene_fl.read()),
-                            sep='\t', index_col=0, engine='python')
+    gene_data = copy_arch.read_matrix(fl_name, "thresholded CNA",
+                                      label_cols=3, dtype=copy_dtype)
 
     gene_data = gene_data.iloc[:, 2:].transpose()
-    gene_data.index = ['-'.join(smp[:4])
-                       for smp in gene_data.index.str.split('-')]
+    gene_data.index = trim_sample_barcodes(gene_data.index)
     gene_data.columns.name = None
 
     if normalize:
-        ctf_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                    if 'sample_cutoffs.txt' in memb.get_info()['name']]
-        ctf_fl = copy_tar.extractfile(copy_tar.getmembers()[ctf_indx[0]])
-
-        ctf_data = pd.read_csv(BytesIO(ctf_fl.read()), sep='\t',
-                               index_col=0, comment='#', engine='python')
-        ctf_data.index = ["-".join(smp[:4])
-                          for smp in ctf_data.index.str.split('-')]
-
-        for smp in set(gene_data.index) & set(ctf_data.index):
-            smp_vals = gene_data.loc[smp] 
-            smp_vals[smp_vals < 0] /= -ctf_data.loc[smp, 'Low']
-            smp_vals[smp_vals > 0] /= ctf_data.loc[smp, 'High']
-            gene_data.loc[smp] = smp_vals.round(3)
-
-    regn_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                 if "all_lesions.conf_" in memb.get_info()['name']]
-    regn_fl = copy_tar.extractfile(copy_tar.getmembers()[regn_indx[0]])
-
-    regn_data = pd.read_csv(BytesIO(regn_fl.read()),
-                            sep='\t', index_col=0, engine='python')
+        ctf_data = copy_arch.read_table('sample_cutoffs.txt', "cutoff",
+                                        index_col=0, comment='#')
+        ctf_data.index = trim_sample_barcodes(ctf_data.index)
+        gene_data = normalize_copies(gene_data, ctf_data)
+
+    regn_data = copy_arch.read_table("all_lesions.conf_", "lesion",
+                                     index_col=0)
     regn_data.Descriptor = regn_data.Descriptor.str.replace("\s+$", "")
     contn_indx = regn_data.index.str.match(".* - CN values$")
     regn_mat = regn_data.iloc[contn_indx ^ discrete, 8:-1]
@@ -102,34 +180,27 @@ def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
                                       lbl[:3])
                       for lbl in regn_mat.index]
 
+    regn_mat = regn_mat.astype(copy_dtype)
     if discrete:
-        regn_mat = regn_mat.astype(int)
         del_indx = regn_mat.index.str.match(".*\(Del\)$")
         regn_mat.loc[del_indx] *= -1
 
-    regn_mat.columns = ['-'.join(smp[:4])
-                        for smp in regn_mat.columns.str.split('-')]
+    regn_mat.columns = trim_sample_barcodes(regn_mat.columns)
     regn_mat.index.name = None
 
     if discrete:
-        carm_data = pd.DataFrame(columns=regn_mat.columns)
+        carm_data = pd.DataFrame(index=regn_mat.columns)
 
     else:
-        carm_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                     if "broad_values_by_arm.txt" in memb.get_info()['name']]
-        carm_fl = copy_tar.extractfile(copy_tar.getmembers()[carm_indx[0]])
-        carm_data = pd.read_csv(BytesIO(carm_fl.read()),
-                                sep='\t', index_col=0, engine='python')
+        carm_data = copy_arch.read_matrix("broad_values_by_arm.txt", "arm")
 
         carm_data = carm_data.loc[carm_data.index.str.match("[0-9]+[p|q]")]
-        carm_data.columns = ['-'.join(smp[:4])
-                             for smp in carm_data.columns.str.split('-')]
+        carm_data.columns = trim_sample_barcodes(carm_data.columns)
+        carm_data = carm_data.T
 
-    carm_data.index.name = None
-    copy_tar.close()
+    carm_data.columns.name = None
 
-    return pd.concat([gene_data, regn_mat.T, carm_data.T],
-                     axis=1, join='inner')
+    return {'gene': gene_data, 'region': regn_mat.T, 'arm': carm_data}
 
 
 def get_copies_bmeg(cohort, gene_list):
@@ -5,6 +5,8 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
+from .manifest import DataManifest
+
 import numpy as np
 import pandas as pd
 import synapseutils
@@ -26,7 +28,9 @@ def get_dream_data(syn, cohort, omic_type, source=None):
     """Retrieves a particular -omic dataset used in the challenge.
 
     Args:
-        syn (synapseclient.Synapse): A logged-into Synapse instance.
+        syn (synapseclient.Synapse or DataManifest)
+            A logged-into Synapse instance, or a manifest of local copies of
+            the challenge datasets.
         cohort (str): A TCGA cohort included in the challenge.
         omic_type (str): A type of -omics used in the challenge.
             Note that multiple -omic types can be downloaded by listing
@@ -42,8 +46,11 @@ def get_dream_data(syn, cohort, omic_type, source=None):
         >>> get_dream_data(syn, "BRCA", "rna+cna")
 
     """
-    syn_manifest = synapseutils.syncFromSynapse(
-        syn, "syn10139523", ifcollision='overwrite.local')
+    # the local copies of the datasets listed in a data manifest are used
+    # as they are, otherwise we make sure the copies are up to date
+    if not isinstance(syn, DataManifest):
+        syn_manifest = synapseutils.syncFromSynapse(
+            syn, "syn10139523", ifcollision='overwrite.local')
 
     # if we want to use multiple -omic datasets, get Synapse ids
     # for all of them...
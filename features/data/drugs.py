@@ -9,19 +9,71 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 """
 
 from HetMan.features import DATA_PATH
+from .utils import get_file_checksum
+from .firehose import save_cached_matrix, load_cached_matrix
 
 import pandas as pd
 from scipy import stats
 
 from ophion import Ophion
-from fuzzywuzzy import process
+from fuzzywuzzy import process, utils as fuzz_utils
+import os
 import json
+from collections import Counter
 
 
 def exp_norm(expr):
-    out_expr = expr.apply(
-        lambda x: stats.expon.ppf((x.rank()-1) / len(x)), 1)
-    return out_expr.fillna(0.0)
+    """Maps each row's ranks onto the quantiles of an exponential."""
+    out_expr = stats.expon.ppf((expr.rank(axis=1).values - 1)
+                               / expr.shape[1])
+
+    return pd.DataFrame(out_expr, index=expr.index,
+                        columns=expr.columns).fillna(0.0)
+
+
+def get_name_ngrams(name, n=3):
+    """Breaks a processed drug name into its overlapping character n-grams."""
+    name = " {} ".format(name)
+    return {name[i:(i + n)] for i in range(max(len(name) - n + 1, 1))}
+
+
+class DrugNameIndex(object):
+    """An n-gram index of drug names for finding approximate matches.
+
+    Candidate names sharing the most character n-grams with a query are
+    retrieved from the index first, and only these candidates are then
+    scored using the same fuzzy matching as :func:`process.extractOne`.
+
+    Args:
+        names (pd.Series): Drug names, indexed by the row of their drug.
+        max_cands (int, optional): How many candidates to score per query.
+
+    """
+
+    def __init__(self, names, max_cands=25):
+        self.names = names.dropna()
+        self.max_cands = max_cands
+        self.ngram_rows = dict()
+
+        for i, name in self.names.items():
+            for ngram in get_name_ngrams(fuzz_utils.full_process(name)):
+                self.ngram_rows.setdefault(ngram, []).append(i)
+
+    def extract_one(self, query):
+        """Finds the best matching drug name as (name, score, row)."""
+        row_counts = Counter()
+        for ngram in get_name_ngrams(fuzz_utils.full_process(query)):
+            row_counts.update(self.ngram_rows.get(ngram, ()))
+
+        # queries sharing no n-grams with any name are compared against all
+        # of the names, as before
+        if not row_counts:
+            return process.extractOne(query, self.names)
+
+        return process.extractOne(query, {
+            i: self.names[i]
+            for i, _ in row_counts.most_common(self.max_cands)
+            })
 
 
 def get_expr_ioria():
@@ -39,13 +91,56 @@ def get_expr_ioria():
     return cell_expr
 
 
-def get_drug_ioria(drug_list):
+def match_drug_names(drug_list, drug_annot, cache_file=None):
+    """Finds the closest matching drug name available for each query.
+
+    Args:
+        drug_list (list of str): The approximate names of drugs.
+        drug_annot (pd.DataFrame): The annotation of the available drugs.
+        cache_file (str, optional): A file where the matches found for
+                                    queries are saved, and reused by later
+                                    calls.
+
+    Returns:
+        match_indx (list): The best matching name of each drug, its match
+                           score, and the row of the drug in the annotation.
+
+    """
+    drug_matches = dict()
+    if cache_file is not None and os.path.isfile(cache_file):
+        with open(cache_file, 'r') as f:
+            drug_matches = json.load(f)
+
+    new_drugs = [drug for drug in drug_list if drug not in drug_matches]
+    if new_drugs:
+        name_index = DrugNameIndex(drug_annot['Name'])
+        synon_index = DrugNameIndex(drug_annot['Synonyms'])
+
+        for drug in new_drugs:
+            mtch = name_index.extract_one(drug), synon_index.extract_one(drug)
+            mtch = mtch[0] if mtch[0][1] > mtch[1][1] else mtch[1]
+            drug_matches[drug] = [str(mtch[0]), int(mtch[1]), int(mtch[2])]
+
+        if cache_file is not None:
+            tmp_file = "{}.tmp-{}".format(cache_file, os.getpid())
+
+            with open(tmp_file, 'w') as f:
+                json.dump(drug_matches, f)
+            os.replace(tmp_file, cache_file)
+
+    return [drug_matches[drug] for drug in drug_list]
+
+
+def get_drug_ioria(drug_list, cache_dir=None):
     """Get drug response data as collected by the Ioria landscape study.
 
     Args:
         drug_list (list of str): Which drugs to get responses for. Drug names
                                  can be approximate, in which case the best
                                  matching drug name available will be used.
+        cache_dir (str, optional): Where to cache the matched drug names and
+                                   the parsed response matrix; the default
+                                   is to not use a cache.
 
     Returns:
         drug_resp (pandas DataFrame), shape = [n_samples, n_drugs]
@@ -58,18 +153,31 @@ def get_drug_ioria(drug_list):
             ['Olaparib', 'RDEA119']
 
     """
-    drug_annot = pd.read_csv(DATA_PATH + 'drugs/ioria/drug_annot.txt.gz',
-                             sep='\t', comment='#')
-    drug_resp = pd.read_csv(DATA_PATH + 'drugs/ioria/drug-auc.txt.gz',
-                            sep='\t', comment='#', index_col=0)
+    annot_file = DATA_PATH + 'drugs/ioria/drug_annot.txt.gz'
+    resp_file = DATA_PATH + 'drugs/ioria/drug-auc.txt.gz'
+    drug_annot = pd.read_csv(annot_file, sep='\t', comment='#')
+
+    match_file = None
+    drug_resp = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        match_file = os.path.join(cache_dir, "{}__matches.json".format(
+            get_file_checksum(annot_file)))
+
+        resp_path = os.path.join(cache_dir, "{}__resp".format(
+            get_file_checksum(resp_file)))
+        drug_resp = load_cached_matrix(resp_path)
+
+    if drug_resp is None:
+        drug_resp = pd.read_csv(resp_file, sep='\t', comment='#',
+                                index_col=0, engine='c')
+
+        if cache_dir is not None:
+            save_cached_matrix(drug_resp, resp_path)
 
     # gets closest matching drug names available, retrieves corresponding drug
     # IDs used in the dataset
-    drug_match = [(process.extractOne(drug, drug_annot['Name']),
-                   process.extractOne(drug, drug_annot['Synonyms']))
-                  for drug in drug_list]
-    match_indx = [mtch[0] if mtch[0][1] > mtch[1][1] else mtch[1]
-                  for mtch in drug_match]
+    match_indx = match_drug_names(drug_list, drug_annot, match_file)
     drug_lbl = ['X' + str(drug_annot['Identifier'][mtch[2]])
                 for mtch in match_indx]
 
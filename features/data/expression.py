@@ -8,15 +8,17 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
-from .utils import choose_bmeg_server
+from .utils import choose_bmeg_server, get_file_stamp
+from .firehose import (read_firehose_cached, trim_sample_barcodes,
+                       save_cached_matrix, load_cached_matrix)
 import numpy as np
 import pandas as pd
 
 import os
 import glob
-
-import tarfile
-from io import BytesIO
+import shutil
+import json
+import dill as pickle
 
 
 def get_expr_bmeg(cohort):
@@ -50,13 +52,15 @@ def get_expr_bmeg(cohort):
     return pd.DataFrame(data).transpose().fillna(0.0)
 
 
-def get_expr_firehose(cohort, data_dir):
+def get_expr_firehose(cohort, data_dir, cache_dir=None):
     """Loads RNA-seq gene-level expression data downloaded from Firehose.
 
     Args:
         cohort (str): The name of a TCGA cohort available in Broad Firehose.
         data_dir (str): The local directory where the Firehose data was
                         downloaded.
+        cache_dir (str, optional): Where to cache the parsed expression
+                                   matrix; the default is to not use a cache.
 
     Returns:
         expr_data (:obj:`pd.DataFrame`, shape = [n_samps, n_genes])
@@ -87,30 +91,21 @@ def get_expr_firehose(cohort, data_dir):
                       "for cohort {} in directory {} !".format(
                           cohort, data_dir))
 
-    # opens the tarball and locates the expression data within it
-    expr_tar = tarfile.open(expr_tars[0])
-    expr_indx = [i for i, memb in enumerate(expr_tar.getmembers())
-                 if 'data.txt' in memb.get_info()['name']]
-  
-    # ensures only one file in the tarball contains expression data
-    if len(expr_indx) == 0:
-        raise IOError("No expression files found in the tarball!")
-    elif len(expr_indx) > 1:
-        raise IOError("Multiple expression files found in the tarball!")
-
-    expr_fl = expr_tar.extractfile(expr_tar.getmembers()[expr_indx[0]])
-    expr_data = pd.read_csv(BytesIO(expr_fl.read()),
-                            sep='\t', skiprows=[1], index_col=0,
-                            engine='python').transpose()
-    expr_tar.close()
+    return read_firehose_cached(expr_tars[0], parse_expr_firehose,
+                                cache_dir, 'expr')
+
+
+def parse_expr_firehose(expr_arch):
+    """Parses the expression matrix found in a Firehose tarball."""
+    expr_data = expr_arch.read_matrix('data.txt', 'expression',
+                                      skip_lines=1).transpose()
 
     expr_data.columns = [gn.split('|')[0] if isinstance(gn, str) else gn
                          for gn in expr_data.columns]
     expr_data.columns.name = 'Gene'
 
     expr_data = expr_data.iloc[:, expr_data.columns != '?']
-    expr_data.index = ["-".join(x[:4])
-                       for x in expr_data.index.str.split('-')]
+    expr_data.index = trim_sample_barcodes(expr_data.index)
 
     return expr_data
 
@@ -174,39 +169,230 @@ def get_expr_icgc(cohort, data_dir):
     return expr_data
 
 
-def get_expr_toil(cohort, data_dir, collapse_txs=False):
+# the fields of the transcript labels used in the kallisto calls, and the
+# order they are given in when transcript-level calls are loaded
+toil_levels = ['ENST', 'ENSG', 'OTTG', 'OTTT', 'Transcript', 'Gene',
+               'Length', 'GeneType', '']
+toil_order = ['Gene', 'Transcript', 'ENSG', 'ENST', 'OTTG', 'OTTT',
+              'Length', 'GeneType', '']
+TOIL_CACHE_VERSION = 1
+
+
+def read_toil_chunks(toil_file, chunk_size=10000):
+    """Reads a kallisto TPM matrix a block of transcripts at a time.
+
+    Returns:
+        samps (:obj:`list` of :obj:`str`): The samples in the matrix.
+        chunk_iter (generator)
+            Yields the transcript labels and the float32 TPM values of each
+            block of transcripts.
+
+    """
+    samps = list(pd.read_csv(toil_file, sep='\t', index_col=0,
+                             nrows=0).columns)
+
+    def chunk_iter():
+        for tx_chunk in pd.read_csv(toil_file, sep='\t', index_col=0,
+                                    engine='c', chunksize=chunk_size,
+                                    dtype={samp: np.float32
+                                           for samp in samps}):
+            yield tx_chunk.index, tx_chunk.values
+
+    return samps, chunk_iter()
+
+
+def collapse_toil_chunks(chunk_iter, n_samps, init_genes=2 ** 16):
+    """Sums transcript-level TPMs into gene-level TPMs block by block.
+
+    Returns:
+        genes (:obj:`np.array` of :obj:`str`)
+        gene_tpms (:obj:`np.array`, shape = [n_genes, n_samps])
+
+    """
+    gene_indx = dict()
+    gene_tpms = np.zeros((init_genes, n_samps), dtype=np.float32)
+
+    for tx_lbls, tx_vals in chunk_iter:
+        chunk_genes, chunk_codes = np.unique(
+            tx_lbls.str.split('|').str[5].values.astype(str),
+            return_inverse=True
+            )
+
+        gene_codes = np.array([gene_indx.setdefault(gene, len(gene_indx))
+                               for gene in chunk_genes])
+        if len(gene_indx) > gene_tpms.shape[0]:
+            gene_tpms = np.concatenate([
+                gene_tpms, np.zeros((max(len(gene_indx), gene_tpms.shape[0])
+                                     - gene_tpms.shape[0] + init_genes,
+                                     n_samps), dtype=np.float32)
+                ])
+
+        gene_tpms[gene_codes] += pd.DataFrame(tx_vals).groupby(
+            chunk_codes).sum().values
+
+    genes = np.array(sorted(gene_indx, key=gene_indx.get), dtype=object)
+
+    return genes, gene_tpms[:len(genes)]
+
+
+def save_toil_transcripts(samps, chunk_iter, cache_path):
+    """Saves transcript-level TPMs with an integer index of transcripts.
+
+    TPM values are written to disk as each block of transcripts is read,
+    and the labels of the transcripts are stored separately as a table of
+    categorical fields.
+
+    """
+    tmp_path = "{}.tmp-{}".format(cache_path, os.getpid())
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    lbl_list = []
+    n_txs = 0
+    with open(os.path.join(tmp_path, "values.f32"), 'wb') as f:
+        for tx_lbls, tx_vals in chunk_iter:
+            lbl_list += [tx_lbls.values]
+            n_txs += tx_vals.shape[0]
+            np.ascontiguousarray(tx_vals, dtype=np.float32).tofile(f)
+
+    tx_annot = pd.Series(np.concatenate(lbl_list)).str.split(
+        '|', expand=True)
+    tx_annot.columns = toil_levels
+    tx_annot = tx_annot.astype('category')
+
+    with open(os.path.join(tmp_path, "labels.p"), 'wb') as f:
+        pickle.dump({'samps': samps, 'txs': tx_annot}, f, protocol=-1)
+
+    with open(os.path.join(tmp_path, "manifest.json"), 'w') as f:
+        json.dump({'version': TOIL_CACHE_VERSION,
+                   'shape': [n_txs, len(samps)]}, f)
+
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
+    os.rename(tmp_path, cache_path)
+
+
+def load_toil_transcripts(cache_path):
+    """Reads cached transcript-level TPMs, or None if they are not cached.
+
+    Returns:
+        samps (:obj:`list` of :obj:`str`)
+        tx_annot (pd.DataFrame): The labels of each transcript.
+        tx_vals (:obj:`np.memmap`, shape = [n_txs, n_samps])
+
+    """
+    manifest_file = os.path.join(cache_path, "manifest.json")
+    if not os.path.isfile(manifest_file):
+        return None
+
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    if manifest['version'] != TOIL_CACHE_VERSION:
+        return None
+
+    with open(os.path.join(cache_path, "labels.p"), 'rb') as f:
+        tx_lbls = pickle.load(f)
+
+    tx_vals = np.memmap(os.path.join(cache_path, "values.f32"),
+                        dtype=np.float32, mode='r',
+                        shape=tuple(manifest['shape']))
+
+    return tx_lbls['samps'], tx_lbls['txs'], tx_vals
+
+
+def get_expr_toil(cohort, data_dir, collapse_txs=False, cache_dir=None,
+                  chunk_size=10000):
     """Loads TCGA RNAseq expression from Tatlow's kallisto calls.
 
+    The transcript-level matrix is read in blocks of rows; when collapsing
+    transcripts, their TPMs are summed into a gene-level float32 matrix as
+    each block is read, so that the full matrix is never held in memory.
+
+    Args:
+        cohort (str): A TCGA cohort, or 'CCLE'.
+        data_dir (str): Where the kallisto calls have been downloaded.
+        collapse_txs (bool, optional): Whether to sum transcript-level TPMs
+                                       into gene-level TPMs.
+        cache_dir (str, optional): Where to cache the parsed transcript-level
+                                   or gene-level matrix; the default is to
+                                   not use a cache.
+        chunk_size (int, optional): How many transcripts to read at a time.
+
     Returns:
         expr_data (:obj:`pd.DataFrame`, shape = [n_samps, n_genes])
 
     """
     if cohort != 'CCLE':
-        expr = pd.read_csv(os.path.join(data_dir, "TCGA",
-                                        "TCGA_{}_tpm.tsv.gz".format(cohort)),
-                           sep='\t', index_col=0)
-
+        toil_file = os.path.join(data_dir, "TCGA",
+                                 "TCGA_{}_tpm.tsv.gz".format(cohort))
     else:
-        expr = pd.read_csv(os.path.join(data_dir, "CCLE", "CCLE_tpm.tsv.gz"),
-                           sep='\t', index_col=0)
+        toil_file = os.path.join(data_dir, "CCLE", "CCLE_tpm.tsv.gz")
 
-    expr.index = expr.index.str.split('|', expand=True)
-    expr.index = expr.index.set_names(['ENST', 'ENSG', 'OTTG', 'OTTT',
-                                       'Transcript', 'Gene', 'Length',
-                                       'GeneType', ''])
-
-    id_map = pd.read_csv(os.path.join(data_dir, 'TCGA_ID_MAP.csv'),
-                         sep=',', index_col=0)
-    id_map = id_map.loc[id_map['Disease'] == cohort]
-    expr.columns = id_map.loc[expr.columns, 'AliquotBarcode'].values
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, "{}__{}".format(
+            get_file_stamp(toil_file),
+            'genes' if collapse_txs else 'txs'
+            ))
 
     if collapse_txs:
-        expr = expr.groupby(level=['Gene'], axis=0).sum()
+        expr = None
+        if cache_dir is not None:
+            expr = load_cached_matrix(cache_path)
+
+        if expr is None:
+            samps, chunk_iter = read_toil_chunks(toil_file, chunk_size)
+            genes, gene_tpms = collapse_toil_chunks(chunk_iter, len(samps))
+            gene_order = np.argsort(genes, kind='mergesort')
+
+            expr = pd.DataFrame(gene_tpms[gene_order].transpose(),
+                                index=samps, columns=genes[gene_order])
+            expr.columns.name = 'Gene'
+
+            if cache_dir is not None:
+                save_cached_matrix(expr, cache_path)
 
     else:
-        expr.sort_index(axis=0, level=['Gene'], inplace=True)
-        expr = expr.reorder_levels(['Gene', 'Transcript', 'ENSG', 'ENST',
-                                    'OTTG', 'OTTT', 'Length', 'GeneType', ''])
+        tx_data = None
+        if cache_dir is not None:
+            tx_data = load_toil_transcripts(cache_path)
+
+            if tx_data is None:
+                save_toil_transcripts(*read_toil_chunks(toil_file,
+                                                        chunk_size),
+                                      cache_path)
+                tx_data = load_toil_transcripts(cache_path)
+
+            samps, tx_annot, tx_vals = tx_data
+
+        else:
+            samps, chunk_iter = read_toil_chunks(toil_file, chunk_size)
+            lbl_list, val_list = zip(*chunk_iter)
+
+            tx_annot = pd.Series(np.concatenate(lbl_list)).str.split(
+                '|', expand=True)
+            tx_annot.columns = toil_levels
+            tx_annot = tx_annot.astype('category')
+            tx_vals = np.concatenate(val_list)
+
+        # sorts transcripts by gene and then by the rest of their labels
+        tx_codes = {lvl: tx_annot[lvl].cat.codes.values
+                    for lvl in toil_levels}
+        tx_order = np.lexsort([tx_codes[lvl] for lvl in (
+            ['Gene'] + [lvl for lvl in toil_levels if lvl != 'Gene'])[::-1]])
+
+        expr = pd.DataFrame(
+            np.asarray(tx_vals[tx_order]).transpose(), index=samps,
+            columns=pd.MultiIndex(
+                levels=[tx_annot[lvl].cat.categories for lvl in toil_order],
+                codes=[tx_codes[lvl][tx_order] for lvl in toil_order],
+                names=toil_order
+                )
+            )
 
-    return expr.transpose()[~expr.columns.duplicated()]
+    id_map = pd.read_csv(os.path.join(data_dir, 'TCGA_ID_MAP.csv'),
+                         sep=',', index_col=0)
+    id_map = id_map.loc[id_map['Disease'] == cohort]
+    expr.index = id_map.loc[expr.index, 'AliquotBarcode'].values
 
+    return expr.loc[~expr.index.duplicated()]
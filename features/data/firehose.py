@@ -0,0 +1,239 @@
+"""Reading datasets from the tarballs downloaded from Broad Firehose.
+
+This module contains a reader for the archives in which Firehose distributes
+its expression and copy number datasets, as well as a local cache of the
+matrices parsed from them that allows later loads to skip decompressing the
+archives altogether.
+
+See Also:
+    :module:`.expression`: Loading and processing expression datasets.
+    :module:`.copies`: Dealing with copy number alterations.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+from .utils import get_file_stamp
+from .maf import trim_barcodes
+
+import numpy as np
+import pandas as pd
+
+import os
+import shutil
+import tarfile
+import json
+import dill as pickle
+
+
+FIREHOSE_CACHE_VERSION = 1
+
+
+class FirehoseArchive(object):
+    """A Firehose tarball whose members are listed once when it is opened.
+
+    Args:
+        tar_file (str): The path to a tarball downloaded from Firehose.
+
+    Examples:
+        >>> with FirehoseArchive(expr_tar) as expr_arch:
+        >>>     expr_data = expr_arch.read_matrix('data.txt', 'expression',
+        >>>                                       skip_lines=1)
+
+    """
+
+    def __init__(self, tar_file):
+        self.tar_file = tar_file
+        self.tar = tarfile.open(tar_file)
+        self.members = self.tar.getmembers()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.tar.close()
+
+    def find_member(self, name_str, file_lbl):
+        """Finds the one file in the tarball with a name matching a pattern.
+
+        Args:
+            name_str (str): A string found in the name of the file.
+            file_lbl (str): A description of the file used in error messages.
+
+        """
+        memb_list = [memb for memb in self.members if name_str in memb.name]
+
+        if len(memb_list) == 0:
+            raise IOError("No {} files found in the tarball!".format(
+                file_lbl))
+        elif len(memb_list) > 1:
+            raise IOError("Multiple {} files found in the tarball!".format(
+                file_lbl))
+
+        return memb_list[0]
+
+    def read_table(self, name_str, file_lbl, **csv_args):
+        """Parses a file in the tarball as it is being decompressed."""
+        memb_fl = self.tar.extractfile(self.find_member(name_str, file_lbl))
+
+        return pd.read_csv(memb_fl, sep='\t', engine='c', **csv_args)
+
+    def read_matrix(self, name_str, file_lbl, label_cols=1, skip_lines=0,
+                    dtype=np.float32):
+        """Parses a file in the tarball consisting of a numeric matrix.
+
+        The columns of the matrix are found by reading the file's header line
+        before the rest of the file is passed to the parser, which allows for
+        the values of the matrix to be parsed directly into the given type.
+
+        Args:
+            name_str (str): A string found in the name of the file.
+            file_lbl (str): A description of the file used in error messages.
+            label_cols (int, optional): How many of the file's columns, at
+                                        the start of each line, are labels
+                                        rather than matrix values. The first
+                                        of these is used as the row index.
+            skip_lines (int, optional): How many lines after the header line
+                                        to ignore.
+            dtype (optional): The type of the matrix values.
+
+        Returns:
+            mat_data (pd.DataFrame)
+
+        """
+        memb_fl = self.tar.extractfile(self.find_member(name_str, file_lbl))
+        mat_cols = memb_fl.readline().decode('utf-8').rstrip('\r\n').split(
+            '\t')
+
+        return pd.read_csv(memb_fl, sep='\t', engine='c', header=None,
+                           names=mat_cols, index_col=0, skiprows=skip_lines,
+                           dtype={col: dtype for col in mat_cols[label_cols:]})
+
+
+def trim_sample_barcodes(samps):
+    """Truncates a list of TCGA sample barcodes to their first four fields."""
+    return trim_barcodes(pd.Series(samps)).values
+
+
+def get_cache_path(cache_dir, tar_file, *cache_args):
+    """Finds where the matrix parsed from a Firehose tarball is cached."""
+    return os.path.join(cache_dir, "__".join(
+        [get_file_stamp(tar_file)] + [str(arg) for arg in cache_args]))
+
+
+def save_cached_matrix(mat_data, cache_path):
+    """Saves a parsed matrix as a set of columnar arrays of each type."""
+    tmp_path = "{}.tmp-{}".format(cache_path, os.getpid())
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    dtype_list = sorted({str(dtype) for dtype in mat_data.dtypes})
+    for i, dtype in enumerate(dtype_list):
+        dtype_cols = [str(col_dtype) == dtype for col_dtype in mat_data.dtypes]
+
+        np.save(os.path.join(tmp_path, "values{}.npy".format(i)),
+                mat_data.loc[:, dtype_cols].values,
+                allow_pickle=dtype == 'object')
+
+    with open(os.path.join(tmp_path, "labels.p"), 'wb') as f:
+        pickle.dump({'index': mat_data.index, 'columns': mat_data.columns,
+                     'dtypes': [str(dtype) for dtype in mat_data.dtypes]},
+                    f, protocol=-1)
+
+    with open(os.path.join(tmp_path, "manifest.json"), 'w') as f:
+        json.dump({'version': FIREHOSE_CACHE_VERSION,
+                   'dtypes': dtype_list}, f)
+
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
+    os.rename(tmp_path, cache_path)
+
+
+def load_cached_matrix(cache_path, mmap_mode=None):
+    """Reads a cached matrix, returning None if it has not been cached.
+
+    Args:
+        cache_path (str): Where the matrix was cached.
+        mmap_mode (str, optional): How to memory-map the matrix's numeric
+                                   values; see :func:`numpy.load`. The
+                                   default is to read them into memory.
+
+    """
+    manifest_file = os.path.join(cache_path, "manifest.json")
+    if not os.path.isfile(manifest_file):
+        return None
+
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+
+    if manifest['version'] != FIREHOSE_CACHE_VERSION:
+        return None
+
+    with open(os.path.join(cache_path, "labels.p"), 'rb') as f:
+        mat_labels = pickle.load(f)
+
+    col_dtypes = np.array(mat_labels['dtypes'])
+    mat_list = []
+    for i, dtype in enumerate(manifest['dtypes']):
+        if dtype == 'object':
+            mat_vals = np.load(
+                os.path.join(cache_path, "values{}.npy".format(i)),
+                allow_pickle=True
+                )
+
+        else:
+            mat_vals = np.load(
+                os.path.join(cache_path, "values{}.npy".format(i)),
+                mmap_mode=mmap_mode
+                )
+
+        mat_list += [pd.DataFrame(
+            mat_vals, index=mat_labels['index'],
+            columns=np.arange(len(col_dtypes))[col_dtypes == dtype]
+            )]
+
+    if len(mat_list) == 0:
+        mat_data = pd.DataFrame(index=mat_labels['index'])
+    elif len(mat_list) == 1:
+        mat_data = mat_list[0]
+    else:
+        mat_data = pd.concat(mat_list, axis=1).loc[
+            :, np.arange(len(col_dtypes))]
+
+    mat_data.columns = mat_labels['columns']
+
+    return mat_data
+
+
+def read_firehose_cached(tar_file, parse_fx, cache_dir=None, *cache_args):
+    """Parses a matrix from a Firehose tarball, reusing a cached copy.
+
+    Args:
+        tar_file (str): The path to a tarball downloaded from Firehose.
+        parse_fx (function): Takes a :class:`FirehoseArchive` and returns
+                             the matrix parsed from it.
+        cache_dir (str, optional): Where to cache parsed matrices. The
+                                   default is to not use a cache.
+        cache_args: Any further options of the parsing function, which are
+                    used to distinguish matrices parsed from the same
+                    tarball.
+
+    """
+    if cache_dir is not None:
+        cache_path = get_cache_path(cache_dir, tar_file, *cache_args)
+        mat_data = load_cached_matrix(cache_path)
+
+        if mat_data is not None:
+            return mat_data
+
+    with FirehoseArchive(tar_file) as fh_arch:
+        mat_data = parse_fx(fh_arch)
+
+    if cache_dir is not None:
+        save_cached_matrix(mat_data, cache_path)
+
+    return mat_data
@@ -0,0 +1,187 @@
+"""Keeping track of the dataset files found in local data directories.
+
+This module contains an inventory of the directory tree under a data root,
+which records the entries of each directory along with the directory's
+modification time. Finding files in the tree then only requires checking
+whether the directories along the way have changed, rather than listing all
+of them again, which is slow on networked filesystems.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+import os
+import json
+from fnmatch import fnmatch
+
+
+DATA_INVENTORY_VERSION = 1
+
+# inventories already loaded in this process, keyed by their data root
+_loaded_inventories = dict()
+
+
+class DataInventory(object):
+    """The directories and dataset files found under a data root.
+
+    Args:
+        data_root (str): A directory that datasets were downloaded to.
+        inventory_file (str, optional): Where the inventory is saved; the
+                                        default is alongside the data root.
+                                        Saving it anywhere inside the data
+                                        root would change the modification
+                                        time of the directory it is in.
+
+    Examples:
+        >>> inventory = DataInventory(firehose_dir)
+        >>> expr_files = inventory.find_files(
+        >>>     ['stddata__*', '*', '*', '*__RSEM_genes_normalized__*'])
+
+    """
+
+    def __init__(self, data_root, inventory_file=None):
+        self.data_root = os.path.abspath(data_root)
+
+        if inventory_file is None:
+            inventory_file = "{}.dryads-inventory.json".format(
+                self.data_root)
+        self.inventory_file = inventory_file
+
+        self.dirs = dict()
+        if os.path.isfile(inventory_file):
+            try:
+                with open(inventory_file, 'r') as f:
+                    inventory = json.load(f)
+
+            except (IOError, ValueError):
+                inventory = None
+
+            if (inventory is not None
+                    and inventory['version'] == DATA_INVENTORY_VERSION):
+                self.dirs = inventory['dirs']
+
+        self.changed = False
+
+    def list_dir(self, rel_dir):
+        """Gets the subdirectories and files of a directory in the tree.
+
+        A directory is only listed again if its modification time differs
+        from when it was last listed.
+
+        Args:
+            rel_dir (str): A directory relative to the data root.
+
+        Returns:
+            sub_dirs, files (:obj:`list` of :obj:`str`)
+
+        """
+        dir_path = os.path.join(self.data_root, rel_dir)
+
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime_ns
+        except FileNotFoundError:
+            return [], []
+
+        dir_entry = self.dirs.get(rel_dir, None)
+        if dir_entry is None or dir_entry['mtime'] != dir_mtime:
+            sub_dirs = []
+            files = []
+
+            with os.scandir(dir_path) as dir_iter:
+                for entry in dir_iter:
+                    if entry.is_dir():
+                        sub_dirs += [entry.name]
+                    else:
+                        files += [entry.name]
+
+            dir_entry = {'mtime': dir_mtime, 'dirs': sorted(sub_dirs),
+                         'files': sorted(files)}
+            self.dirs[rel_dir] = dir_entry
+            self.changed = True
+
+        return dir_entry['dirs'], dir_entry['files']
+
+    def find_files(self, level_patterns):
+        """Finds the files matching a pattern at each level of the tree.
+
+        Args:
+            level_patterns (:obj:`list` of :obj:`str`)
+                A shell-style pattern for each directory below the data root
+                leading to the files, followed by a pattern for the files.
+
+        Returns:
+            file_stats (dict): The size and modification time of each
+                               matching file, keyed by its path relative to
+                               the data root.
+
+        """
+        match_dirs = ['']
+        for dir_ptrn in level_patterns[:-1]:
+            match_dirs = [os.path.join(rel_dir, sub_dir)
+                          for rel_dir in match_dirs
+                          for sub_dir in self.list_dir(rel_dir)[0]
+                          if fnmatch(sub_dir, dir_ptrn)]
+
+        file_stats = dict()
+        for rel_dir in match_dirs:
+            for fl in self.list_dir(rel_dir)[1]:
+                if fnmatch(fl, level_patterns[-1]):
+                    fl_path = os.path.join(rel_dir, fl)
+                    fl_stat = os.stat(os.path.join(self.data_root, fl_path))
+                    file_stats[fl_path] = (fl_stat.st_size,
+                                           fl_stat.st_mtime_ns)
+
+        if self.changed:
+            self.save()
+
+        return file_stats
+
+    def save(self):
+        """Saves the inventory, unless its location can't be written to."""
+        tmp_file = "{}.tmp-{}".format(self.inventory_file, os.getpid())
+
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump({'version': DATA_INVENTORY_VERSION,
+                           'dirs': self.dirs}, f)
+            os.replace(tmp_file, self.inventory_file)
+
+        except IOError:
+            pass
+
+        self.changed = False
+
+
+def load_inventory(data_root, inventory_file=None):
+    """Gets the inventory of a data root, reading it once per process."""
+    load_key = os.path.abspath(data_root), inventory_file
+
+    if load_key not in _loaded_inventories:
+        _loaded_inventories[load_key] = DataInventory(data_root,
+                                                      inventory_file)
+
+    return _loaded_inventories[load_key]
+
+
+def find_cohort_files(data_root, level_patterns, cohort_level):
+    """Finds the cohorts with a dataset file in a data root.
+
+    Args:
+        data_root (str): A directory that datasets were downloaded to.
+        level_patterns (:obj:`list` of :obj:`str`): As in
+                                                    :meth:`find_files`.
+        cohort_level (int): Which of the levels below the data root is
+                            named after the cohort a file belongs to.
+
+    Returns:
+        cohort_files (dict): The dataset files found for each cohort.
+
+    """
+    cohort_files = dict()
+
+    for fl_path in load_inventory(data_root).find_files(level_patterns):
+        coh = fl_path.split(os.sep)[cohort_level]
+        cohort_files.setdefault(coh, []).append(
+            os.path.join(data_root, fl_path))
+
+    return cohort_files
@@ -0,0 +1,164 @@
+"""Normalizing mutation annotation (MAF) tables loaded from any source.
+
+This module contains the columnar parsing shared by all of the cohort variant
+loaders. String transformations are applied once to each unique value of a
+column rather than once per row, and label columns are stored as categoricals
+while the full tables are being filtered down to a single cohort.
+
+See Also:
+    :module:`.variants`: Loading variant calls from external sources.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# how the VEP consequence terms used by some sources map to the MAF variant
+# classifications used by MC3 and cBioPortal
+vep_forms = {
+    'missense_variant': 'Missense_Mutation',
+    'frameshift_variant': 'frameshift_variant',
+    'inframe_deletion': 'In_Frame_Del',
+    'inframe_insertion': 'In_Frame_Ins',
+    'stop_gained': 'Nonsense_Mutation',
+    'start_lost': 'Translation_Start_Site',
+    'protein_altering_variant': 'Nonsense_Mutation',
+    'stop_lost': 'Nonstop_Mutation',
+    'internal_tandem_duplication': 'ITD',
+    'splice_acceptor_variant': 'Splice_Site',
+    'splice_donor_variant': 'Splice_Site',
+    }
+
+# how the mutation types used by the mutational profiles of the METABRIC and
+# CCLE cohorts map to MAF variant classifications
+profile_forms = {
+    'missense SNV': 'Missense_Mutation',
+    'silent SNV': 'Silent',
+    'frameshift indel': 'Frame_Shift_Ins',
+    'nonsense SNV': 'Nonsense_Mutation',
+    'inframe indel': 'In_Frame_Del',
+    'stoploss': 'Nonstop_Mutation'
+    }
+
+# MAF columns whose values are labels repeated across many rows, and those
+# holding read counts
+label_fields = ('Gene', 'Form', 'Sample', 'Chr', 'Strand', 'Transcript',
+                'Filter', 'Consequence', 'Variant_Class', 'Genotyper')
+count_fields = ('depth', 'ref_count', 'alt_count', 'tot_reads', 'alt_reads')
+
+
+def map_unique(vals, map_fx):
+    """Applies a columnar transformation to each unique value of a column.
+
+    Args:
+        vals (pd.Series): A column of a MAF table.
+        map_fx (function): Takes a Series of strings and returns a Series or
+                           array of transformed values of the same length.
+
+    Returns:
+        new_vals (pd.Series): The transformed column; missing values in the
+                              original column remain missing.
+
+    """
+    codes, uniqs = pd.factorize(vals)
+    new_uniqs = np.asarray(map_fx(pd.Series(np.asarray(uniqs, dtype=object),
+                                            dtype=object)))
+
+    if (codes == -1).any():
+        new_uniqs = np.append(new_uniqs, np.nan)
+
+    return pd.Series(new_uniqs.take(codes), index=vals.index, name=vals.name)
+
+
+def trim_barcodes(samps, parts=4):
+    """Truncates sample barcodes to their first few dash-delimited fields."""
+    return map_unique(
+        samps, lambda smps: smps.str.split('-').str[:parts].str.join('-'))
+
+
+def parse_scores(vals, null_val):
+    """Gets numeric scores from annotations such as `probably_damaging(0.9)`.
+
+    Args:
+        vals (pd.Series): PolyPhen or SIFT calls.
+        null_val (float): The score given to variants without a call ('.').
+
+    """
+    return map_unique(vals, lambda scrs: pd.to_numeric(
+        scrs.str.replace(r'^.*\(', '', regex=True).str.replace(
+            r'\)$', '', regex=True).where(scrs != '.', null_val)
+        )).astype(float)
+
+
+def parse_exons(vals):
+    """Gets exon numbers from annotations such as `exon12`."""
+    return map_unique(vals, lambda exns: np.array(
+        [int(exn) if exn == exn else '.'
+         for exn in pd.to_numeric(exns.str.split('exon').str[1],
+                                  errors='coerce')],
+        dtype=object
+        )).fillna('.')
+
+
+def parse_transcripts(hgvsc):
+    """Gets the transcript IDs from HGVS coding sequence annotations."""
+    return map_unique(hgvsc, lambda hgvs: hgvs.str.replace(
+        r'\.[0-9]+:.*$', '', regex=True)).fillna('.')
+
+
+def normalize_maf(var_data, barcode_parts=4, categorical=True):
+    """Normalizes the annotation fields of a table of variant calls.
+
+    Args:
+        var_data (pd.DataFrame): Variant calls with columns named as in the
+                                 loaders, eg. 'Sample', 'PolyPhen', 'depth'.
+        barcode_parts (int, optional): How many fields of the sample barcodes
+                                       to keep; if None, they are unchanged.
+        categorical (bool, optional): Whether to store label columns such as
+                                      'Gene', 'Form', and 'Sample' as
+                                      categoricals.
+
+    Returns:
+        var_data (pd.DataFrame)
+
+    """
+    var_data = var_data.copy()
+
+    if barcode_parts is not None and 'Sample' in var_data:
+        var_data['Sample'] = trim_barcodes(var_data.Sample, barcode_parts)
+
+    if 'PolyPhen' in var_data:
+        var_data['PolyPhen'] = parse_scores(var_data.PolyPhen, 0)
+    if 'SIFT' in var_data:
+        var_data['SIFT'] = 1 - parse_scores(var_data.SIFT, 1)
+
+    for fld in set(count_fields) & set(var_data.columns):
+        cnts = pd.to_numeric(var_data[fld], errors='coerce')
+
+        if cnts.notnull().all():
+            var_data[fld] = cnts.astype(np.int32)
+        else:
+            var_data[fld] = cnts
+
+    if categorical:
+        for fld in set(label_fields) & set(var_data.columns):
+            var_data[fld] = var_data[fld].astype('category')
+
+    return var_data
+
+
+def drop_categories(var_data):
+    """Converts categorical columns back to plain values.
+
+    This is done once a table of variant calls has been filtered down to a
+    single cohort, as grouping on categoricals also produces empty groups for
+    categories that are no longer observed.
+
+    """
+    cat_flds = [fld for fld, dtype in var_data.dtypes.items()
+                if isinstance(dtype, pd.CategoricalDtype)]
+
+    return var_data.astype({fld: object for fld in cat_flds})
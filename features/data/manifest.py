@@ -0,0 +1,212 @@
+"""Resolving the Synapse datasets used by the cohort loaders to local files.
+
+This module contains a manifest of the Synapse entities that the cohort
+loaders read, recording where a copy of each has been downloaded and its
+checksum. Loaders that are given a manifest in place of a Synapse client
+read these local copies directly, without logging into Synapse or otherwise
+touching the network.
+
+See Also:
+    :module:`.variants`: Loading variant calls from external sources.
+    :module:`.dream`: Loading data for the DREAM Proteogenomics Challenge.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+from .utils import get_file_checksum
+
+import os
+import json
+from collections import namedtuple
+
+
+DATA_MANIFEST_VERSION = 1
+
+# the Synapse entities read by the cohort loaders, labelled by dataset
+syn_datasets = {
+    'mc3': 'syn7824274',
+    'beatAML-variants': 'syn18683049',
+    'dream-BRCA-rna': 'syn10139529',
+    'dream-BRCA-cna': 'syn10139527',
+    'dream-BRCA-prot': 'syn10139538',
+    'dream-OV-rna': 'syn10535396',
+    'dream-OV-cna': 'syn10139531',
+    'dream-OV-prot-JHU': 'syn10514980',
+    'dream-OV-prot-PNNL': 'syn10514979',
+    'cptac-BRCA-rna': 'syn11328694',
+    'cptac-BRCA-prot': 'syn11328678',
+    }
+
+# the attributes of a Synapse entity used by the loaders
+ManifestEntity = namedtuple('ManifestEntity', ['id', 'path', 'md5'])
+
+
+class DataManifest(object):
+    """A local stand-in for a Synapse client built from a manifest file.
+
+    The manifest maps Synapse entity IDs to paths which are either absolute
+    or relative to the directory containing the manifest, which allows for
+    a directory of test datasets to be used in place of the full downloads.
+
+    Args:
+        manifest_file (str): The path to a manifest, as created by
+                             :func:`build_data_manifest`.
+
+    Examples:
+        >>> syn = DataManifest("/home/users/grzadkow/synapse/manifest.json")
+        >>> mc3_path = syn.get('syn7824274').path
+        >>> mc3_path = syn.resolve('mc3')
+
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+        self.manifest_dir = os.path.dirname(os.path.abspath(manifest_file))
+
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+
+        if manifest['version'] != DATA_MANIFEST_VERSION:
+            raise ValueError("Unsupported data manifest version `{}` "
+                             "!".format(manifest['version']))
+
+        self.entities = manifest['entities']
+
+    def login(self, *args, **kwargs):
+        """Does nothing, as the manifest never needs to log into Synapse."""
+        pass
+
+    def get(self, entity, **get_args):
+        """Finds the local copy of a Synapse entity.
+
+        Args:
+            entity (str): A Synapse ID, or one of the dataset labels in
+                          `syn_datasets`.
+
+        Returns:
+            ent (ManifestEntity): An object with the `path` attribute of the
+                                  local copy, as with `Synapse.get`.
+
+        """
+        syn_id = syn_datasets.get(entity, entity)
+
+        if syn_id not in self.entities:
+            raise IOError("Synapse entity `{}` is not listed in the data "
+                          "manifest {} !".format(entity, self.manifest_file))
+
+        ent_path = os.path.join(self.manifest_dir,
+                                self.entities[syn_id]['path'])
+        if not os.path.isfile(ent_path):
+            raise IOError("The local copy of Synapse entity `{}` is missing "
+                          "from {} !".format(entity, ent_path))
+
+        return ManifestEntity(id=syn_id, path=ent_path,
+                              md5=self.entities[syn_id]['md5'])
+
+    def resolve(self, entity):
+        """Gets the path to the local copy of a Synapse entity."""
+        return self.get(entity).path
+
+    def verify(self, entities=None):
+        """Checks that local copies of entities match their checksums.
+
+        Returns:
+            bad_ents (:obj:`list` of :obj:`str`)
+                The entities whose local copies are missing or have changed.
+
+        """
+        if entities is None:
+            entities = list(self.entities)
+
+        bad_ents = []
+        for entity in entities:
+            try:
+                ent = self.get(entity)
+            except IOError:
+                bad_ents += [entity]
+                continue
+
+            if get_file_checksum(ent.path) != ent.md5:
+                bad_ents += [entity]
+
+        return bad_ents
+
+
+def build_data_manifest(manifest_file, syn_root, entities=None):
+    """Downloads Synapse entities and records their local copies.
+
+    This needs to be run once on a machine with network access, after which
+    the manifest can be used on compute nodes that lack it.
+
+    Args:
+        manifest_file (str): Where to save the manifest.
+        syn_root (str): The Synapse cache directory to download files to.
+        entities (:obj:`iterable` of :obj:`str`, optional)
+            Which Synapse IDs or dataset labels to include; the default is
+            to use every dataset in `syn_datasets`.
+
+    """
+    import synapseclient
+
+    syn = synapseclient.Synapse()
+    syn.cache.cache_root_dir = syn_root
+    syn.login()
+
+    if entities is None:
+        entities = list(syn_datasets.values())
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_file))
+    ent_dict = dict()
+    for entity in entities:
+        syn_id = syn_datasets.get(entity, entity)
+        ent_path = os.path.abspath(syn.get(syn_id).path)
+
+        if ent_path.startswith(manifest_dir + os.sep):
+            ent_path = os.path.relpath(ent_path, manifest_dir)
+
+        ent_dict[syn_id] = {
+            'path': ent_path,
+            'md5': get_file_checksum(os.path.join(manifest_dir, ent_path))
+            }
+
+    tmp_file = "{}.tmp-{}".format(manifest_file, os.getpid())
+    with open(tmp_file, 'w') as f:
+        json.dump({'version': DATA_MANIFEST_VERSION, 'entities': ent_dict},
+                  f, indent=2, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def load_data_source(syn_root, manifest_file=None):
+    """Gets an interface to the Synapse datasets used by the loaders.
+
+    Args:
+        syn_root (str): The Synapse cache directory.
+        manifest_file (str, optional): The path to a data manifest. The
+                                       default is to use the manifest at
+                                       $DRYADS_DATA_MANIFEST, and otherwise
+                                       one saved in the Synapse cache
+                                       directory as `data-manifest.json`.
+
+    Returns:
+        syn (DataManifest or synapseclient.Synapse)
+            A manifest if one was found, or otherwise a Synapse client using
+            the given cache directory, which will still need to log in.
+
+    """
+    if manifest_file is None:
+        manifest_file = os.environ.get(
+            'DRYADS_DATA_MANIFEST',
+            os.path.join(syn_root, "data-manifest.json")
+            )
+
+    if os.path.isfile(manifest_file):
+        syn = DataManifest(manifest_file)
+
+    else:
+        import synapseclient
+
+        syn = synapseclient.Synapse()
+        syn.cache.cache_root_dir = syn_root
+
+    return syn
@@ -8,24 +8,312 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
+from .utils import get_file_checksum
+
+import numpy as np
 import pandas as pd
-from itertools import groupby
+
+import os
+import shutil
+import json
+import dill as pickle
 
 from HetMan.features import DATA_PATH
 path_file = DATA_PATH + '/PathwayCommons9.All.hgnc.sif.gz'
 
+PATHWAY_GRAPH_VERSION = 1
+
+# graphs already loaded in this process, keyed by their location on disk
+_loaded_graphs = dict()
+
+# the direction of each interaction relative to a queried gene, and the
+# end of the interaction the gene is found at
+intx_directions = {'Up': 'in', 'Down': 'out'}
+
+
+def load_sif(sif_file=None):
+    if sif_file is None:
+        sif_file = path_file
 
-def load_sif():
-    return pd.read_csv(path_file,
+    return pd.read_csv(sif_file,
                        names=['UpGene', 'Type', 'DownGene'],
-                       sep='\t', header=None)
+                       sep='\t', header=None, engine='c')
+
+
+def get_graph_path(sif_file, index_dir=None):
+    """Finds where the compiled graph of a SIF file is stored.
+
+    Args:
+        sif_file (str): The path to a PathwayCommons SIF file.
+        index_dir (str, optional): Where graphs are stored; the default is
+                                   alongside the SIF file.
+
+    Returns:
+        graph_path (str)
+
+    """
+    if index_dir is None:
+        index_dir = os.path.join(os.path.dirname(os.path.abspath(sif_file)),
+                                 "pathway-index")
+
+    return os.path.join(index_dir, get_file_checksum(sif_file))
+
+
+def build_pathway_graph(sif_file, graph_path):
+    """Parses a SIF file and saves its interactions as a compiled graph.
+
+    Genes and interaction types are assigned integer codes, and each
+    direction of the interactions is saved as a compressed sparse row
+    adjacency in which the neighbours of a gene through interactions of a
+    given type are found in one contiguous slice.
+
+    Args:
+        sif_file (str): The path to a PathwayCommons SIF file.
+        graph_path (str): Where the graph will be created.
+
+    """
+    sif_data = load_sif(sif_file).drop_duplicates()
+
+    genes, gene_codes = np.unique(
+        np.concatenate([sif_data.UpGene.values.astype(str),
+                        sif_data.DownGene.values.astype(str)]),
+        return_inverse=True
+        )
+    up_codes = gene_codes[:len(sif_data)]
+    down_codes = gene_codes[len(sif_data):]
+    types, type_codes = np.unique(sif_data.Type.values.astype(str),
+                                  return_inverse=True)
+
+    tmp_path = "{}.tmp-{}".format(graph_path, os.getpid())
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    # edges are sorted by type and then by the gene they are adjacent to,
+    # so that the pointer of each (type, gene) pair is found at position
+    # type * n_genes + gene
+    for drc, src_codes, dst_codes in [('out', up_codes, down_codes),
+                                      ('in', down_codes, up_codes)]:
+        edge_keys = type_codes * len(genes) + src_codes
+        edge_order = np.lexsort((dst_codes, edge_keys))
+
+        np.save(os.path.join(tmp_path, "{}__ptrs.npy".format(drc)),
+                np.searchsorted(edge_keys[edge_order],
+                                np.arange(len(types) * len(genes) + 1)))
+        np.save(os.path.join(tmp_path, "{}__genes.npy".format(drc)),
+                dst_codes[edge_order].astype(np.int32))
+
+    np.save(os.path.join(tmp_path, "genes.npy"),
+            np.array(genes, dtype=str))
+    with open(os.path.join(tmp_path, "rows.p"), 'wb') as f:
+        pickle.dump({gene: i for i, gene in enumerate(genes)},
+                    f, protocol=-1)
+
+    with open(os.path.join(tmp_path, "manifest.json"), 'w') as f:
+        json.dump({'version': PATHWAY_GRAPH_VERSION,
+                   'source': os.path.abspath(sif_file),
+                   'types': types.tolist(), 'genes': len(genes),
+                   'interactions': len(sif_data)}, f)
+
+    if os.path.exists(graph_path):
+        shutil.rmtree(graph_path)
+    os.rename(tmp_path, graph_path)
+
+
+class PathwayGraph(object):
+    """The interactions of a PathwayCommons SIF file as read from a graph.
+
+    Args:
+        graph_path (str): Where the graph was saved by
+                          :func:`build_pathway_graph`.
+
+    """
+
+    def __init__(self, graph_path):
+        self.graph_path = graph_path
+
+        with open(os.path.join(graph_path, "manifest.json"), 'r') as f:
+            manifest = json.load(f)
+
+        self.types = manifest['types']
+        self.type_codes = {tp: i for i, tp in enumerate(self.types)}
+        with open(os.path.join(graph_path, "rows.p"), 'rb') as f:
+            self.gene_codes = pickle.load(f)
+
+        self.genes = np.load(os.path.join(graph_path, "genes.npy"))
+        self.adjacency = {
+            drc: (np.load(os.path.join(graph_path,
+                                       "{}__ptrs.npy".format(drc)),
+                          mmap_mode='r'),
+                  np.load(os.path.join(graph_path,
+                                       "{}__genes.npy".format(drc)),
+                          mmap_mode='r'))
+            for drc in intx_directions.values()
+            }
+
+    def __len__(self):
+        return len(self.genes)
+
+    def __contains__(self, gene):
+        return gene in self.gene_codes
 
+    def _get_type_codes(self, intx_types=None):
+        if intx_types is None:
+            return np.arange(len(self.types))
 
-def get_gene_neighbourhood(genes):
+        return np.array([self.type_codes[tp] for tp in intx_types
+                         if tp in self.type_codes], dtype=int)
+
+    def _get_neighbour_codes(self, gene_codes, drc, type_codes):
+        """Finds the neighbours of genes as slices of an adjacency."""
+        ptrs, nbr_genes = self.adjacency[drc]
+        keys = (type_codes[:, np.newaxis] * len(self.genes)
+                + np.asarray(gene_codes)[np.newaxis, :]).ravel()
+
+        starts = ptrs[keys]
+        ends = ptrs[keys + 1]
+        if not (ends > starts).any():
+            return np.array([], dtype=int)
+
+        return np.concatenate([nbr_genes[start:end]
+                               for start, end in zip(starts, ends)
+                               if end > start])
+
+    def get_neighbours(self, genes, direction='Down', intx_types=None):
+        """Finds the genes interacting with each of a list of genes.
+
+        Args:
+            genes (:obj:`iterable` of :obj:`str`)
+            direction (str, optional): Whether to find the genes upstream
+                                       ('Up') or downstream ('Down') of the
+                                       given genes.
+            intx_types (:obj:`iterable` of :obj:`str`, optional)
+                Which types of interaction to use; the default is to use
+                all of them.
+
+        Returns:
+            neighbs (dict): The neighbours of each given gene.
+
+        """
+        drc = intx_directions[direction]
+        type_codes = self._get_type_codes(intx_types)
+
+        return {gene: {str(nbr) for nbr in self.genes[
+            self._get_neighbour_codes([self.gene_codes[gene]], drc,
+                                      type_codes)]}
+                if gene in self.gene_codes else set()
+                for gene in genes}
+
+    def expand(self, genes, hops=1, direction='both', intx_types=None):
+        """Finds the genes within a number of interactions of given genes.
+
+        Args:
+            genes (:obj:`iterable` of :obj:`str`)
+            hops (int, optional): How many interactions away to look.
+            direction (str, optional): Whether to follow interactions
+                                       upstream ('Up'), downstream ('Down')
+                                       or in both directions ('both').
+            intx_types (:obj:`iterable` of :obj:`str`, optional)
+
+        Returns:
+            expand_genes (set): The given genes and their neighbours.
+
+        """
+        if direction == 'both':
+            drcs = list(intx_directions.values())
+        else:
+            drcs = [intx_directions[direction]]
+
+        type_codes = self._get_type_codes(intx_types)
+        seen_codes = np.zeros(len(self.genes), dtype=bool)
+        front_codes = np.array([self.gene_codes[gene] for gene in genes
+                                if gene in self.gene_codes], dtype=int)
+        seen_codes[front_codes] = True
+
+        for _ in range(hops):
+            if not len(front_codes):
+                break
+
+            nbr_codes = np.unique(np.concatenate([
+                self._get_neighbour_codes(front_codes, drc, type_codes)
+                for drc in drcs
+                ]))
+
+            front_codes = nbr_codes[~seen_codes[nbr_codes]]
+            seen_codes[front_codes] = True
+
+        return set(genes) | {str(gene) for gene in self.genes[seen_codes]}
+
+    def get_edges(self, intx_type, genes=None):
+        """Gets the interactions of a given type as (up, down) gene pairs."""
+        ptrs, nbr_genes = self.adjacency['out']
+        type_i = self.type_codes[intx_type]
+
+        type_ptrs = np.asarray(
+            ptrs[(type_i * len(self.genes)):((type_i + 1) * len(self.genes)
+                                             + 1)])
+        up_codes = np.repeat(np.arange(len(self.genes)), np.diff(type_ptrs))
+        down_codes = np.asarray(nbr_genes[type_ptrs[0]:type_ptrs[-1]])
+
+        if genes is not None:
+            use_genes = np.isin(self.genes, list(genes))
+            use_edges = use_genes[up_codes] & use_genes[down_codes]
+            up_codes = up_codes[use_edges]
+            down_codes = down_codes[use_edges]
+
+        return set(zip(self.genes[up_codes].tolist(),
+                       self.genes[down_codes].tolist()))
+
+
+def load_pathway_graph(sif_file=None, index_dir=None):
+    """Loads the compiled graph of a SIF file, building it if needed.
+
+    Graphs are rebuilt whenever the contents of the SIF file change, and are
+    only read from disk once per process.
+
+    Args:
+        sif_file (str, optional): The path to a PathwayCommons SIF file;
+                                  the default is to use the SIF file in the
+                                  package data directory.
+        index_dir (str, optional): Where graphs are stored; the default is
+                                   alongside the SIF file.
+
+    Returns:
+        pathway_graph (PathwayGraph)
+
+    """
+    if sif_file is None:
+        sif_file = path_file
+
+    file_stat = os.stat(sif_file)
+    load_key = (os.path.abspath(sif_file), file_stat.st_size,
+                file_stat.st_mtime, index_dir)
+
+    if load_key not in _loaded_graphs:
+        graph_path = get_graph_path(sif_file, index_dir)
+        manifest_file = os.path.join(graph_path, "manifest.json")
+
+        use_graph = False
+        if os.path.isfile(manifest_file):
+            with open(manifest_file, 'r') as f:
+                use_graph = json.load(f)['version'] == PATHWAY_GRAPH_VERSION
+
+        if not use_graph:
+            build_pathway_graph(sif_file, graph_path)
+
+        _loaded_graphs[load_key] = PathwayGraph(graph_path)
+
+    return _loaded_graphs[load_key]
+
+
+def get_gene_neighbourhood(genes, sif_file=None):
     """Parses a SIF dataset to get the pathway neighbours of a set of genes.
 
     Args:
         genes (list of str): Genes to get pathway neighbourhoods for.
+        sif_file (str, optional): The SIF dataset to use; the default is
+                                  the PathwayCommons dataset in the package
+                                  data directory.
 
     Returns:
         neighb (dict): Neigbourhood info for each gene.
@@ -41,42 +329,32 @@ def get_gene_neighbourhood(genes):
         >>> parse_sif(['PIK3CA', 'RB1', 'ACT1'])
 
     """
+    pathway_graph = load_pathway_graph(sif_file)
     neighb = {gene: {'Up': {}, 'Down': {}} for gene in genes}
-    sif_data = load_sif()
 
-    # sorts upstream interactions according to downstream mutated gene
-    # and interaction type
-    up_data = sif_data.loc[sif_data['DownGene'].isin(genes), :]
-    for (gn, tp), dt in up_data.groupby(['DownGene', 'Type']):
-        neighb[gn]['Up'][tp] = set(dt['UpGene'])
+    # sorts the interactions of each gene according to their direction
+    # and type, leaving out types the gene has no interactions of
+    for drc in intx_directions:
+        for tp in pathway_graph.types:
+            tp_neighbs = pathway_graph.get_neighbours(genes, drc, [tp])
 
-    # sorts downstream interactions according to upstream mutated gene
-    # and interaction type
-    down_data = sif_data.loc[sif_data['UpGene'].isin(genes), :]
-    for (gn, tp), dt in down_data.groupby(['UpGene', 'Type']):
-        neighb[gn]['Down'][tp] = set(dt['DownGene'])
+            for gene, nbrs in tp_neighbs.items():
+                if nbrs:
+                    neighb[gene][drc][tp] = nbrs
 
     return neighb
 
 
-def get_type_networks(intx_types=None, genes=None):
+def get_type_networks(intx_types=None, genes=None, sif_file=None):
     """Parses a SIF dataset to get the interactions of the given type(s).
 
     """
-    intx_data = load_sif()
+    pathway_graph = load_pathway_graph(sif_file)
 
-    if intx_types is not None:
-        intx_data = intx_data.loc[intx_data['Type'].isin(intx_types), :]
+    if intx_types is None:
+        intx_types = pathway_graph.types
 
-    if genes is not None:
-        intx_data = intx_data.loc[intx_data['UpGene'].isin(genes)
-                                  & intx_data['DownGene'].isin(genes), :]
-    
-    neighb = {
-        tp: set(tuple(x) for x in
-                dt.loc[:, ['UpGene', 'DownGene']].values.tolist())
-        for tp, dt in intx_data.groupby(['Type'])
-        }
-
-    return neighb
+    neighb = {tp: pathway_graph.get_edges(tp, genes)
+              for tp in intx_types if tp in pathway_graph.type_codes}
 
+    return {tp: edges for tp, edges in neighb.items() if edges}
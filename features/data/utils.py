@@ -1,3 +1,7 @@
+import os
+import json
+import hashlib
+
 
 def choose_bmeg_server(server_list=('http://bmeg.compbio.ohsu.edu',
                                     'http://bmeg.io'),
@@ -45,3 +49,29 @@ def choose_bmeg_server(server_list=('http://bmeg.compbio.ohsu.edu',
         raise RuntimeError("No BMEG server available!")
 
     return bmeg_server
+
+
+def get_file_checksum(fl, block_size=2 ** 20):
+    """Computes the MD5 digest of a file without reading all of it at once."""
+    file_hash = hashlib.md5()
+
+    with open(fl, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def get_file_stamp(fl):
+    """Computes a digest of a file's location, size and modification time.
+
+    Unlike :func:`get_file_checksum`, this does not read the file, and can
+    thus be used to tell whether a large dataset has changed each time it
+    is loaded from a cache.
+
+    """
+    fl_stat = os.stat(fl)
+
+    return hashlib.md5(json.dumps(
+        [os.path.abspath(fl), fl_stat.st_size, fl_stat.st_mtime_ns]
+        ).encode('utf-8')).hexdigest()
@@ -13,26 +13,214 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
+from .maf import normalize_maf
+
 import numpy as np
 import pandas as pd
 
 import tarfile
 import os
 import glob
+import shutil
 
 from io import BytesIO
 import json
+import dill as pickle
 
-from re import sub as gsub
 from functools import reduce
 
 
+# the columns of the MC3 MAF that are used by the cohort loaders, and the
+# types used to store the numeric ones in the partitioned index
+mc3_fields = (
+    ('Gene', 0), ('Chr', 4), ('Start', 5), ('End', 6), ('Strand', 7),
+    ('Form', 8), ('RefAllele', 10), ('TumorAllele', 12),
+    ('Sample', 15), ('HGVS', 34), ('Protein', 36), ('Transcript', 37),
+    ('Exon', 38), ('depth', 39), ('ref_count', 40), ('alt_count', 41),
+    ('SIFT', 71), ('PolyPhen', 72), ('Filter', 108)
+    )
+
+mc3_dtypes = {'Start': 'int64', 'End': 'int64', 'depth': 'int32',
+              'ref_count': 'int32', 'alt_count': 'int32'}
+MC3_INDEX_VERSION = 1
+
+
+# .. functions for storing mutation data in formats that load quickly ..
+def get_source_sites(samples):
+    """Finds the TCGA tissue source site codes of a list of sample barcodes.
+
+    Each TCGA project draws its samples from its own set of source sites,
+    which makes these codes a way of partitioning pan-cancer variant calls
+    that can be recovered from any cohort's sample barcodes alone.
+
+    """
+    return pd.Series(samples).astype(str).str[5:7]
+
+
+def build_mc3_index(maf_file, index_dir):
+    """Splits the MC3 MAF into a column-typed store partitioned by source site.
+
+    This is a one-time operation; each column of the MAF used by the cohort
+    loaders is saved as a separate numpy array with the rows sorted by the
+    tissue source site of their sample, and a manifest records the range of
+    rows belonging to each site. String columns are stored as integer codes
+    into a pickled list of their unique values.
+
+    Args:
+        maf_file (str): The path to the MC3 MAF, eg. as downloaded from
+                        Synapse entity syn7824274.
+        index_dir (str): Where the index will be created.
+
+    """
+    use_fields, use_cols = tuple(zip(*mc3_fields))
+
+    # reading the MAF off of a networked filesystem can fail intermittently,
+    # so we try a few more times before giving up on it
+    for i in range(10):
+        try:
+            var_data = pd.read_csv(maf_file, engine='c', dtype='object',
+                                   sep='\t', header=None,
+                                   usecols=use_cols, names=use_fields,
+                                   comment='#', skiprows=1)
+            break
+
+        except OSError:
+            if i == 9:
+                raise
+
+    site_codes = get_source_sites(var_data.Sample).values
+    row_order = np.argsort(site_codes, kind='mergesort')
+    var_data = var_data.iloc[row_order]
+    site_codes = site_codes[row_order]
+
+    tmp_dir = "{}.tmp-{}".format(index_dir, os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    for fld in use_fields:
+        if fld in mc3_dtypes:
+            np.save(os.path.join(tmp_dir, "{}.npy".format(fld)),
+                    var_data[fld].astype(mc3_dtypes[fld]).values)
+
+        else:
+            fld_codes, fld_cats = pd.factorize(var_data[fld])
+            np.save(os.path.join(tmp_dir, "{}.npy".format(fld)),
+                    fld_codes.astype(np.int32))
+
+            with open(os.path.join(tmp_dir,
+                                   "{}__cats.p".format(fld)), 'wb') as f:
+                pickle.dump(np.array(fld_cats, dtype=object), f, protocol=-1)
+
+    site_list, site_starts = np.unique(site_codes, return_index=True)
+    site_stops = list(site_starts[1:]) + [len(site_codes)]
+
+    with open(os.path.join(tmp_dir, "manifest.json"), 'w') as f:
+        json.dump({'version': MC3_INDEX_VERSION,
+                   'source': {'path': os.path.abspath(maf_file),
+                              'size': os.path.getsize(maf_file),
+                              'mtime': os.path.getmtime(maf_file)},
+                   'fields': list(use_fields),
+                   'partitions': {site: [int(start), int(stop)]
+                                  for site, start, stop in zip(
+                                      site_list, site_starts, site_stops)}},
+                  f)
+
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    os.rename(tmp_dir, index_dir)
+
+
+def load_mc3_manifest(maf_file, index_dir):
+    """Gets the manifest of an up-to-date MC3 index, building it if needed."""
+    manifest_file = os.path.join(index_dir, "manifest.json")
+
+    if os.path.isfile(manifest_file):
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+
+        if (manifest['version'] == MC3_INDEX_VERSION
+                and manifest['source']['size'] == os.path.getsize(maf_file)
+                and manifest['source']['mtime'] == os.path.getmtime(
+                    maf_file)):
+            return manifest
+
+    build_mc3_index(maf_file, index_dir)
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+
+    return manifest
+
+
+def load_mc3_index(maf_file, index_dir, samples=None, fields=None,
+                   categorical=False):
+    """Reads the MC3 variant calls for a set of samples from the index.
+
+    Args:
+        maf_file (str): The path to the MC3 MAF the index was built from.
+        index_dir (str): Where the index is stored.
+        samples (:obj:`iterable` of :obj:`str`, optional)
+            TCGA sample barcodes whose variants are needed; only the rows of
+            the index belonging to these samples' source sites will be read.
+            Note that the calls of other samples from the same source sites
+            are also returned. The default is to read every partition.
+        fields (:obj:`iterable` of :obj:`str`, optional)
+            Which MAF columns to read; the default is to read all of them.
+        categorical (bool, optional)
+            Whether to return string columns as categoricals built directly
+            from the stored codes instead of converting them to strings.
+
+    Returns:
+        var_data (:obj:`pd.DataFrame`, shape = [n_variants, n_fields])
+
+    """
+    manifest = load_mc3_manifest(maf_file, index_dir)
+
+    if fields is None:
+        fields = manifest['fields']
+    else:
+        fields = [fld for fld in manifest['fields'] if fld in set(fields)]
+
+    if samples is None:
+        use_parts = sorted(manifest['partitions'].values())
+    else:
+        use_parts = sorted(manifest['partitions'][site]
+                           for site in set(get_source_sites(samples))
+                           if site in manifest['partitions'])
+
+    var_dict = dict()
+    for fld in fields:
+        fld_vals = np.load(os.path.join(index_dir, "{}.npy".format(fld)),
+                           mmap_mode='r')
+        fld_vals = np.concatenate([fld_vals[start:stop]
+                                   for start, stop in use_parts]
+                                  + [fld_vals[:0]])
+
+        if fld not in mc3_dtypes:
+            with open(os.path.join(index_dir,
+                                   "{}__cats.p".format(fld)), 'rb') as f:
+                fld_cats = pickle.load(f)
+
+            fld_vals = pd.Categorical.from_codes(fld_vals, fld_cats)
+            if not categorical:
+                fld_vals = np.asarray(fld_vals, dtype=object)
+
+        var_dict[fld] = fld_vals
+
+    return pd.DataFrame(var_dict, columns=fields)
+
+
 # .. functions for loading mutation data from external data sources ..
-def get_variants_mc3(syn):
+def get_variants_mc3(syn, samples=None, index_dir=None):
     """Reads ICGC mutation data from the MC3 synapse file.
 
     Args:
         syn (Synapse): A logged-in synapseclient instance.
+        samples (:obj:`iterable` of :obj:`str`, optional)
+            If given, only read the variants of these samples' source sites.
+        index_dir (str, optional): Where the partitioned index of the MC3
+                                   MAF is stored; the default is alongside
+                                   the MAF in the Synapse cache.
 
     Returns:
         muts (pandas DataFrame), shape = [n_mutations, mut_levels + 1]
@@ -47,35 +235,18 @@ def get_variants_mc3(syn):
 
     """
     mc3 = syn.get('syn7824274')
+    if index_dir is None:
+        index_dir = os.path.join(os.path.dirname(mc3.path), "mc3-index")
 
     # defines which mutation annotation MAF columns to use
-    use_cols = [0, 8, 15, 36, 37, 38, 39, 40, 41, 71, 72]
     use_names = ['Gene', 'Form', 'Sample', 'Protein', 'Transcript', 'Exon',
                  'depth', 'ref_count', 'alt_count', 'SIFT', 'PolyPhen']
 
     # imports mutation data into a DataFrame, parses TCGA sample barcodes
     # and PolyPhen scores
-    i = 0
-    while i < 10:
-        try:
-            muts = pd.read_csv(mc3.path, engine='python',
-                               usecols=use_cols, sep='\t', header=None,
-                               names=use_names, comment='#', skiprows=1)
-            break
-
-        except OSError:
-            i = i + 1
-
-    for annt, null_val in zip(['PolyPhen', 'SIFT'], [0, 1]):
-        muts[annt] = muts[annt].apply(
-            lambda val: (np.float(gsub('\)$', '', gsub('^.*\(', '', val)))
-                         if val != '.' else null_val)
-            )
-
-    muts.Sample = muts.Sample.apply(lambda smp: '-'.join(smp.split('-')[:4]))
-    muts.SIFT = 1 - muts.SIFT
+    muts = load_mc3_index(mc3.path, index_dir, samples, use_names)
 
-    return muts
+    return normalize_maf(muts, categorical=False)
 
 
 def get_variants_firehose(cohort, data_dir):
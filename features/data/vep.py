@@ -0,0 +1,306 @@
+"""Annotating variant calls using the Ensembl Variant Effect Predictor.
+
+This module contains a wrapper around the VEP interface provided by dryadic
+which stores the annotations of each unique variant in a local cache, so that
+variants seen in previous runs or in other cohorts do not need to be passed
+through VEP again.
+
+See Also:
+    :module:`.variants`: Loading variant calls from external sources.
+    :module:`.maf`: Normalizing the annotation fields of variant calls.
+
+Author: Michal Grzadkowski <grzadkow@ohsu.edu>
+
+"""
+
+from dryadic.features.data.vep import process_variants
+
+import numpy as np
+import pandas as pd
+
+import os
+import glob
+import hashlib
+import json
+import dill as pickle
+from multiprocessing.pool import ThreadPool
+
+
+VEP_CACHE_VERSION = 1
+
+# the fields of a variant call that determine how it is annotated by VEP
+var_keys = ('Chr', 'Start', 'End', 'RefAllele', 'VarAllele')
+
+
+def get_variant_keys(var_df):
+    """Gets a string uniquely identifying each variant in a table of calls."""
+    var_strs = [var_df[key].astype(str) for key in var_keys]
+    var_index = var_strs[0]
+
+    for var_str in var_strs[1:]:
+        var_index = var_index + ':' + var_str
+
+    return var_index.values
+
+
+def get_digest(vals):
+    """Computes an MD5 digest of a JSON-serializable object."""
+    return hashlib.md5(
+        json.dumps(vals, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_cache_path(cache_dir, assembly, vep_args):
+    """Finds where the annotations produced with given VEP settings are."""
+    return os.path.join(cache_dir, get_digest({
+        'version': VEP_CACHE_VERSION, 'assembly': assembly,
+        'args': vep_args
+        }))
+
+
+def load_cached_annotations(cache_path, out_fields):
+    """Reads the cached annotations that include a given set of fields.
+
+    Annotations are saved in shards, each of which is the output of VEP for
+    a set of unique variants and a set of annotation fields. Shards made
+    using a superset of the given fields are also used, with the annotations
+    of any fields that were not asked for left out.
+
+    Returns:
+        var_list (:obj:`list` of :obj:`str`)
+            The variants that have already been annotated, including those
+            that VEP did not return any annotations for.
+        annot_df (pd.DataFrame)
+            The annotations of the cached variants, with each row indexed by
+            its variant key.
+
+    """
+    var_list = []
+    annot_list = []
+
+    for fields_file in glob.glob(os.path.join(cache_path, "fields__*.json")):
+        with open(fields_file, 'r') as f:
+            shard_fields = set(json.load(f))
+
+        if not set(out_fields) <= shard_fields:
+            continue
+        extra_fields = shard_fields - set(out_fields)
+
+        fields_hash = os.path.basename(fields_file).split('__')[1][:-5]
+        for shard_file in sorted(glob.glob(os.path.join(
+                cache_path, "shard__{}__*.p".format(fields_hash)))):
+
+            try:
+                with open(shard_file, 'rb') as f:
+                    shard_data = pickle.load(f)
+
+            except (IOError, EOFError, pickle.UnpicklingError):
+                continue
+
+            # a variant found in more than one shard is annotated the same
+            # way in each, so we only use the first shard it appears in
+            shard_annots = shard_data['annots']
+            shard_annots = shard_annots[[col for col in shard_annots.columns
+                                         if col not in extra_fields]]
+
+            annot_list += [shard_annots.loc[
+                ~shard_annots.index.isin(var_list)]]
+            var_list += list(shard_data['variants'])
+
+    if annot_list:
+        use_cols = [col for col in annot_list[0].columns
+                    if all(col in annots.columns for annots in annot_list)]
+        annot_df = pd.concat([annots[use_cols] for annots in annot_list])
+
+    else:
+        annot_df = None
+
+    return var_list, annot_df
+
+
+def save_annotation_shard(cache_path, out_fields, var_list, annot_df):
+    """Adds the annotations of a set of variants to the cache."""
+    os.makedirs(cache_path, exist_ok=True)
+    fields_hash = get_digest(sorted(out_fields))
+
+    fields_file = os.path.join(cache_path,
+                               "fields__{}.json".format(fields_hash))
+    if not os.path.exists(fields_file):
+        tmp_file = "{}.tmp-{}".format(fields_file, os.getpid())
+
+        with open(tmp_file, 'w') as f:
+            json.dump(sorted(out_fields), f)
+        os.replace(tmp_file, fields_file)
+
+    # shards are named by their contents, so that concurrent runs annotating
+    # the same variants write the same file
+    shard_file = os.path.join(cache_path, "shard__{}__{}.p".format(
+        fields_hash, get_digest(sorted(var_list))))
+    tmp_file = "{}.tmp-{}".format(shard_file, os.getpid())
+
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({'variants': np.array(var_list, dtype=object),
+                     'annots': annot_df}, f, protocol=-1)
+    os.replace(tmp_file, shard_file)
+
+
+def split_variants(var_df, n_shards, min_size=1000):
+    """Splits variant calls into blocks of neighbouring variants.
+
+    Variants are sorted by their genomic position before being divided into
+    blocks of roughly equal size, so that each block spans as few
+    chromosomes as possible and VEP reads less of its cache for each one.
+
+    """
+    n_shards = min(n_shards, max(len(var_df) // min_size, 1))
+    var_order = np.lexsort((var_df.Start.values,
+                            var_df.Chr.astype(str).values))
+
+    return [var_df.iloc[shard_indx]
+            for shard_indx in np.array_split(var_order, n_shards)]
+
+
+def run_vep_shard(shard_args):
+    """Runs VEP on a block of variants, returning any error it raises."""
+    shard_df, shard_dir, vep_args = shard_args
+    os.makedirs(shard_dir, exist_ok=True)
+
+    try:
+        shard_annots = process_variants(shard_df, temp_dir=shard_dir,
+                                        update_cache=False, **vep_args)
+
+    except Exception as err:
+        shard_annots = err
+
+    return shard_dir, shard_annots
+
+
+def annotate_variants(var_df, out_fields, vep_cache_dir, temp_dir, assembly,
+                      annot_cache_dir=None, distance=0,
+                      consequence_choose='pick', cores=4, forks=4,
+                      max_tries=3):
+    """Annotates variant calls using VEP, reusing cached annotations.
+
+    Each unique variant not found in the cache is passed through VEP once,
+    regardless of how many samples it was called in, and the annotations are
+    then mapped back to every call of the variant.
+
+    Args:
+        var_df (pd.DataFrame): Variant calls with the columns 'Chr', 'Start',
+                               'End', 'RefAllele', 'VarAllele' and 'Sample'.
+        out_fields (:obj:`iterable` of :obj:`str`)
+            The annotation fields to get from VEP, as in
+            :func:`process_variants`.
+        vep_cache_dir (str): Where VEP is storing genome assembly datasets.
+        temp_dir (str): Where to store intermediate VEP output files.
+        assembly (str): The genome assembly of the variant calls.
+        annot_cache_dir (str, optional): Where to cache annotations; the
+                                         default is alongside the VEP
+                                         assembly datasets.
+        distance, consequence_choose
+            Passed on to :func:`process_variants`.
+        cores (int, optional): How many cores can be used by VEP in total.
+        forks (int, optional): How many cores each VEP instance can use;
+                               new variants are split into blocks that are
+                               annotated by `cores // forks` instances of VEP
+                               running at the same time.
+        max_tries (int, optional): How many times to run VEP on a block of
+                                   variants before giving up on it.
+
+    Returns:
+        variants (pd.DataFrame): The annotated variant calls.
+
+    """
+    if annot_cache_dir is None:
+        annot_cache_dir = os.path.join(vep_cache_dir, "dryads-annotations")
+
+    out_fields = sorted(set(out_fields))
+    cache_path = get_cache_path(
+        annot_cache_dir, assembly,
+        {'distance': distance, 'consequence_choose': consequence_choose}
+        )
+
+    var_index = get_variant_keys(var_df)
+    var_list, annot_df = load_cached_annotations(cache_path, out_fields)
+    new_vars = pd.unique(var_index[~np.isin(var_index, var_list)])
+
+    # annotate the variants not in the cache, using their position in the
+    # list of new variants as their sample label
+    if len(new_vars):
+        new_df = var_df.loc[~pd.Series(var_index).duplicated().values
+                            & np.isin(var_index, new_vars),
+                            list(var_keys)]
+        new_keys = get_variant_keys(new_df)
+        new_df['Sample'] = ["var{}".format(i) for i in range(len(new_df))]
+
+        forks = max(min(forks, cores), 1)
+        n_workers = max(cores // forks, 1)
+        vep_args = dict(out_fields=out_fields, cache_dir=vep_cache_dir,
+                        assembly=assembly, distance=distance,
+                        consequence_choose=consequence_choose, forks=forks)
+
+        shard_dfs = {
+            os.path.join(temp_dir, "vep-shard{}".format(i)): shard_df
+            for i, shard_df in enumerate(split_variants(new_df, n_workers))
+            }
+        shard_args = [(shard_df, shard_dir, vep_args)
+                      for shard_dir, shard_df in shard_dfs.items()]
+
+        # run VEP on blocks of new variants concurrently, caching the
+        # annotations of each block as soon as it is finished; blocks that
+        # fail are tried again once the others are done
+        new_list = []
+        for _ in range(max_tries):
+            shard_errs = dict()
+
+            pool = ThreadPool(min(n_workers, len(shard_args)))
+            for shard_dir, shard_annots in pool.imap_unordered(run_vep_shard,
+                                                               shard_args):
+                if isinstance(shard_annots, Exception):
+                    shard_errs[shard_dir] = shard_annots
+                    continue
+
+                shard_annots.index = new_keys[
+                    shard_annots.Sample.str.slice(3).astype(int).values]
+                shard_annots = shard_annots.drop(columns='Sample')
+                save_annotation_shard(cache_path, out_fields,
+                                      get_variant_keys(shard_dfs[shard_dir]),
+                                      shard_annots)
+                new_list += [shard_annots]
+
+            pool.close()
+            pool.join()
+
+            shard_args = [shard for shard in shard_args
+                          if shard[1] in shard_errs]
+            if not shard_args:
+                break
+
+        else:
+            raise RuntimeError(
+                "VEP failed on {} blocks of variants, most recently with "
+                "`{}` !".format(len(shard_errs),
+                                list(shard_errs.values())[-1])
+                )
+
+        # only keep the columns found in both the cached annotations and in
+        # each of the newly annotated blocks of variants
+        if annot_df is not None:
+            new_list = [annot_df] + new_list
+
+        use_cols = [col for col in new_list[0].columns
+                    if all(col in annots.columns for annots in new_list)]
+        annot_df = pd.concat([annots[use_cols] for annots in new_list])
+
+    if annot_df is None:
+        return pd.DataFrame(columns=['Sample'])
+
+    # map the annotations of each unique variant back to its calls
+    annot_df = annot_df.loc[annot_df.index.isin(var_index)]
+    annot_df.index.name = '_Variant'
+
+    variants = pd.DataFrame({'Sample': var_df.Sample.values,
+                             '_Variant': var_index}).merge(
+                                 annot_df, how='inner', left_on='_Variant',
+                                 right_index=True, sort=False)
+
+    return variants.drop(columns='_Variant').reset_index(drop=True)